@@ -5,11 +5,14 @@ Flask API for Memory Trainer - Backend for iPad app
 
 import os
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from memory_trainer import MemoryTrainer
+from openai import OpenAI
+from memory_trainer import MemoryTrainer, WARMUP_PROMPT, TRANSITION_PROMPT
 from qa_database import QADatabase, QA
 
 app = Flask(__name__)
@@ -21,6 +24,17 @@ sessions = {}
 # Shared QA database instance
 _qa_db = None
 
+QA_PAGE_SIZE = 100
+QA_MAX_PAGE_SIZE = 500
+MAX_ATTEMPTS = 3  # Wrong answers before the answer is revealed; all but the last get a hint
+
+# Background pool that writes hints while the patient is still thinking
+hint_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hint-prefetch")
+
+# One OpenAI client (and connection pool) per API key, shared by every session
+_openai_lock = threading.Lock()
+_openai_clients = {}
+
 
 def get_qa_db():
     """Get shared QA database instance"""
@@ -30,10 +44,23 @@ def get_qa_db():
     return _qa_db
 
 
+def get_openai_client(api_key: str = None) -> OpenAI:
+    """Process-wide OpenAI client for the given (or environment) API key"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    with _openai_lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            client = OpenAI(api_key=api_key)
+            _openai_clients[api_key] = client
+        return client
+
+
 class APIMemoryTrainer(MemoryTrainer):
     """Extended MemoryTrainer for API usage (non-blocking)"""
     
     def __init__(self, session_id: str, *args, **kwargs):
+        kwargs.setdefault("db", get_qa_db())  # Use shared database
+        kwargs.setdefault("client", get_openai_client(kwargs.get("api_key")))  # And a shared client
         super().__init__(*args, **kwargs)
         self.session_id = session_id
         self.current_qa = None
@@ -41,20 +68,18 @@ class APIMemoryTrainer(MemoryTrainer):
         self.phase = "not_started"  # not_started, warmup, training, completed
         self.current_question_index = 0
         self.selected_questions = []
-        # Use shared database
-        self.db = get_qa_db()
+        self._hint_future = None
+        self._grades = []  # [(future, attempt)]: background LLM grades of provisional answers
     
     def start_warmup(self) -> dict:
         """Start warmup phase and return initial greeting"""
         self.session_data["start_time"] = datetime.now()
         self.phase = "warmup"
         
-        system_prompt = """You are a friendly, empathetic memory training assistant. 
-This is the WARM-UP phase only - just casual conversation, NO memory exercises or tests yet.
-Keep it brief (1-2 sentences). Ask how they're feeling today.
-Do NOT give memory tasks, word lists, or exercises during warm-up."""
-        
-        greeting = self._call_llm(system_prompt)
+        greeting = self._call_llm(WARMUP_PROMPT, purpose="warmup")
+        return self._warmup_result(greeting)
+    
+    def _warmup_result(self, greeting: Optional[str]) -> dict:
         if greeting:
             self._add_message("assistant", greeting)
             return {"success": True, "message": greeting, "phase": "warmup"}
@@ -65,10 +90,10 @@ Do NOT give memory tasks, word lists, or exercises during warm-up."""
         """Handle user response during warmup"""
         self._add_message("user", user_message)
         
-        transition_prompt = """Acknowledge their response briefly (1 sentence) and say you'll now start the memory questions.
-Do NOT create new memory exercises - the questions are coming from the database next."""
-        
-        response = self._call_llm(system_prompt=transition_prompt)
+        response = self._call_llm(system_prompt=TRANSITION_PROMPT, purpose="warmup")
+        return self._transition_result(response)
+    
+    def _transition_result(self, response: Optional[str]) -> dict:
         if response:
             self._add_message("assistant", response)
             return {
@@ -82,8 +107,11 @@ Do NOT create new memory exercises - the questions are coming from the database
     
     def start_training(self, num_questions: int = 3) -> dict:
         """Start training phase with selected questions"""
+        return self._begin_training(self._select_questions(num_questions))
+    
+    def _begin_training(self, questions: list) -> dict:
         self.phase = "training"
-        self.selected_questions = self._select_questions(num_questions)
+        self.selected_questions = questions
         self.current_question_index = 0
         
         if not self.selected_questions:
@@ -105,6 +133,9 @@ Do NOT create new memory exercises - the questions are coming from the database
         
         self.current_qa = self.selected_questions[self.current_question_index]
         self.current_attempt = 0
+        self._drop_grades()
+        self._add_message("assistant", self.current_qa.question)
+        self._prefetch_hints()
         
         return {
             "success": True,
@@ -115,19 +146,112 @@ Do NOT create new memory exercises - the questions are coming from the database
             "qa_id": self.current_qa.id
         }
     
+    def _prefetch_hints(self):
+        """Start writing the attempt 0 and attempt 1 hints for the current question"""
+        self._cancel_hint_prefetch()
+        self._hint_future = hint_executor.submit(
+            self._generate_hints,
+            self.current_qa.question,
+            self.current_qa.answer
+        )
+    
+    def _prefetched_hints(self) -> Optional[list]:
+        """Hints for the current question if the prefetch has finished, else None"""
+        future = self._hint_future
+        if future is None or not future.done() or future.cancelled():
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Hint prefetch failed: {e}")
+            return None
+    
+    def _cancel_hint_prefetch(self):
+        """Drop the prefetch (a call already in flight finishes and is discarded)"""
+        if self._hint_future is not None:
+            self._hint_future.cancel()
+            self._hint_future = None
+    
     def submit_answer(self, user_answer: str) -> dict:
-        """Submit answer and get evaluation"""
+        """
+        Submit answer and get evaluation.
+        With prefetched hints, an answer only the LLM can judge gets its hint at
+        once and is graded in the background; if that grade comes back correct,
+        the next submission accepts the earlier answer. The last attempt (no hint
+        to serve) waits for the LLM and for any grades still running.
+        """
         if not self.current_qa:
             return {"success": False, "error": "No active question"}
         
+        last_attempt = self.current_attempt + 1 >= MAX_ATTEMPTS
+        accepted_attempt = self._accepted_grade(wait=last_attempt)
+        if accepted_attempt is not None:
+            return self._accept_earlier_answer(user_answer, accepted_attempt)
+        
+        hints = self._prefetched_hints()
         evaluation = self._evaluate_answer(
             self.current_qa.question,
             self.current_qa.answer,
             user_answer,
-            self.current_attempt
+            self.current_attempt,
+            hints=hints,
+            provisional=not last_attempt
         )
+        if evaluation.get("provisional"):
+            self._grades.append((hint_executor.submit(
+                self._llm_grade_answer, self.current_qa.question, self.current_qa.answer, user_answer
+            ), self.current_attempt))
+        return self._answer_result(user_answer, evaluation, hints)
+    
+    def _accepted_grade(self, wait: bool = False) -> Optional[int]:
+        """Attempt of a provisional answer the LLM graded correct, or None (wait=True blocks for running grades)"""
+        for future, attempt in self._grades:
+            if future.cancelled() or not (wait or future.done()):
+                continue
+            try:
+                grade = future.result()
+            except Exception as e:
+                print(f"Background grading failed: {e}")
+                continue
+            if grade and grade.get("correct"):
+                return attempt
+        return None
+    
+    def _drop_grades(self):
+        """Forget the current question's background grades (calls in flight finish and are discarded)"""
+        for future, _ in self._grades:
+            future.cancel()
+        self._grades = []
+    
+    def _accept_earlier_answer(self, user_answer: str, attempt: int) -> dict:
+        """The LLM found an answer that got a provisional hint correct: credit it and move on"""
+        self._drop_grades()
+        self._cancel_hint_prefetch()
+        feedback = "Your earlier answer was right after all. Well remembered!"
+        self._add_message("user", user_answer)
+        self._add_message("assistant", feedback)
+        self.session_data["qa_results"][self.current_qa.id] = {
+            "correct": True,
+            "attempts": attempt + 1
+        }
+        self.current_question_index += 1
+        
+        return {
+            "success": True,
+            "correct": True,
+            "feedback": feedback,
+            "evaluated_by": "llm",
+            "accepted_earlier_answer": True,
+            "move_to_next": True
+        }
+    
+    def _answer_result(self, user_answer: str, evaluation: dict, hints: Optional[list]) -> dict:
+        """Record an evaluated answer and advance the session"""
+        self._add_message("user", user_answer)
         
         if evaluation["correct"]:
+            self._cancel_hint_prefetch()
+            self._add_message("assistant", evaluation["feedback"])
             # Record success
             self.session_data["qa_results"][self.current_qa.id] = {
                 "correct": True,
@@ -141,18 +265,21 @@ Do NOT create new memory exercises - the questions are coming from the database
                 "success": True,
                 "correct": True,
                 "feedback": evaluation["feedback"],
+                "evaluated_by": evaluation.get("tier"),
                 "move_to_next": True
             }
         else:
             self.current_attempt += 1
             
-            if self.current_attempt >= 3:
+            if self.current_attempt >= MAX_ATTEMPTS:
                 # Failed after 3 attempts
+                self._cancel_hint_prefetch()
                 self.session_data["qa_results"][self.current_qa.id] = {
                     "correct": False,
                     "attempts": self.current_attempt
                 }
                 
+                self._add_message("assistant", f"The answer was: {self.current_qa.answer}")
                 result = {
                     "success": True,
                     "correct": False,
@@ -166,13 +293,16 @@ Do NOT create new memory exercises - the questions are coming from the database
                 return result
             else:
                 # Give hint and allow retry
+                self._add_message("assistant", evaluation.get("hint", "Try again."))
                 return {
                     "success": True,
                     "correct": False,
                     "feedback": evaluation.get("feedback", "Not quite."),
                     "hint": evaluation.get("hint", "Try again."),
                     "attempt": self.current_attempt,
-                    "attempts_remaining": 3 - self.current_attempt,
+                    "attempts_remaining": MAX_ATTEMPTS - self.current_attempt,
+                    "evaluated_by": evaluation.get("tier"),
+                    "hint_prefetched": hints is not None,
                     "move_to_next": False
                 }
     
@@ -182,6 +312,18 @@ Do NOT create new memory exercises - the questions are coming from the database
         correct_count = sum(1 for r in results.values() if r["correct"])
         total_count = len(results)
         
+        if total_count == 0:
+            return self._summary_result(None, 0, 0)
+        
+        summary_prompt = self._session_summary_prompt(correct_count, total_count)
+        summary = self._call_llm(system_prompt=summary_prompt, include_history=False, purpose="summary")
+        
+        # Update database
+        self._update_database()
+        
+        return self._summary_result(summary, correct_count, total_count)
+    
+    def _summary_result(self, summary: Optional[str], correct_count: int, total_count: int) -> dict:
         if total_count == 0:
             return {
                 "success": True,
@@ -189,18 +331,6 @@ Do NOT create new memory exercises - the questions are coming from the database
                 "stats": {"correct": 0, "total": 0, "percentage": 0}
             }
         
-        summary_prompt = f"""Provide an encouraging summary of the memory training session.
-- Questions answered: {total_count}
-- Correct answers: {correct_count}
-- Success rate: {correct_count/total_count*100:.0f}%
-
-Be positive, highlight achievements, and provide gentle encouragement. Keep it brief (2-3 sentences)."""
-        
-        summary = self._call_llm(system_prompt=summary_prompt)
-        
-        # Update database
-        self._update_database()
-        
         duration = (datetime.now() - self.session_data["start_time"]).seconds
         
         return {
@@ -379,7 +509,9 @@ def get_status(session_id):
             "phase": trainer.phase,
             "current_question_index": trainer.current_question_index,
             "total_questions": len(trainer.selected_questions),
-            "results": trainer.session_data["qa_results"]
+            "results": trainer.session_data["qa_results"],
+            "evaluator": trainer.evaluator.stats(),
+            "token_usage": trainer.token_report()
         }), 200
         
     except Exception as e:
@@ -390,27 +522,58 @@ def get_status(session_id):
 # QA Database Management Endpoints
 # =============================================================================
 
+def qa_to_dict(qa: QA) -> dict:
+    """JSON form of a QA"""
+    return {
+        "id": qa.id,
+        "question": qa.question,
+        "answer": qa.answer,
+        "practice_times": qa.practice_times,
+        "success_rate": qa.success_rate,
+        "last_use_time": qa.last_use_time.isoformat(),
+        "creation_time": qa.creation_time.isoformat(),
+        "due_time": qa.due_time.isoformat(),
+        "interval_days": qa.interval_days
+    }
+
+
+def qa_page(db, args) -> dict:
+    """One page of QAs for GET /api/qa (?limit=&offset=)"""
+    limit = min(max(args.get('limit', QA_PAGE_SIZE, type=int), 1), QA_MAX_PAGE_SIZE)
+    offset = max(args.get('offset', 0, type=int), 0)
+    
+    qas = db.get_all_qas(limit=limit, offset=offset)
+    total = db.count_qas()
+    
+    return {
+        "success": True,
+        "data": [qa_to_dict(qa) for qa in qas],
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < total else None
+    }
+
+
+def new_qa(question: str, answer: str) -> QA:
+    """A QA created through the API, due right away"""
+    now = datetime.now()
+    return QA(
+        id=str(uuid.uuid4()),
+        question=question,
+        answer=answer,
+        creation_time=now,
+        practice_times=0,
+        success_rate=0.0,
+        last_use_time=now
+    )
+
+
 @app.route('/api/qa', methods=['GET'])
 def get_all_qas():
-    """Get all Q&A pairs"""
+    """Get Q&A pairs, one page at a time (?limit=&offset=)"""
     try:
-        db = get_qa_db()
-        qas = db.get_all_qas()
-        
-        qa_list = [
-            {
-                "id": qa.id,
-                "question": qa.question,
-                "answer": qa.answer,
-                "practice_times": qa.practice_times,
-                "success_rate": qa.success_rate,
-                "last_use_time": qa.last_use_time.isoformat(),
-                "creation_time": qa.creation_time.isoformat()
-            }
-            for qa in qas
-        ]
-        
-        return jsonify({"success": True, "data": qa_list}), 200
+        return jsonify(qa_page(get_qa_db(), request.args)), 200
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -426,18 +589,7 @@ def get_qa(qa_id):
         if not qa:
             return jsonify({"success": False, "error": "QA not found"}), 404
         
-        return jsonify({
-            "success": True,
-            "data": {
-                "id": qa.id,
-                "question": qa.question,
-                "answer": qa.answer,
-                "practice_times": qa.practice_times,
-                "success_rate": qa.success_rate,
-                "last_use_time": qa.last_use_time.isoformat(),
-                "creation_time": qa.creation_time.isoformat()
-            }
-        }), 200
+        return jsonify({"success": True, "data": qa_to_dict(qa)}), 200
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -458,19 +610,7 @@ def create_qa():
             }), 400
         
         db = get_qa_db()
-        qa_id = str(uuid.uuid4())
-        now = datetime.now()
-        
-        qa = QA(
-            id=qa_id,
-            question=question,
-            answer=answer,
-            creation_time=now,
-            practice_times=0,
-            success_rate=0.0,
-            last_use_time=now
-        )
-        
+        qa = new_qa(question, answer)
         db.add_qa(qa)
         
         return jsonify({
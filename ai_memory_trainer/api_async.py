@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Async (ASGI) API for Memory Trainer - same endpoints and responses as api.py
+
+Every LLM call is awaited on the event loop with AsyncOpenAI, so a session
+waiting on GPT holds no worker thread and one process serves hundreds of
+concurrent sessions. Each session has an asyncio.Lock: a patient's turns are
+handled in order even if the app sends a request before the last one returned.
+
+Run with:
+    uvicorn api_async:app --host 0.0.0.0 --port 8000
+"""
+
+import os
+import asyncio
+import uuid
+import threading
+from datetime import datetime
+from typing import Optional
+import httpx
+from openai import AsyncOpenAI
+from quart import Quart, request, jsonify
+from quart_cors import cors
+from memory_trainer import WARMUP_PROMPT, TRANSITION_PROMPT, CHEAP_TIERS
+from api import APIMemoryTrainer, MAX_ATTEMPTS, get_qa_db, qa_to_dict, qa_page, new_qa
+
+app = cors(Quart(__name__), allow_origin="*")  # Enable CORS for iPad app
+
+# In-memory session storage (use Redis/DB for production)
+sessions = {}
+
+# One pooled async client per API key, shared by every session
+ASYNC_OPENAI_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+ASYNC_OPENAI_POOL_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+
+_client_lock = threading.Lock()
+_async_clients = {}
+
+
+def get_async_openai(api_key: str = None) -> AsyncOpenAI:
+    """Process-wide AsyncOpenAI client for the given (or environment) API key"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    with _client_lock:
+        client = _async_clients.get(api_key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=api_key,
+                timeout=ASYNC_OPENAI_TIMEOUT,
+                max_retries=2,
+                http_client=httpx.AsyncClient(limits=ASYNC_OPENAI_POOL_LIMITS, timeout=ASYNC_OPENAI_TIMEOUT)
+            )
+            _async_clients[api_key] = client
+        return client
+
+
+class AsyncAPIMemoryTrainer(APIMemoryTrainer):
+    """
+    APIMemoryTrainer whose LLM calls are awaited instead of blocking a thread.
+    Sessions share the process-wide clients (sync and async) of their API key.
+    """
+
+    def __init__(self, session_id: str, *args, **kwargs):
+        super().__init__(session_id, *args, **kwargs)
+        self.aclient = get_async_openai(kwargs.get("api_key"))
+        self.evaluator.async_openai = self.aclient
+        self.context.auto_compact = False  # Folded by a task on the event loop, see _acall_llm
+        self._compact_task = None
+        self.lock = asyncio.Lock()  # Keeps this session's turns in order
+
+    # LLM calls
+
+    async def _acall_llm(self, system_prompt: str = None, include_history: bool = True,
+                         purpose: str = "chat") -> Optional[str]:
+        """Async _call_llm"""
+        if include_history and self.context.over_budget():
+            # Summarized in the background; this call still sends the folded turns
+            self.context.fold()
+            self._compact_task = asyncio.ensure_future(self._acompact_context())
+        messages = self._llm_messages(system_prompt, include_history)
+
+        try:
+            response = await self.aclient.chat.completions.create(
+                model=self.model,
+                messages=messages,
+            )
+            self._record_usage(purpose, messages, response)
+            return response.choices[0].message.content
+        except Exception as e:
+            print(f"Error calling LLM: {e}")
+            return None
+
+    async def _acompact_context(self):
+        """Summarize the turns fold() moved out of the window into the rolling summary"""
+        messages = self._summary_messages(self.context.summary, self.context.pending)
+        summary = None
+        try:
+            response = await self.aclient.chat.completions.create(
+                model=self.model,
+                messages=messages,
+            )
+            self._record_usage("summarize", messages, response)
+            summary = response.choices[0].message.content
+        except Exception as e:
+            print(f"Error summarizing history: {e}")
+        finally:
+            self.context.merge_summary(summary)
+
+    async def _aevaluate_answer(self, question: str, expected_answer: str, user_answer: str, attempt: int,
+                                hints: Optional[list] = None, provisional: bool = False) -> dict:
+        """Async _evaluate_answer"""
+        if hints and provisional:
+            verdict = await self.evaluator.aevaluate(user_answer, expected_answer, tiers=CHEAP_TIERS)
+            return self._evaluation_result(verdict, attempt, hints, provisional=True)
+        if hints:
+            prompt = self._grade_prompt(question, expected_answer, user_answer)
+        else:
+            prompt = self._evaluation_prompt(question, expected_answer, user_answer, attempt)
+
+        async def llm_judge():
+            response = await self._acall_llm(system_prompt=prompt, include_history=False, purpose="evaluation")
+            return self._parse_json(response)
+
+        verdict = await self.evaluator.aevaluate(user_answer, expected_answer, llm_judge=llm_judge,
+                                                 allow_reject=bool(hints))
+        return self._evaluation_result(verdict, attempt, hints)
+
+    async def _agrade_answer(self, question: str, expected_answer: str, user_answer: str) -> Optional[dict]:
+        """Async _llm_grade_answer"""
+        grade_prompt = self._grade_prompt(question, expected_answer, user_answer)
+        response = await self._acall_llm(system_prompt=grade_prompt, include_history=False, purpose="evaluation")
+        return self._parse_json(response)
+
+    async def _agenerate_hints(self, question: str, expected_answer: str) -> Optional[list]:
+        """Async _generate_hints"""
+        hints_prompt = self._hints_prompt(question, expected_answer)
+        response = await self._acall_llm(system_prompt=hints_prompt, include_history=False, purpose="hints")
+        return self._parse_hints(response)
+
+    def _prefetch_hints(self):
+        """Hints are written by a task on the event loop instead of the thread pool"""
+        self._cancel_hint_prefetch()
+        self._hint_future = asyncio.ensure_future(
+            self._agenerate_hints(self.current_qa.question, self.current_qa.answer)
+        )
+
+    # Session flow
+
+    async def astart_warmup(self) -> dict:
+        """Async start_warmup"""
+        self.session_data["start_time"] = datetime.now()
+        self.phase = "warmup"
+
+        greeting = await self._acall_llm(WARMUP_PROMPT, purpose="warmup")
+        return self._warmup_result(greeting)
+
+    async def ahandle_warmup_response(self, user_message: str) -> dict:
+        """Async handle_warmup_response"""
+        self._add_message("user", user_message)
+
+        response = await self._acall_llm(system_prompt=TRANSITION_PROMPT, purpose="warmup")
+        return self._transition_result(response)
+
+    async def astart_training(self, num_questions: int = 3) -> dict:
+        """Async start_training - question selection (SQLite) runs off the event loop"""
+        questions = await asyncio.to_thread(self._select_questions, num_questions)
+        return self._begin_training(questions)
+
+    async def asubmit_answer(self, user_answer: str) -> dict:
+        """Async submit_answer"""
+        if not self.current_qa:
+            return {"success": False, "error": "No active question"}
+
+        last_attempt = self.current_attempt + 1 >= MAX_ATTEMPTS
+        running = [future for future, _ in self._grades if not future.done()]
+        if last_attempt and running:
+            await asyncio.wait(running)
+        accepted_attempt = self._accepted_grade()
+        if accepted_attempt is not None:
+            return self._accept_earlier_answer(user_answer, accepted_attempt)
+
+        hints = self._prefetched_hints()
+        evaluation = await self._aevaluate_answer(
+            self.current_qa.question,
+            self.current_qa.answer,
+            user_answer,
+            self.current_attempt,
+            hints=hints,
+            provisional=not last_attempt
+        )
+        if evaluation.get("provisional"):
+            self._grades.append((asyncio.ensure_future(
+                self._agrade_answer(self.current_qa.question, self.current_qa.answer, user_answer)
+            ), self.current_attempt))
+        return self._answer_result(user_answer, evaluation, hints)
+
+    async def aget_summary(self) -> dict:
+        """Async get_summary - the database write runs off the event loop"""
+        results = self.session_data["qa_results"]
+        correct_count = sum(1 for r in results.values() if r["correct"])
+        total_count = len(results)
+
+        if total_count == 0:
+            return self._summary_result(None, 0, 0)
+
+        summary_prompt = self._session_summary_prompt(correct_count, total_count)
+        summary = await self._acall_llm(system_prompt=summary_prompt, include_history=False, purpose="summary")
+
+        await asyncio.to_thread(self._update_database)
+
+        return self._summary_result(summary, correct_count, total_count)
+
+
+# =============================================================================
+# API Endpoints
+# =============================================================================
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat(), "sessions": len(sessions)})
+
+
+@app.route('/api/session/start', methods=['POST'])
+async def start_session():
+    """Start a new training session"""
+    try:
+        data = await request.get_json(silent=True) or {}
+
+        # Get API key from request or environment
+        api_key = data.get('api_key') or os.getenv("OPENAI_API_KEY")
+        model = data.get('model', 'gpt-5-mini-2025-08-07')
+
+        session_id = str(uuid.uuid4())
+        await asyncio.to_thread(get_qa_db)  # Opens the SQLite database on first use
+        trainer = AsyncAPIMemoryTrainer(
+            session_id=session_id,
+            api_key=api_key,
+            model=model
+        )
+
+        # Start warmup phase
+        result = await trainer.astart_warmup()
+
+        if result["success"]:
+            sessions[session_id] = trainer
+            result["session_id"] = session_id
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 500
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/warmup', methods=['POST'])
+async def warmup_response(session_id):
+    """Send user message during warmup phase"""
+    try:
+        trainer = sessions.get(session_id)
+        if not trainer:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        data = await request.get_json(silent=True) or {}
+        user_message = data.get('message', '')
+
+        if not user_message:
+            return jsonify({"success": False, "error": "Message is required"}), 400
+
+        async with trainer.lock:
+            result = await trainer.ahandle_warmup_response(user_message)
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/training/start', methods=['POST'])
+async def start_training(session_id):
+    """Start training phase with questions"""
+    try:
+        trainer = sessions.get(session_id)
+        if not trainer:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        data = await request.get_json(silent=True) or {}
+        num_questions = data.get('num_questions', 3)
+
+        async with trainer.lock:
+            result = await trainer.astart_training(num_questions)  # Hints prefetch as a task
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/answer', methods=['POST'])
+async def submit_answer(session_id):
+    """Submit answer to current question"""
+    try:
+        trainer = sessions.get(session_id)
+        if not trainer:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        data = await request.get_json(silent=True) or {}
+        user_answer = data.get('answer', '')
+
+        if not user_answer:
+            return jsonify({"success": False, "error": "Answer is required"}), 400
+
+        async with trainer.lock:
+            result = await trainer.asubmit_answer(user_answer)
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/next', methods=['POST'])
+async def next_question(session_id):
+    """Get next question in training"""
+    try:
+        trainer = sessions.get(session_id)
+        if not trainer:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        async with trainer.lock:
+            result = trainer.get_next_question()
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/summary', methods=['GET'])
+async def get_summary(session_id):
+    """Get session summary and stats"""
+    try:
+        trainer = sessions.get(session_id)
+        if not trainer:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        async with trainer.lock:
+            result = await trainer.aget_summary()
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/end', methods=['POST'])
+async def end_session(session_id):
+    """End session and clean up"""
+    try:
+        trainer = sessions.get(session_id)
+        if not trainer:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        async with trainer.lock:
+            result = await trainer.aget_summary()
+            trainer._cancel_hint_prefetch()
+            trainer._drop_grades()
+
+        # Clean up session
+        sessions.pop(session_id, None)
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/status', methods=['GET'])
+async def get_status(session_id):
+    """Get current session status"""
+    try:
+        trainer = sessions.get(session_id)
+        if not trainer:
+            return jsonify({"success": False, "error": "Session not found"}), 404
+
+        return jsonify({
+            "success": True,
+            "session_id": session_id,
+            "phase": trainer.phase,
+            "current_question_index": trainer.current_question_index,
+            "total_questions": len(trainer.selected_questions),
+            "results": trainer.session_data["qa_results"],
+            "evaluator": trainer.evaluator.stats(),
+            "token_usage": trainer.token_report()
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =============================================================================
+# QA Database Management Endpoints (SQLite calls run in a worker thread)
+# =============================================================================
+
+@app.route('/api/qa', methods=['GET'])
+async def get_all_qas():
+    """Get Q&A pairs, one page at a time (?limit=&offset=)"""
+    try:
+        page = await asyncio.to_thread(qa_page, get_qa_db(), request.args)
+        return jsonify(page), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/qa/<qa_id>', methods=['GET'])
+async def get_qa(qa_id):
+    """Get specific Q&A by ID"""
+    try:
+        qa = await asyncio.to_thread(get_qa_db().get_qa, qa_id)
+
+        if not qa:
+            return jsonify({"success": False, "error": "QA not found"}), 404
+
+        return jsonify({"success": True, "data": qa_to_dict(qa)}), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/qa', methods=['POST'])
+async def create_qa():
+    """Create new Q&A pair"""
+    try:
+        data = await request.get_json(silent=True) or {}
+        question = data.get('question', '').strip()
+        answer = data.get('answer', '').strip()
+
+        if not question or not answer:
+            return jsonify({
+                "success": False,
+                "error": "Question and answer are required"
+            }), 400
+
+        qa = new_qa(question, answer)
+        await asyncio.to_thread(get_qa_db().add_qa, qa)
+
+        return jsonify({
+            "success": True,
+            "data": {
+                "id": qa.id,
+                "question": qa.question,
+                "answer": qa.answer
+            }
+        }), 201
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/qa/<qa_id>', methods=['PUT'])
+async def update_qa(qa_id):
+    """Update existing Q&A pair"""
+    try:
+        db = get_qa_db()
+        qa = await asyncio.to_thread(db.get_qa, qa_id)
+
+        if not qa:
+            return jsonify({"success": False, "error": "QA not found"}), 404
+
+        data = await request.get_json(silent=True) or {}
+
+        if 'question' in data:
+            qa.question = data['question'].strip()
+        if 'answer' in data:
+            qa.answer = data['answer'].strip()
+
+        await asyncio.to_thread(db.update_qa, qa_id, qa)
+
+        return jsonify({
+            "success": True,
+            "data": {
+                "id": qa.id,
+                "question": qa.question,
+                "answer": qa.answer
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/api/qa/<qa_id>', methods=['DELETE'])
+async def delete_qa(qa_id):
+    """Delete Q&A pair"""
+    try:
+        db = get_qa_db()
+        qa = await asyncio.to_thread(db.get_qa, qa_id)
+
+        if not qa:
+            return jsonify({"success": False, "error": "QA not found"}), 404
+
+        await asyncio.to_thread(db.delete_qa, qa_id)
+
+        return jsonify({"success": True, "message": "QA deleted"}), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=8000)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Conversation Context - bounded LLM context for a training session
+
+Keeps the most recent turns inside a token budget. Older turns are folded
+into a rolling summary instead of being resent on every call, so prompt size
+stays flat over a 30-minute session. The summary is written off the request
+path; until it arrives the folded turns are still sent verbatim.
+"""
+
+import threading
+from typing import Callable, Optional
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional - fall back to ~4 characters per token
+    _encoding = None
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators per chat message
+MIN_FOLD_TURNS = 4  # Summarize in batches, never one LLM call per turn
+
+
+def count_tokens(text: str) -> int:
+    """Token count of a string (estimated when tiktoken is not installed)"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(messages: list) -> int:
+    """Token count of a chat message list"""
+    return sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(m["content"]) for m in messages)
+
+
+class ConversationContext:
+    def __init__(self, summarize: Callable[[str, list], Optional[str]] = None,
+                 max_tokens: int = 1200, keep_recent: int = 4, auto_compact: bool = True):
+        """
+        summarize(previous_summary, turns) -> new summary, called when old
+        turns are folded out of the window.
+        max_tokens: budget for the summary plus the recent turns.
+        keep_recent: turns that always stay verbatim.
+        auto_compact: when add() goes over budget, summarize on a background
+        thread. Async callers turn it off and run fold() / merge_summary()
+        in a task instead.
+        """
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.auto_compact = auto_compact
+        self.summary = ""
+        self.turns = []
+        self.pending = []  # Folded turns whose summary is still being written
+        self._lock = threading.Lock()
+
+    def add(self, role: str, content: str):
+        """Add a turn and start folding older turns into the summary if over budget"""
+        with self._lock:
+            self.turns.append({"role": role, "content": content})
+        if self.auto_compact and self.over_budget():
+            self._compact()
+
+    def messages(self, system_prompt: str = None) -> list:
+        """Messages for the next call: system prompt, rolling summary, recent turns"""
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        with self._lock:
+            if self.summary:
+                messages.append({"role": "system", "content": f"Earlier in this session: {self.summary}"})
+            messages.extend(self.pending)
+            messages.extend(self.turns)
+        return messages
+
+    def tokens(self) -> int:
+        """Tokens the summary and recent turns add to every call"""
+        summary_tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(self.summary) if self.summary else 0
+        return summary_tokens + count_message_tokens(self.pending) + count_message_tokens(self.turns)
+
+    def over_budget(self) -> bool:
+        """True once enough old turns have piled up to fold them (and no fold is in progress)"""
+        return (not self.pending and self.tokens() > self.max_tokens and
+                len(self.turns) >= self.keep_recent + MIN_FOLD_TURNS)
+
+    def fold(self) -> list:
+        """
+        Move the oldest turns out of the window until it is back under half
+        the budget and return them. They stay in messages() as pending until
+        merge_summary() is called.
+        """
+        with self._lock:
+            folded = []
+            while len(self.turns) > self.keep_recent and self._window_tokens() > self.max_tokens // 2:
+                folded.append(self.turns.pop(0))
+            self.pending = folded
+        return folded
+
+    def merge_summary(self, new_summary: Optional[str]):
+        """Replace the rolling summary and drop the pending turns (a failed summary keeps the old one)"""
+        with self._lock:
+            if new_summary:
+                self.summary = new_summary.strip()
+            self.pending = []
+
+    def _window_tokens(self) -> int:
+        summary_tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(self.summary) if self.summary else 0
+        return summary_tokens + count_message_tokens(self.turns)
+
+    def _compact(self):
+        """Fold the oldest turns and summarize them on a background thread"""
+        folded = self.fold()
+        if not folded or not self.summarize:
+            self.merge_summary(None)
+            return
+        previous_summary = self.summary
+        threading.Thread(
+            target=lambda: self.merge_summary(self.summarize(previous_summary, folded)),
+            daemon=True
+        ).start()
@@ -4,20 +4,48 @@ Memory Trainer - AI agent for memory training sessions
 """
 
 import os
+import sys
 import time
 import threading
+from collections import deque
 from datetime import datetime
 from typing import Optional
 from openai import OpenAI
 from qa_database import QADatabase, QA
+# The answer evaluator (and its keyword index) is shared with rag_agent: one copy, in rag_agent/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'rag_agent'))
+from answer_evaluator import AnswerEvaluator, TIERS
+from conversation_context import ConversationContext, count_message_tokens
+
+REVIEW_LOG_PATH = "qa_reviews.jsonl"
+# Answers this far from the expected one (cosine) are judged wrong without
+# the LLM, so the prefetched hint is served at once
+EMBEDDING_REJECT_THRESHOLD = 0.25
+TOKEN_USAGE_DETAIL = 20  # Recent calls kept verbatim; older ones only count in the totals
+CHEAP_TIERS = tuple(tier for tier in TIERS if tier != "llm")  # Answered without a round trip to GPT
+
+WARMUP_PROMPT = """You are a friendly, empathetic memory training assistant. 
+This is the WARM-UP phase only - just casual conversation, NO memory exercises or tests yet.
+Keep it brief (1-2 sentences). Ask how they're feeling today.
+Do NOT give memory tasks, word lists, or exercises during warm-up."""
+
+TRANSITION_PROMPT = """Acknowledge their response briefly (1 sentence) and say you'll now start the memory questions.
+Do NOT create new memory exercises - the questions are coming from the database next."""
 
 
 class MemoryTrainer:
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-5-mini-2025-08-07"):
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-5-mini-2025-08-07",
+                 db: Optional[QADatabase] = None, client: Optional[OpenAI] = None):
+        # Servers pass one shared client; the CLI gets its own
+        self.client = client or OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
         self.model = model
-        self.db = QADatabase()
-        self.conversation_history = []
+        self.db = db or QADatabase()
+        self.evaluator = AnswerEvaluator(self.client, thresholds={"embedding_reject": EMBEDDING_REJECT_THRESHOLD})
+        self.conversation_history = []  # Full transcript, for the session log only
+        self.context = ConversationContext(summarize=self._summarize_turns)  # What the LLM sees
+        self.token_usage = deque(maxlen=TOKEN_USAGE_DETAIL)  # Recent calls
+        self.token_totals = {}  # purpose -> aggregated counts over the whole session
+        self._usage_lock = threading.Lock()  # Summaries are recorded from a background thread
         self.session_data = {
             "start_time": None,
             "qa_results": {},  # id -> {correct: bool, attempts: int}
@@ -26,15 +54,16 @@ class MemoryTrainer:
     def _add_message(self, role: str, content: str):
         """Add message to conversation history"""
         self.conversation_history.append({"role": role, "content": content})
+        self.context.add(role, content)
     
-    def _call_llm(self, system_prompt: str = None) -> Optional[str]:
-        """Call LLM with current conversation state"""
-        messages = []
-        
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        
-        messages.extend(self.conversation_history)
+    def _call_llm(self, system_prompt: str = None, include_history: bool = True,
+                  purpose: str = "chat") -> Optional[str]:
+        """
+        Call LLM with current conversation state
+        include_history=False sends only the system prompt (evaluation, summary),
+        otherwise the bounded context window is appended.
+        """
+        messages = self._llm_messages(system_prompt, include_history)
         
         try:
             # GPT-5 only supports default temperature (1)
@@ -42,11 +71,79 @@ class MemoryTrainer:
                 model=self.model,
                 messages=messages,
             )
+            self._record_usage(purpose, messages, response)
             return response.choices[0].message.content
         except Exception as e:
             print(f"Error calling LLM: {e}")
             return None
     
+    def _llm_messages(self, system_prompt: str = None, include_history: bool = True) -> list:
+        """System prompt alone, or followed by the bounded context window"""
+        if include_history:
+            return self.context.messages(system_prompt)
+        return [{"role": "system", "content": system_prompt}]
+    
+    def _summarize_turns(self, previous_summary: str, turns: list) -> Optional[str]:
+        """Fold turns that left the context window into the rolling summary"""
+        messages = self._summary_messages(previous_summary, turns)
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+            )
+            self._record_usage("summarize", messages, response)
+            return response.choices[0].message.content
+        except Exception as e:
+            # The folded turns are dropped; the window stays bounded either way
+            print(f"Error summarizing history: {e}")
+            return None
+    
+    def _summary_messages(self, previous_summary: str, turns: list) -> list:
+        transcript = "\n".join(f"{t['role'].upper()}: {t['content']}" for t in turns)
+        return [
+            {"role": "system", "content": "Update the running summary of this memory training session. "
+                                          "Keep how the patient is feeling and which questions they got right or wrong. "
+                                          "2-3 sentences."},
+            {"role": "user", "content": f"Summary so far: {previous_summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ]
+    
+    def _record_usage(self, purpose: str, messages: list, response):
+        """Add a call's token counts to the per-purpose totals and the recent calls"""
+        usage = getattr(response, "usage", None)
+        call = {
+            "purpose": purpose,
+            "messages": len(messages),
+            "estimated_prompt_tokens": count_message_tokens(messages),
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None)
+        }
+        prompt = call["prompt_tokens"] or call["estimated_prompt_tokens"]
+        with self._usage_lock:
+            self.token_usage.append(call)
+            stats = self.token_totals.setdefault(
+                purpose, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "max_prompt_tokens": 0}
+            )
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt
+            stats["completion_tokens"] += call["completion_tokens"] or 0
+            stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], prompt)
+    
+    def token_report(self) -> dict:
+        """Token totals per purpose - prompt size should stay flat across a session"""
+        with self._usage_lock:
+            by_purpose = {purpose: dict(stats) for purpose, stats in self.token_totals.items()}
+            recent = list(self.token_usage)
+        
+        return {
+            "calls": sum(s["calls"] for s in by_purpose.values()),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in by_purpose.values()),
+            "completion_tokens": sum(s["completion_tokens"] for s in by_purpose.values()),
+            "context_tokens": self.context.tokens(),
+            "by_purpose": by_purpose,
+            "calls_detail": recent
+        }
+    
     def _get_user_input(self, prompt: str, timeout: int = 60, max_retries: int = 3) -> Optional[str]:
         """Get user input with timeout and retry logic"""
         for attempt in range(max_retries):
@@ -78,10 +175,8 @@ class MemoryTrainer:
         return None
     
     def _select_questions(self, k: int = 3) -> list[QA]:
-        """Select top k questions by last use time (ascending)"""
-        all_qas = self.db.get_all_qas()
-        sorted_qas = sorted(all_qas, key=lambda qa: qa.last_use_time)
-        return sorted_qas[:k]
+        """Select the k most overdue questions from the review schedule"""
+        return self.db.get_due_qas(k)
     
     def _warm_up(self, max_duration: int = 300) -> bool:
         """Warm up phase (brief casual conversation)"""
@@ -92,13 +187,8 @@ class MemoryTrainer:
         
         start_time = time.time()
         
-        system_prompt = """You are a friendly, empathetic memory training assistant. 
-This is the WARM-UP phase only - just casual conversation, NO memory exercises or tests yet.
-Keep it brief (1-2 sentences). Ask how they're feeling today.
-Do NOT give memory tasks, word lists, or exercises during warm-up."""
-        
         # LLM initiates warm up
-        greeting = self._call_llm(system_prompt)
+        greeting = self._call_llm(WARMUP_PROMPT, purpose="warmup")
         if not greeting:
             return False
         
@@ -126,10 +216,7 @@ Do NOT give memory tasks, word lists, or exercises during warm-up."""
             return True
         
         # Brief acknowledgment to transition to training
-        transition_prompt = """Acknowledge their response briefly (1 sentence) and say you'll now start the memory questions.
-Do NOT create new memory exercises - the questions are coming from the database next."""
-        
-        followup = self._call_llm(system_prompt=transition_prompt)
+        followup = self._call_llm(system_prompt=TRANSITION_PROMPT, purpose="warmup")
         if not followup:
             return False
         
@@ -141,15 +228,63 @@ Do NOT create new memory exercises - the questions are coming from the database
         
         return True
     
-    def _evaluate_answer(self, question: str, expected_answer: str, user_answer: str, attempt: int) -> dict:
+    def _evaluate_answer(self, question: str, expected_answer: str, user_answer: str, attempt: int,
+                         hints: Optional[list] = None, provisional: bool = False) -> dict:
+        """
+        Evaluate user's answer - exact, fuzzy and embedding checks first, the LLM only if they abstain
+        With pre-generated hints the LLM only grades, and the hint for this attempt is served from them;
+        a clearly unrelated answer is then rejected by the embedding tier without waiting for the LLM.
+        With provisional=True as well the LLM is not called at all: an answer the cheaper tiers
+        cannot judge gets the hint at once, marked provisional, for the caller to grade in the background.
+        Without hints only the LLM may reject, since its evaluation writes the hint.
+        """
+        if hints and provisional:
+            verdict = self.evaluator.evaluate(user_answer, expected_answer, tiers=CHEAP_TIERS)
+            return self._evaluation_result(verdict, attempt, hints, provisional=True)
+        
+        if hints:
+            llm_judge = lambda: self._llm_grade_answer(question, expected_answer, user_answer)
+        else:
+            llm_judge = lambda: self._llm_evaluate_answer(question, expected_answer, user_answer, attempt)
+        
+        verdict = self.evaluator.evaluate(user_answer, expected_answer, llm_judge=llm_judge,
+                                          allow_reject=bool(hints))
+        return self._evaluation_result(verdict, attempt, hints)
+    
+    def _evaluation_result(self, verdict: dict, attempt: int, hints: Optional[list] = None,
+                           provisional: bool = False) -> dict:
+        """Turn an evaluator verdict into feedback, serving the prefetched hint for this attempt"""
+        if verdict["llm_result"] is not None:
+            result = {**verdict["llm_result"], "tier": "llm"}
+            if hints and not result.get("correct"):
+                result["hint"] = hints[min(attempt, len(hints) - 1)]
+            return result
+        
+        if verdict["correct"]:
+            return {"correct": True, "feedback": "Well remembered!", "hint": "", "tier": verdict["tier"]}
+        
+        hint = hints[min(attempt, len(hints) - 1)] if hints else ""
+        if verdict["tier"] == "unresolved" and provisional:
+            # Not judged yet: the LLM grades it in the background
+            return {"correct": False, "feedback": "Not quite.", "hint": hint, "tier": "pending", "provisional": True}
+        feedback = "Unable to evaluate" if verdict["tier"] == "unresolved" else "Not quite."
+        return {"correct": False, "feedback": feedback, "hint": hint, "tier": verdict["tier"]}
+    
+    def _llm_evaluate_answer(self, question: str, expected_answer: str, user_answer: str, attempt: int) -> Optional[dict]:
         """Evaluate user's answer using LLM"""
+        eval_prompt = self._evaluation_prompt(question, expected_answer, user_answer, attempt)
+        # Only the current question and answer - the transcript adds nothing to grading
+        response = self._call_llm(system_prompt=eval_prompt, include_history=False, purpose="evaluation")
+        return self._parse_json(response)
+    
+    def _evaluation_prompt(self, question: str, expected_answer: str, user_answer: str, attempt: int) -> str:
         hint_instruction = ""
         if attempt == 0:
             hint_instruction = "Provide a very subtle hint - ask a guiding question or mention context WITHOUT revealing the answer."
         elif attempt == 1:
             hint_instruction = "Provide a slightly more specific hint - give category/context but still DO NOT reveal the answer directly."
         
-        eval_prompt = f"""Evaluate if the user's answer is correct.
+        return f"""Evaluate if the user's answer is correct.
 
 Question: {question}
 Expected answer: {expected_answer}
@@ -163,12 +298,54 @@ Examples of BAD hints (DO NOT USE): "Your daughter", "It was your daughter", "Th
 
 Respond with ONLY a JSON object:
 {{"correct": true/false, "feedback": "brief feedback", "hint": "hint if incorrect or empty string"}}"""
-        
-        response = self._call_llm(system_prompt=eval_prompt)
+    
+    def _llm_grade_answer(self, question: str, expected_answer: str, user_answer: str) -> Optional[dict]:
+        """Grade user's answer using LLM, without writing a hint"""
+        grade_prompt = self._grade_prompt(question, expected_answer, user_answer)
+        response = self._call_llm(system_prompt=grade_prompt, include_history=False, purpose="evaluation")
+        return self._parse_json(response)
+    
+    def _grade_prompt(self, question: str, expected_answer: str, user_answer: str) -> str:
+        return f"""Evaluate if the user's answer is correct.
+
+Question: {question}
+Expected answer: {expected_answer}
+User's answer: {user_answer}
+
+Respond with ONLY a JSON object:
+{{"correct": true/false, "feedback": "brief feedback"}}"""
+    
+    def _generate_hints(self, question: str, expected_answer: str) -> Optional[list]:
+        """Generate the graded hints for a question (attempt 0 and attempt 1) in one call"""
+        hints_prompt = self._hints_prompt(question, expected_answer)
+        response = self._call_llm(system_prompt=hints_prompt, include_history=False, purpose="hints")
+        return self._parse_hints(response)
+    
+    def _hints_prompt(self, question: str, expected_answer: str) -> str:
+        return f"""Write two hints for a memory training question.
+
+Question: {question}
+Answer (NEVER reveal it): {expected_answer}
+
+Hint 1: a very subtle hint - ask a guiding question or mention context WITHOUT revealing the answer.
+Hint 2: a slightly more specific hint - give category/context but still DO NOT reveal the answer directly.
+
+Examples of GOOD hints: "Think about who you spent time with", "What family member?", "Who do you usually meet for lunch?"
+Examples of BAD hints (DO NOT USE): "Your daughter", "It was your daughter", "The answer is..."
+
+Respond with ONLY a JSON object:
+{{"hints": ["hint 1", "hint 2"]}}"""
+    
+    def _parse_hints(self, response: Optional[str]) -> Optional[list]:
+        result = self._parse_json(response)
+        hints = [h for h in (result or {}).get("hints", []) if isinstance(h, str) and h.strip()]
+        return hints or None
+    
+    def _parse_json(self, response: Optional[str]) -> Optional[dict]:
+        """Parse a JSON-only LLM response (None if missing or malformed)"""
         if not response:
-            return {"correct": False, "feedback": "Unable to evaluate", "hint": ""}
+            return None
         
-        # Parse JSON response
         try:
             import json
             # Extract JSON from response (handle markdown code blocks)
@@ -178,12 +355,13 @@ Respond with ONLY a JSON object:
                 response = "\n".join(lines[1:-1])
             return json.loads(response)
         except:
-            return {"correct": False, "feedback": "Unable to evaluate", "hint": ""}
+            return None
     
     def _ask_question(self, qa: QA, timeout_per_attempt: int = 60) -> bool:
         """Ask a question and handle response with retries"""
         print(f"\n{'-'*50}")
         print(f"A: {qa.question}")
+        self._add_message("assistant", qa.question)
         
         max_attempts = 3
         
@@ -193,19 +371,24 @@ Respond with ONLY a JSON object:
                 self.session_data["qa_results"][qa.id] = {"correct": False, "attempts": attempt + 1}
                 return False
             
+            self._add_message("user", user_answer)
+            
             # Evaluate answer
             evaluation = self._evaluate_answer(qa.question, qa.answer, user_answer, attempt)
             
             if evaluation["correct"]:
                 print(f"\nA: ✓ Correct! {evaluation['feedback']}")
+                self._add_message("assistant", f"Correct! {evaluation['feedback']}")
                 self.session_data["qa_results"][qa.id] = {"correct": True, "attempts": attempt + 1}
                 return True
             else:
                 if attempt < max_attempts - 1:
                     hint = evaluation.get("hint", "Think about it again.")
                     print(f"\nA: Not quite. {hint}")
+                    self._add_message("assistant", f"Not quite. {hint}")
                 else:
                     print(f"\nA: The answer was: {qa.answer}")
+                    self._add_message("assistant", f"The answer was: {qa.answer}")
                     self.session_data["qa_results"][qa.id] = {"correct": False, "attempts": attempt + 1}
         
         return False
@@ -220,22 +403,26 @@ Respond with ONLY a JSON object:
         correct_count = sum(1 for r in results.values() if r["correct"])
         total_count = len(results)
         
-        summary_prompt = f"""Provide an encouraging summary of the memory training session.
+        summary_prompt = self._session_summary_prompt(correct_count, total_count)
+        summary = self._call_llm(system_prompt=summary_prompt, include_history=False, purpose="summary")
+        if summary:
+            print(f"\nA: {summary}")
+        
+        print(f"\n📊 Stats: {correct_count}/{total_count} correct ({correct_count/total_count*100:.0f}%)")
+    
+    def _session_summary_prompt(self, correct_count: int, total_count: int) -> str:
+        return f"""Provide an encouraging summary of the memory training session.
 - Questions answered: {total_count}
 - Correct answers: {correct_count}
 - Success rate: {correct_count/total_count*100:.0f}%
 
 Be positive, highlight achievements, and provide gentle encouragement. Keep it brief (2-3 sentences)."""
-        
-        summary = self._call_llm(system_prompt=summary_prompt)
-        if summary:
-            print(f"\nA: {summary}")
-        
-        print(f"\n📊 Stats: {correct_count}/{total_count} correct ({correct_count/total_count*100:.0f}%)")
     
     def _update_database(self):
         """Update QA database with session results"""
         now = datetime.now()
+        updated = []
+        reviews = []
         
         for qa_id, result in self.session_data["qa_results"].items():
             qa = self.db.get_qa(qa_id)
@@ -248,10 +435,35 @@ Be positive, highlight achievements, and provide gentle encouragement. Keep it b
                 new_success = 1.0 if result["correct"] else 0.0
                 qa.success_rate = (old_total + new_success) / qa.practice_times
                 
-                self.db.update_qa(qa_id, qa)
-        
+                # Reschedule the next review
+                self.db.scheduler.review(qa, result["correct"], result["attempts"], now)
+                updated.append(qa)
+                reviews.append({
+                    "time": now.isoformat(),
+                    "qa_id": qa_id,
+                    "question": qa.question,
+                    "correct": result["correct"],
+                    "attempts": result["attempts"],
+                    "scheduler": self.db.scheduler.name,
+                    "due_time": qa.due_time.isoformat()
+                })
+        
+        self.db.update_qas(updated)  # One transaction for the whole session
+        self._log_reviews(reviews)
         print(f"\n✓ Database updated ({len(self.session_data['qa_results'])} QAs)")
     
+    def _log_reviews(self, reviews: list):
+        """Append review events to the review log (replayed by simulate_scheduler.py)"""
+        if not reviews:
+            return
+        try:
+            import json
+            with open(REVIEW_LOG_PATH, 'a', encoding='utf-8') as f:
+                for review in reviews:
+                    f.write(json.dumps(review) + "\n")
+        except Exception as e:
+            print(f"⚠️ Could not write review log: {e}")
+    
     def _save_session_log(self):
         """Save conversation history to file"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -272,6 +484,14 @@ Be positive, highlight achievements, and provide gentle encouragement. Keep it b
                 qa = self.db.get_qa(qa_id)
                 status = "✓" if result["correct"] else "✗"
                 f.write(f"{status} {qa.question} (attempts: {result['attempts']})\n")
+            
+            f.write("\n" + "="*50 + "\n")
+            f.write("TOKEN USAGE\n")
+            f.write("="*50 + "\n")
+            
+            for purpose, stats in self.token_report()["by_purpose"].items():
+                f.write(f"{purpose}: {stats['calls']} calls, {stats['prompt_tokens']} prompt / "
+                        f"{stats['completion_tokens']} completion tokens (largest prompt {stats['max_prompt_tokens']})\n")
         
         print(f"✓ Session log saved: {log_file}")
     
@@ -1,5 +1,13 @@
+import os
+import sqlite3
+import threading
 from datetime import datetime
 from dataclasses import dataclass
+from typing import Optional
+from scheduler import DueQueue, SM2Scheduler, DEFAULT_EASE
+
+DEFAULT_DB_PATH = os.getenv("QA_DB_PATH", "qa_database.db")
+SEED_DEMO_QAS = os.getenv("QA_DB_SEED") == "1"  # Demo questions in a new SQLite database
 
 
 @dataclass
@@ -11,37 +19,173 @@ class QA:
     practice_times: int
     success_rate: float
     last_use_time: datetime
+    # Spaced-repetition state (see scheduler.py)
+    ease: float = DEFAULT_EASE
+    interval_days: float = 0.0
+    repetitions: int = 0
+    due_time: Optional[datetime] = None
+
+
+def _test_qas() -> list[QA]:
+    """Demo rows for the in-memory store (and a new SQLite database with QA_DB_SEED=1)"""
+    now = datetime.now()
+    return [
+        QA("1", "Who was having lunch with you yesterday?", "My daughter", now, 0, 0.0, now),
+        QA("2", "Where were you having lunch yesterday?", "At the Italian restaurant downtown", now, 0, 0.0, now),
+        QA("3", "What did you talk about with your daughter yesterday?", "Her new job promotion", now, 0, 0.0, now)
+    ]
 
 
 class QADatabase:
-    def __init__(self):
-        self._db = {}
-        self._init_test_data()
-    
+    """
+    SQLite-backed QA store. Due-time selection, paging and updates go through
+    indexes, so they stay fast with tens of thousands of QAs.
+    """
+
+    COLUMNS = ("id", "question", "answer", "creation_time", "practice_times", "success_rate",
+               "last_use_time", "ease", "interval_days", "repetitions", "due_time")
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, scheduler=None, seed: Optional[bool] = None):
+        """
+        seed: add the demo QAs when the database is empty. Default: only for
+        ":memory:" or with QA_DB_SEED=1, so they never end up in real data.
+        """
+        self.path = path
+        self.scheduler = scheduler or SM2Scheduler()
+        self._lock = threading.Lock()  # One connection shared by the API's request threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._create_schema()
+
+        if seed is None:
+            seed = path == ":memory:" or SEED_DEMO_QAS
+        if seed and self.count_qas() == 0:
+            self._init_test_data()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS qas (
+                    id TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    creation_time TEXT NOT NULL,
+                    practice_times INTEGER NOT NULL DEFAULT 0,
+                    success_rate REAL NOT NULL DEFAULT 0.0,
+                    last_use_time TEXT NOT NULL,
+                    ease REAL NOT NULL DEFAULT 2.5,
+                    interval_days REAL NOT NULL DEFAULT 0.0,
+                    repetitions INTEGER NOT NULL DEFAULT 0,
+                    due_time TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_qas_due_time ON qas (due_time);
+                CREATE INDEX IF NOT EXISTS idx_qas_last_use_time ON qas (last_use_time);
+                CREATE INDEX IF NOT EXISTS idx_qas_success_rate ON qas (success_rate);
+                CREATE INDEX IF NOT EXISTS idx_qas_creation_time ON qas (creation_time, id);
+            """)
+
     def _init_test_data(self):
-        now = datetime.now()
-        test_qas = [
-            QA("1", "Who was having lunch with you yesterday?", "My daughter", now, 0, 0.0, now),
-            QA("2", "Where were you having lunch yesterday?", "At the Italian restaurant downtown", now, 0, 0.0, now),
-            QA("3", "What did you talk about with your daughter yesterday?", "Her new job promotion", now, 0, 0.0, now)
-        ]
-        for qa in test_qas:
-            self._db[qa.id] = qa
-    
+        for qa in _test_qas():
+            self.add_qa(qa)
+
+    def _to_row(self, qa: QA) -> tuple:
+        due_time = qa.due_time or qa.creation_time  # New QAs are due right away
+        return (qa.id, qa.question, qa.answer, qa.creation_time.isoformat(), qa.practice_times,
+                qa.success_rate, qa.last_use_time.isoformat(), qa.ease, qa.interval_days,
+                qa.repetitions, due_time.isoformat())
+
+    def _from_row(self, row: tuple) -> QA:
+        (id, question, answer, creation_time, practice_times, success_rate,
+         last_use_time, ease, interval_days, repetitions, due_time) = row
+        return QA(id, question, answer, datetime.fromisoformat(creation_time), practice_times,
+                  success_rate, datetime.fromisoformat(last_use_time), ease, interval_days,
+                  repetitions, datetime.fromisoformat(due_time))
+
+    def _query(self, sql: str, params: tuple = ()) -> list[QA]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM qas {sql}", params).fetchall()
+        return [self._from_row(row) for row in rows]
+
     def add_qa(self, qa: QA):
+        if qa.due_time is None:
+            qa.due_time = qa.creation_time
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT INTO qas ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                               self._to_row(qa))
+
+    def get_qa(self, id: str) -> QA:
+        qas = self._query("WHERE id = ?", (id,))
+        return qas[0] if qas else None
+
+    def get_all_qas(self, limit: Optional[int] = None, offset: int = 0) -> list[QA]:
+        """QAs in creation order, one page at a time when limit is given"""
+        if limit is None:
+            return self._query("ORDER BY creation_time, id")
+        return self._query("ORDER BY creation_time, id LIMIT ? OFFSET ?", (limit, offset))
+
+    def count_qas(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM qas").fetchone()[0]
+
+    def get_due_qas(self, k: int) -> list[QA]:
+        """The k QAs with the earliest due time (most overdue first)"""
+        return self._query("ORDER BY due_time, creation_time LIMIT ?", (k,))
+
+    def update_qa(self, id: str, qa: QA):
+        self.update_qas([qa])
+
+    def update_qas(self, qas: list[QA]):
+        """Write several QAs in one transaction"""
+        assignments = ", ".join(f"{column} = ?" for column in self.COLUMNS[1:])
+        rows = [self._to_row(qa)[1:] + (qa.id,) for qa in qas]
+        with self._lock, self._conn:
+            self._conn.executemany(f"UPDATE qas SET {assignments} WHERE id = ?", rows)
+
+    def delete_qa(self, id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM qas WHERE id = ?", (id,))
+
+
+class InMemoryQADatabase:
+    """Dict-backed QA store with the same interface, for demos and tests (nothing is persisted)"""
+
+    def __init__(self, scheduler=None):
+        self._db = {}
+        self.scheduler = scheduler or SM2Scheduler()
+        self._due = DueQueue()
+        for qa in _test_qas():
+            self.add_qa(qa)
+
+    def add_qa(self, qa: QA):
+        if qa.due_time is None:
+            qa.due_time = qa.creation_time  # New QAs are due right away
         self._db[qa.id] = qa
-    
+        self._due.push(qa.id, qa.due_time)
+
     def get_qa(self, id: str) -> QA:
         return self._db.get(id)
-    
-    def get_all_qas(self) -> list[QA]:
-        return list(self._db.values())
-    
+
+    def get_all_qas(self, limit: Optional[int] = None, offset: int = 0) -> list[QA]:
+        qas = list(self._db.values())
+        return qas[offset:] if limit is None else qas[offset:offset + limit]
+
+    def count_qas(self) -> int:
+        return len(self._db)
+
+    def get_due_qas(self, k: int) -> list[QA]:
+        """The k QAs with the earliest due time (most overdue first)"""
+        return [self._db[qa_id] for qa_id in self._due.peek(k)]
+
     def update_qa(self, id: str, qa: QA):
         self._db[id] = qa
-    
-    def delete_qa(self, id: str):
-        self._db.pop(id, None)
-
+        self._due.push(id, qa.due_time or qa.creation_time)
 
+    def update_qas(self, qas: list[QA]):
+        for qa in qas:
+            self.update_qa(qa.id, qa)
 
+    def delete_qa(self, id: str):
+        self._db.pop(id, None)
+        self._due.remove(id)
@@ -18,9 +18,13 @@ if ! python -c "import flask" 2>/dev/null; then
     echo ""
 fi
 
-# Run the API server
+# Run the API server (./run_api.sh --async for the ASGI server)
 echo "🚀 Server starting on http://localhost:8000"
 echo "   Press Ctrl+C to stop"
 echo ""
-python api.py
+if [ "$1" = "--async" ]; then
+    uvicorn api_async:app --host 0.0.0.0 --port 8000
+else
+    python api.py
+fi
 
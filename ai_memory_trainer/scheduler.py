@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Spaced-repetition scheduling for QAs
+
+- SM2Scheduler / LeitnerScheduler update a QA's ease, interval and due time
+  after each review
+- DueQueue is a min-heap keyed by due time: picking the k most overdue QAs
+  is O(k log n), rescheduling one is O(log n)
+"""
+
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+LAPSE_INTERVAL_DAYS = 1.0  # A missed QA comes back next session
+
+
+def review_quality(correct: bool, attempts: int) -> int:
+    """SM-2 quality (0-5) from a training result: first-try recall is 5, a miss is 1"""
+    if not correct:
+        return 1
+    return max(3, 6 - max(attempts, 1))  # 1 attempt → 5, 2 → 4, 3 → 3
+
+
+class SM2Scheduler:
+    """SuperMemo-2: intervals grow by a per-QA ease factor, misses reset them"""
+
+    name = "sm2"
+
+    def review(self, qa, correct: bool, attempts: int, now: datetime = None):
+        now = now or datetime.now()
+        quality = review_quality(correct, attempts)
+
+        if quality < 3:
+            qa.repetitions = 0
+            qa.interval_days = LAPSE_INTERVAL_DAYS
+        else:
+            qa.repetitions += 1
+            if qa.repetitions == 1:
+                qa.interval_days = 1.0
+            elif qa.repetitions == 2:
+                qa.interval_days = 6.0
+            else:
+                qa.interval_days = round(qa.interval_days * qa.ease, 2)
+
+        qa.ease = max(MIN_EASE, qa.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        qa.due_time = now + timedelta(days=qa.interval_days)
+        return qa
+
+
+class LeitnerScheduler:
+    """Leitner boxes: a first-try recall moves the QA up a box, a miss sends it back to box 1"""
+
+    name = "leitner"
+    BOX_INTERVALS_DAYS = [1, 2, 4, 8, 16, 32]
+
+    def review(self, qa, correct: bool, attempts: int, now: datetime = None):
+        now = now or datetime.now()
+        last_box = len(self.BOX_INTERVALS_DAYS) - 1
+
+        # repetitions doubles as the box index
+        if not correct:
+            qa.repetitions = 0
+        elif attempts <= 1:
+            qa.repetitions = min(qa.repetitions + 1, last_box)
+
+        qa.interval_days = float(self.BOX_INTERVALS_DAYS[qa.repetitions])
+        qa.due_time = now + timedelta(days=qa.interval_days)
+        return qa
+
+
+SCHEDULERS = {
+    SM2Scheduler.name: SM2Scheduler,
+    LeitnerScheduler.name: LeitnerScheduler
+}
+
+
+def get_scheduler(name: str = "sm2"):
+    """Scheduler instance by name"""
+    if name not in SCHEDULERS:
+        raise ValueError(f"Unknown scheduler '{name}' (choose from {', '.join(SCHEDULERS)})")
+    return SCHEDULERS[name]()
+
+
+class DueQueue:
+    """
+    Min-heap of (due_time, qa_id) with lazy deletion: a rescheduled or
+    removed QA leaves a stale entry behind that is skipped when popped.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}  # qa_id -> live heap entry
+        self._counter = itertools.count()  # Tie-breaker, keeps insertion order stable
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, qa_id: str, due_time: datetime):
+        """Add or reschedule a QA - O(log n)"""
+        self.remove(qa_id)
+        entry = [due_time, next(self._counter), qa_id, True]
+        self._entries[qa_id] = entry
+        heapq.heappush(self._heap, entry)
+
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._compact()
+
+    def remove(self, qa_id: str):
+        """Forget a QA - O(1), its heap entry is dropped lazily"""
+        entry = self._entries.pop(qa_id, None)
+        if entry is not None:
+            entry[-1] = False
+
+    def peek(self, k: int, due_before: Optional[datetime] = None) -> List[str]:
+        """
+        Ids of the k QAs with the earliest due time - O(k log n).
+        With due_before, only QAs due by then are returned.
+        """
+        popped = []
+        while self._heap and len(popped) < k:
+            entry = heapq.heappop(self._heap)
+            if not entry[-1]:
+                continue
+            if due_before is not None and entry[0] > due_before:
+                heapq.heappush(self._heap, entry)
+                break
+            popped.append(entry)
+
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+
+        return [entry[2] for entry in popped]
+
+    def _compact(self):
+        """Rebuild the heap without stale entries"""
+        self._heap = [entry for entry in self._heap if entry[-1]]
+        heapq.heapify(self._heap)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Scheduler Replay
+Replays past training results through each spaced-repetition scheduler and
+reports how well its due times matched what actually happened.
+
+Sources:
+- qa_reviews.jsonl (written by MemoryTrainer after every session)
+- session_log_*.txt (SESSION RESULTS section), only for sessions older than
+  the first review-log entry: later sessions wrote both files, and reading
+  both would replay every review twice
+
+For every recorded review the simulator checks whether the scheduler would
+have considered the QA due. Reviews of QAs that were not yet due are effort
+the scheduler would have saved; the success rate of due reviews shows whether
+its intervals are too long (low) or too short (very high).
+
+Usage:
+    python simulate_scheduler.py [--log qa_reviews.jsonl] [--sessions "session_log_*.txt"]
+"""
+
+import re
+import glob
+import json
+import argparse
+from datetime import datetime
+from collections import defaultdict
+from qa_database import QA
+from scheduler import SCHEDULERS
+
+RESULT_LINE = re.compile(r"^([✓✗]) (.+) \(attempts: (\d+)\)$")
+WORKLOAD_DAYS = 30
+
+
+def load_review_log(path: str) -> list:
+    """Review events from the JSONL review log"""
+    events = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                review = json.loads(line)
+                events.append({
+                    "time": datetime.fromisoformat(review["time"]),
+                    "question": review["question"],
+                    "correct": review["correct"],
+                    "attempts": review["attempts"]
+                })
+    except FileNotFoundError:
+        pass
+    return events
+
+
+def load_session_logs(pattern: str, before: datetime = None) -> list:
+    """Review events from the SESSION RESULTS section of session logs saved before a time"""
+    events = []
+    for path in sorted(glob.glob(pattern)):
+        match = re.search(r"session_log_(\d{8}_\d{6})", path)
+        if not match:
+            continue
+        session_time = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+        if before is not None and session_time >= before:
+            continue
+
+        in_results = False
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line == "SESSION RESULTS":
+                    in_results = True
+                elif line == "TOKEN USAGE":
+                    break
+                elif in_results:
+                    result = RESULT_LINE.match(line)
+                    if result:
+                        events.append({
+                            "time": session_time,
+                            "question": result.group(2),
+                            "correct": result.group(1) == "✓",
+                            "attempts": int(result.group(3))
+                        })
+    return events
+
+
+def replay(scheduler, events: list) -> dict:
+    """Run one scheduler over the review history, question by question"""
+    by_question = defaultdict(list)
+    for event in events:
+        by_question[event["question"]].append(event)
+
+    early = due = due_correct = 0
+    final_intervals = []
+
+    for question, history in by_question.items():
+        history.sort(key=lambda e: e["time"])
+        start = history[0]["time"]
+        qa = QA(question, question, "", start, 0, 0.0, start, due_time=start)
+
+        for event in history:
+            if event["time"] < qa.due_time:
+                early += 1
+            else:
+                due += 1
+                due_correct += event["correct"]
+            scheduler.review(qa, event["correct"], event["attempts"], event["time"])
+
+        final_intervals.append(qa.interval_days)
+
+    # Steady-state workload: reviews per QA over the next WORKLOAD_DAYS days
+    workload = sum(WORKLOAD_DAYS / max(i, 1.0) for i in final_intervals)
+
+    return {
+        "questions": len(by_question),
+        "reviews": early + due,
+        "early": early,
+        "due": due,
+        "due_success_rate": due_correct / due if due else 0.0,
+        "avg_interval_days": sum(final_intervals) / len(final_intervals) if final_intervals else 0.0,
+        "workload": workload
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay past reviews through each scheduler")
+    parser.add_argument('--log', default='qa_reviews.jsonl', help='Review log written by MemoryTrainer')
+    parser.add_argument('--sessions', default='session_log_*.txt', help='Glob of session logs to include')
+    args = parser.parse_args()
+
+    reviews = load_review_log(args.log)
+    # A session's log is saved after its reviews are logged, so this cut-off
+    # leaves out every session the review log already covers
+    first_review = min((e["time"] for e in reviews), default=None)
+    events = reviews + load_session_logs(args.sessions, before=first_review)
+    if not events:
+        print("❌ No review history found")
+        return
+
+    print(f"\n🔁 Replaying {len(events)} reviews\n")
+    print(f"{'scheduler':<10} {'questions':>9} {'early':>6} {'due':>5} {'due success':>12} "
+          f"{'avg interval':>13} {f'reviews/{WORKLOAD_DAYS}d':>12}")
+    print("-" * 73)
+
+    for name, scheduler_class in SCHEDULERS.items():
+        r = replay(scheduler_class(), events)
+        print(f"{name:<10} {r['questions']:>9} {r['early']:>6} {r['due']:>5} {r['due_success_rate']:>11.0%} "
+              f"{r['avg_interval_days']:>12.1f}d {r['workload']:>12.1f}")
+
+    print("\n'early' reviews happened before the scheduler would have asked again;")
+    print("a due success rate far below ~85% means intervals are growing too fast.")
+
+
+if __name__ == "__main__":
+    main()
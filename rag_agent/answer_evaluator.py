@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Tiered Answer Evaluator
+Judges a patient's answer with the cheapest check that is confident enough:
+
+  1. exact      normalized answer contains an expected keyword / phrase
+  2. fuzzy      typo and phonetic match against the keyword variant index
+                ("choclate" → chocolate, Whisper's "Ray" → Rae)
+  3. embedding  cosine similarity between answer and expected answer
+                (not for names and relations, nor for negated answers)
+  4. llm        caller-supplied judge, only when every cheaper tier abstains
+
+A tier answers only when its confidence reaches that tier's threshold,
+otherwise it abstains and the next tier runs. Per-tier hit counters and
+latencies are kept so thresholds can be tuned from real sessions.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+from keyword_index import KeywordIndex, normalize
+
+TIERS = ('exact', 'fuzzy', 'embedding', 'llm')
+
+DEFAULT_THRESHOLDS = {
+    'exact': 1.0,            # every content word of an expected phrase present
+    'fuzzy': 0.75,           # same cut-off the keyword evaluators always used
+    'embedding': 0.80,       # cosine accepted as correct without the LLM
+    'embedding_reject': None  # cosine at or below this is judged wrong (off by default)
+}
+
+EMBEDDING_CACHE_SIZE = 512
+
+# Words that carry no answer content ("my daughter" == "daughter")
+FILLER_WORDS = {
+    'a', 'an', 'the', 'my', 'your', 'his', 'her', 'our', 'their',
+    'it', 'was', 'is', 'i', 'think', 'guess', 'maybe', 'um', 'uh', 'erm',
+    'at', 'in', 'on', 'with', 'to', 'of', 'that', 'this', 'yes', 'yeah',
+    'oh', 'well', 'so', 'we', 'had', 'some', 'like'
+}
+
+# Embeddings put these too close together ("brother" ~ "sister"), so an
+# expected answer naming a relation is never judged by the embedding tier
+RELATION_WORDS = {
+    'mother', 'mom', 'mum', 'father', 'dad', 'parent', 'son', 'daughter', 'child',
+    'brother', 'sister', 'sibling', 'husband', 'wife', 'spouse', 'partner',
+    'grandmother', 'grandma', 'grandfather', 'grandpa', 'grandson', 'granddaughter',
+    'grandchild', 'aunt', 'uncle', 'niece', 'nephew', 'cousin', 'friend', 'neighbor',
+    'neighbour', 'nurse', 'doctor'
+}
+
+# "not cake" must never be accepted by a keyword or embedding tier
+NEGATION_WORDS = {'not', 'no', 'never', "don't", 'dont', "didn't", 'didnt',
+                  "wasn't", 'wasnt', "isn't", 'isnt', 'nobody', 'nothing'}
+
+
+def content_words(tokens: List[str]) -> List[str]:
+    """Tokens minus filler words (keeps the tokens if nothing would be left)"""
+    words = [t for t in tokens if t not in FILLER_WORDS]
+    return words or tokens
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Cosine similarity of two vectors"""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = sum(x * x for x in a) ** 0.5
+    norm_b = sum(y * y for y in b) ** 0.5
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+class ExpectedAnswer:
+    """
+    An expected answer prepared once: each alternative keyword/phrase is
+    reduced to its content words and indexed for fuzzy/phonetic lookups.
+    """
+
+    def __init__(self, expected: Union[str, List[str]], min_score: float):
+        alternatives = [expected] if isinstance(expected, str) else list(expected)
+        self.texts = [a for a in alternatives if a and a.strip()]
+        self.phrases = [w for w in (content_words(normalize(t)) for t in self.texts) if w]
+        # A capitalized single word ("Rae") is a name, which also matches by sound
+        names = [text for text in self.texts if len(text.split()) == 1 and text.strip()[0].isupper()]
+        self.index = KeywordIndex([' '.join(words) for words in self.phrases], min_score=min_score, names=names)
+        # A relation word or a name means the answer is a person
+        self.names_person = bool(names) or any(
+            w in RELATION_WORDS for text in self.texts for w in normalize(text)
+        )
+
+    def exact_score(self, tokens: List[str]) -> tuple:
+        """Best fraction of a phrase's content words present verbatim"""
+        token_set = set(tokens)
+        padded = f" {' '.join(tokens)} "
+        best, matched = 0.0, None
+        for words in self.phrases:
+            if f" {' '.join(words)} " in padded:
+                return 1.0, ' '.join(words)
+            score = sum(1 for w in words if w in token_set) / len(words)
+            if score > best:
+                best, matched = score, ' '.join(words)
+        return best, matched
+
+    def fuzzy_score(self, tokens: List[str]) -> tuple:
+        """Score of the best typo/phonetic keyword match (every phrase word must match)"""
+        match = self.index.match(tokens)
+        if match is None:
+            return 0.0, None
+        keyword, score = match
+        return score, keyword
+
+
+class AnswerEvaluator:
+    def __init__(self, openai_client=None, embedding_model: str = "text-embedding-3-small",
+                 thresholds: Dict = None, async_openai_client=None):
+        """
+        openai_client: used for the embedding tier; without it the tier is skipped.
+        thresholds: overrides for DEFAULT_THRESHOLDS.
+        async_openai_client: the same for aevaluate().
+        """
+        self.openai = openai_client
+        self.async_openai = async_openai_client
+        self.embedding_model = embedding_model
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+
+        self._lock = threading.Lock()
+        self._expected_cache = {}
+        self._embedding_cache = OrderedDict()
+        self._hits = dict.fromkeys(TIERS + ('unresolved',), 0)
+        self._runs = dict.fromkeys(TIERS, 0)
+        self._seconds = dict.fromkeys(TIERS, 0.0)
+        self._evaluations = 0
+
+    # ============================================================
+    # PUBLIC API
+    # ============================================================
+
+    def evaluate(self, answer: str, expected: Union[str, List[str]],
+                 llm_judge: Callable[[], Optional[dict]] = None,
+                 tiers: tuple = TIERS, allow_reject: bool = True) -> dict:
+        """
+        Evaluate an answer against the expected answer (a string or a list
+        of acceptable keywords/phrases).
+
+        llm_judge is called only if no cheaper tier is confident; it must
+        return a dict with at least "correct" (or None on failure).
+        allow_reject=False keeps the embedding tier from judging an answer
+        wrong (for callers that need the LLM's feedback on wrong answers).
+
+        Returns {"correct", "confidence", "tier", "matched", "llm_result"}.
+        """
+        start = time.perf_counter()
+        prepared, tokens, negated, result = self._keyword_tiers(answer, expected, tiers)
+
+        if result is None and self._use_embeddings(tiers, prepared, tokens, negated) and self.openai:
+            tier_start = time.perf_counter()
+            result = self._embedding_verdict(self._embedding_similarity(answer, prepared.texts), allow_reject)
+            self._record_time('embedding', tier_start)
+
+        if result is None and 'llm' in tiers and llm_judge:
+            tier_start = time.perf_counter()
+            llm_result = llm_judge()
+            self._record_time('llm', tier_start)
+            result = self._llm_verdict(llm_result)
+
+        return self._finish(result, start)
+
+    async def aevaluate(self, answer: str, expected: Union[str, List[str]],
+                        llm_judge: Callable[[], Awaitable[Optional[dict]]] = None,
+                        tiers: tuple = TIERS, allow_reject: bool = True) -> dict:
+        """
+        evaluate() for asyncio servers: the keyword tiers run inline, the
+        embedding call (async_openai_client) and llm_judge (a coroutine
+        function) are awaited.
+        """
+        start = time.perf_counter()
+        prepared, tokens, negated, result = self._keyword_tiers(answer, expected, tiers)
+
+        if result is None and self._use_embeddings(tiers, prepared, tokens, negated) and self.async_openai:
+            tier_start = time.perf_counter()
+            result = self._embedding_verdict(await self._aembedding_similarity(answer, prepared.texts), allow_reject)
+            self._record_time('embedding', tier_start)
+
+        if result is None and 'llm' in tiers and llm_judge:
+            tier_start = time.perf_counter()
+            llm_result = await llm_judge()
+            self._record_time('llm', tier_start)
+            result = self._llm_verdict(llm_result)
+
+        return self._finish(result, start)
+
+    def stats(self) -> dict:
+        """Per-tier hit counters and average latency"""
+        with self._lock:
+            return {
+                'evaluations': self._evaluations,
+                'hits': dict(self._hits),
+                'hit_rate': {
+                    tier: round(hits / self._evaluations, 3) if self._evaluations else 0.0
+                    for tier, hits in self._hits.items()
+                },
+                'runs': dict(self._runs),
+                'avg_ms': {
+                    tier: round(seconds * 1000 / self._runs[tier], 3) if self._runs[tier] else 0.0
+                    for tier, seconds in self._seconds.items()
+                }
+            }
+
+    # ============================================================
+    # TIERS
+    # ============================================================
+
+    def prepare(self, expected: Union[str, List[str]]) -> ExpectedAnswer:
+        """Keyword variants are indexed once per expected answer (call ahead to warm up)"""
+        key = expected if isinstance(expected, str) else tuple(expected)
+        prepared = self._expected_cache.get(key)
+        if prepared is None:
+            prepared = ExpectedAnswer(expected, self.thresholds['fuzzy'])
+            with self._lock:
+                self._expected_cache[key] = prepared
+        return prepared
+
+    def _keyword_tiers(self, answer: str, expected: Union[str, List[str]], tiers: tuple) -> tuple:
+        """Exact and fuzzy tiers -> (prepared, tokens, negated, verdict or None)"""
+        prepared = self.prepare(expected)
+        tokens = normalize(answer)
+        negated = any(t in NEGATION_WORDS for t in tokens)
+        result = None
+
+        if 'exact' in tiers and tokens and not negated:
+            tier_start = time.perf_counter()
+            score, matched = prepared.exact_score(tokens)
+            if score >= self.thresholds['exact']:
+                result = self._verdict('exact', True, score, matched)
+            self._record_time('exact', tier_start)
+
+        if result is None and 'fuzzy' in tiers and tokens and not negated:
+            tier_start = time.perf_counter()
+            score, matched = prepared.fuzzy_score(tokens)
+            if score >= self.thresholds['fuzzy']:
+                result = self._verdict('fuzzy', True, score, matched)
+            self._record_time('fuzzy', tier_start)
+
+        return prepared, tokens, negated, result
+
+    def _use_embeddings(self, tiers: tuple, prepared: ExpectedAnswer, tokens: List[str], negated: bool) -> bool:
+        """
+        Negated answers ("not cake" embeds close to "cake") and person
+        answers (names, relations) are left to the LLM.
+        """
+        return 'embedding' in tiers and bool(tokens) and not negated and not prepared.names_person
+
+    def _embedding_verdict(self, similarity: Optional[float], allow_reject: bool = True) -> Optional[dict]:
+        if similarity is None:
+            return None
+        reject_below = self.thresholds.get('embedding_reject') if allow_reject else None
+        if similarity >= self.thresholds['embedding']:
+            return self._verdict('embedding', True, similarity)
+        if reject_below is not None and similarity <= reject_below:
+            return self._verdict('embedding', False, 1.0 - similarity)
+        return None
+
+    def _llm_verdict(self, llm_result: Optional[dict]) -> Optional[dict]:
+        if llm_result is None:
+            return None
+        result = self._verdict('llm', bool(llm_result.get('correct')), llm_result.get('confidence', 1.0))
+        result['llm_result'] = llm_result
+        return result
+
+    def _embedding_similarity(self, answer: str, expected_texts: List[str]) -> Optional[float]:
+        """Best cosine between the answer and any expected alternative"""
+        try:
+            vectors = self._embed([answer] + expected_texts)
+        except Exception as e:
+            print(f"⚠️  Embedding tier skipped: {e}")
+            return None
+
+        return self._best_similarity(vectors)
+
+    async def _aembedding_similarity(self, answer: str, expected_texts: List[str]) -> Optional[float]:
+        try:
+            vectors = await self._aembed([answer] + expected_texts)
+        except Exception as e:
+            print(f"⚠️  Embedding tier skipped: {e}")
+            return None
+
+        return self._best_similarity(vectors)
+
+    def _best_similarity(self, vectors: List[List[float]]) -> Optional[float]:
+        """Best cosine between the answer (first vector) and any expected alternative"""
+        answer_vector = vectors[0]
+        return max(cosine_similarity(answer_vector, v) for v in vectors[1:]) if len(vectors) > 1 else None
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings with an LRU cache, so expected answers are embedded once"""
+        texts, vectors, missing = self._cached_embeddings(texts)
+        if missing:
+            response = self.openai.embeddings.create(model=self.embedding_model, input=missing)
+            self._store_embeddings(missing, response, vectors)
+        return [vectors[t] for t in texts]
+
+    async def _aembed(self, texts: List[str]) -> List[List[float]]:
+        texts, vectors, missing = self._cached_embeddings(texts)
+        if missing:
+            response = await self.async_openai.embeddings.create(model=self.embedding_model, input=missing)
+            self._store_embeddings(missing, response, vectors)
+        return [vectors[t] for t in texts]
+
+    def _cached_embeddings(self, texts: List[str]) -> tuple:
+        """-> (normalized texts, cached vectors by text, texts still to embed)"""
+        texts = [t.strip().lower() for t in texts]
+        vectors = {}
+        with self._lock:
+            for t in texts:
+                if t in self._embedding_cache:
+                    self._embedding_cache.move_to_end(t)
+                    vectors[t] = self._embedding_cache[t]
+
+        missing = [t for t in dict.fromkeys(texts) if t not in vectors]
+        return texts, vectors, missing
+
+    def _store_embeddings(self, missing: List[str], response, vectors: dict):
+        for item in response.data:
+            vectors[missing[item.index]] = item.embedding
+        with self._lock:
+            for t in missing:
+                self._embedding_cache[t] = vectors[t]
+            while len(self._embedding_cache) > EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+
+    # ============================================================
+    # HELPERS
+    # ============================================================
+
+    def _verdict(self, tier: str, correct: bool, confidence: float, matched: str = None) -> dict:
+        return {
+            'correct': correct,
+            'confidence': round(float(confidence), 3),
+            'tier': tier,
+            'matched': matched,
+            'llm_result': None
+        }
+
+    def _finish(self, result: Optional[dict], start: float) -> dict:
+        """Count the verdict (unresolved if every tier abstained) and stamp its latency"""
+        if result is None:
+            result = self._verdict('unresolved', False, 0.0)
+
+        with self._lock:
+            self._evaluations += 1
+            self._hits[result['tier']] += 1
+
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return result
+
+    def _record_time(self, tier: str, started: float):
+        with self._lock:
+            self._runs[tier] += 1
+            self._seconds[tier] += time.perf_counter() - started
@@ -1,94 +1,349 @@
 #!/usr/bin/env python3
 """
 Batch Processor - Process all audio chunks to build knowledge graph
+
+Chunks are processed by a worker pool. Every OpenAI request goes through a
+token-bucket limiter that follows the x-ratelimit-* response headers, so
+concurrency stays just under the account's limits instead of a fixed sleep.
+Unprocessed chunks are fetched page by page and progress is checkpointed,
+so a crashed backfill resumes where it stopped.
 """
 
 import os
+import re
+import json
 import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import httpx
+from openai import OpenAI
 from memory_rag_agent import MemoryRAGAgent
 
 
-def process_all_audio_chunks():
+DEFAULT_CONCURRENCY = 4
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_CHECKPOINT = "batch_checkpoint.json"
+DEFAULT_INITIAL_RPM = 120  # Used until the first rate-limit headers arrive
+REPORT_INTERVAL_SECONDS = 10
+
+
+def parse_reset_duration(value: str) -> float:
+    """Parse OpenAI reset durations like '1s', '6m0s', '20ms' into seconds"""
+    seconds = 0.0
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value or ''):
+        amount = float(amount)
+        if unit == 'ms':
+            seconds += amount / 1000
+        elif unit == 's':
+            seconds += amount
+        elif unit == 'm':
+            seconds += amount * 60
+        elif unit == 'h':
+            seconds += amount * 3600
+    return seconds
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket for OpenAI requests.
+    The refill rate is re-derived from the rate-limit headers of every
+    response; when the account runs dry (or gets a 429) all workers pause
+    until the advertised reset time.
+    """
+
+    def __init__(self, requests_per_minute: float = DEFAULT_INITIAL_RPM, capacity: int = DEFAULT_CONCURRENCY):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cost: float = 1.0):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                wait = max(self.paused_until - now, (cost - self.tokens) / self.rate)
+            time.sleep(min(max(wait, 0.01), 5.0))
+
+    def update_from_headers(self, status_code: int, headers):
+        """Adapt the refill rate to what OpenAI says is left"""
+        limit = headers.get('x-ratelimit-limit-requests')
+        remaining = headers.get('x-ratelimit-remaining-requests')
+        reset = parse_reset_duration(headers.get('x-ratelimit-reset-requests'))
+        remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+        reset_tokens = parse_reset_duration(headers.get('x-ratelimit-reset-tokens'))
+
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if limit and remaining:
+                steady_rate = int(limit) / 60.0
+                remaining = int(remaining)
+                if remaining <= 0:
+                    self.paused_until = max(self.paused_until, now + reset)
+                else:
+                    # Spend what's left over the reset window, never faster than the steady rate
+                    self.rate = max(0.1, min(steady_rate, remaining / max(reset, 1.0)))
+
+            if remaining_tokens is not None and int(remaining_tokens) <= 0:
+                self.paused_until = max(self.paused_until, now + reset_tokens)
+
+            if status_code == 429:
+                retry_after = headers.get('retry-after')
+                backoff = float(retry_after) if retry_after else max(reset, reset_tokens, 1.0)
+                self.paused_until = max(self.paused_until, now + backoff)
+
+    def rate_limited_client(self, api_key: str = None) -> OpenAI:
+        """OpenAI client whose every request passes through this bucket"""
+        http_client = httpx.Client(
+            event_hooks={
+                'request': [lambda request: self.acquire()],
+                'response': [lambda response: self.update_from_headers(response.status_code, response.headers)]
+            }
+        )
+        return OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), http_client=http_client)
+
+
+class Checkpoint:
+    """
+    Resumable progress for a backfill.
+    `cursor` is the last chunk id of a fully finished page; `done` holds ids
+    finished on the page currently in flight.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {'cursor': None, 'done': [], 'successful': 0, 'failed': 0, 'updated_at': None}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state.update(json.load(f))
+
+    @property
+    def cursor(self):
+        return self.state['cursor']
+
+    def is_done(self, chunk_id: str) -> bool:
+        return chunk_id in self.state['done']
+
+    def mark(self, chunk_id: str, success: bool):
+        with self.lock:
+            self.state['done'].append(chunk_id)
+            self.state['successful' if success else 'failed'] += 1
+            self._save()
+
+    def finish_page(self, last_id: str):
+        with self.lock:
+            self.state['cursor'] = last_id
+            self.state['done'] = []
+            self._save()
+
+    def _save(self):
+        self.state['updated_at'] = datetime.now().isoformat()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ProgressReporter:
+    """Prints live throughput and ETA from a background thread"""
+
+    def __init__(self, total: int, interval: float = REPORT_INTERVAL_SECONDS):
+        self.total = total
+        self.interval = interval
+        self.successful = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.report()
+
+    def record(self, success: bool):
+        with self.lock:
+            if success:
+                self.successful += 1
+            else:
+                self.failed += 1
+
+    def report(self):
+        with self.lock:
+            finished = self.successful + self.failed
+        elapsed = time.monotonic() - self.started
+        per_minute = finished / elapsed * 60 if elapsed > 0 else 0.0
+        remaining = max(self.total - finished, 0)
+        eta = f"{remaining / per_minute:.1f} min" if per_minute > 0 else "n/a"
+        print(f"📈 {finished}/{self.total} chunks | ✅ {self.successful} ❌ {self.failed} | "
+              f"{per_minute:.1f} chunks/min | ETA {eta}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+
+def _count_unprocessed(agent: MemoryRAGAgent) -> int:
+    """Estimate how many chunks are left, without loading them"""
+    try:
+        chunks = agent.supabase.table('audio_chunks') \
+            .select('id', count='exact') \
+            .not_.is_('transcription', 'null') \
+            .limit(1) \
+            .execute()
+        processed = agent.supabase.table('conversation_summaries') \
+            .select('audio_chunk_id', count='exact') \
+            .limit(1) \
+            .execute()
+        return max((chunks.count or 0) - (processed.count or 0), 0)
+    except Exception as e:
+        print(f"⚠️  Could not count chunks: {e}")
+        return 0
+
+
+def _iter_unprocessed_pages(agent: MemoryRAGAgent, cursor: str, page_size: int):
+    """
+    Yield pages of unprocessed chunk ids (keyset pagination on id).
+    Only ids and filenames are fetched; transcriptions are loaded by the
+    worker that processes the chunk.
+    """
+    while True:
+        query = agent.supabase.table('audio_chunks') \
+            .select('id, filename') \
+            .not_.is_('transcription', 'null') \
+            .neq('transcription', '') \
+            .order('id') \
+            .limit(page_size)
+        if cursor:
+            query = query.gt('id', cursor)
+
+        page = query.execute().data
+        if not page:
+            return
+
+        page_ids = [chunk['id'] for chunk in page]
+        processed_result = agent.supabase.table('conversation_summaries') \
+            .select('audio_chunk_id') \
+            .in_('audio_chunk_id', page_ids) \
+            .execute()
+        processed_ids = {item['audio_chunk_id'] for item in processed_result.data}
+
+        yield [chunk for chunk in page if chunk['id'] not in processed_ids], page_ids[-1]
+        cursor = page_ids[-1]
+
+
+def _process_one(agent: MemoryRAGAgent, chunk: dict) -> bool:
+    """Process a single chunk; returns True on success"""
+    try:
+        result = agent.process_audio_chunk(chunk['id'])
+
+        if 'error' in result:
+            print(f"  ❌ {chunk['filename']}: {result['error']}")
+            return False
+
+        print(f"  ✅ {chunk['filename']}: {result.get('summary', '')[:80]}...")
+        return True
+
+    except Exception as e:
+        print(f"  ❌ Error processing {chunk['filename']}: {e}")
+        return False
+
+
+def process_all_audio_chunks(
+    concurrency: int = DEFAULT_CONCURRENCY,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+    resume: bool = True,
+    initial_rpm: float = DEFAULT_INITIAL_RPM
+):
     """Process all audio chunks that haven't been analyzed yet"""
     agent = MemoryRAGAgent()
-    
+    limiter = TokenBucket(requests_per_minute=initial_rpm, capacity=concurrency)
+    agent.openai = limiter.rate_limited_client()
+
     print("="*60)
     print("BATCH PROCESSOR - Building Knowledge Graph")
     print("="*60)
-    
-    # Get all audio chunks
-    result = agent.supabase.table('audio_chunks').select('id, filename, transcription').execute()
-    audio_chunks = result.data
-    
-    print(f"\nFound {len(audio_chunks)} audio chunks")
-    
-    # Check which ones have already been processed
-    processed_result = agent.supabase.table('conversation_summaries').select('audio_chunk_id').execute()
-    processed_ids = {item['audio_chunk_id'] for item in processed_result.data}
-    
-    unprocessed = [chunk for chunk in audio_chunks if chunk['id'] not in processed_ids]
-    
-    print(f"Already processed: {len(processed_ids)}")
-    print(f"To process: {len(unprocessed)}")
-    
-    if not unprocessed:
-        print("\n✅ All audio chunks have been processed!")
-        return
-    
-    # Process each unprocessed chunk
-    print("\nProcessing audio chunks...")
-    successful = 0
-    failed = 0
-    
-    for i, chunk in enumerate(unprocessed, 1):
-        try:
-            print(f"\n[{i}/{len(unprocessed)}] Processing: {chunk['filename']}")
-            
-            if not chunk.get('transcription'):
-                print("  ⚠️  No transcription available, skipping")
-                continue
-            
-            result = agent.process_audio_chunk(chunk['id'])
-            
-            if 'error' in result:
-                print(f"  ❌ Error: {result['error']}")
-                failed += 1
-            else:
-                print(f"  ✅ Summary: {result.get('summary', '')[:100]}...")
-                print(f"  📊 Sentiment: {result.get('sentiment', 'N/A')}")
-                print(f"  🏷️  Topics: {', '.join(result.get('topics', []))}")
-                successful += 1
-            
-            # Rate limiting to avoid API overload
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"  ❌ Error processing chunk: {e}")
-            failed += 1
-    
+
+    checkpoint = Checkpoint(checkpoint_path)
+    if not resume:
+        checkpoint.clear()
+        checkpoint = Checkpoint(checkpoint_path)
+    elif checkpoint.cursor or checkpoint.state['done']:
+        print(f"\n↩️  Resuming from checkpoint ({checkpoint.state['successful']} done, "
+              f"{checkpoint.state['failed']} failed so far)")
+
+    total = _count_unprocessed(agent)
+    print(f"\nTo process (approx.): {total}")
+    print(f"Workers: {concurrency} | Page size: {page_size}")
+
+    reporter = ProgressReporter(total)
+    reporter.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+            for chunks, last_id in _iter_unprocessed_pages(agent, checkpoint.cursor, page_size):
+                chunks = [chunk for chunk in chunks if not checkpoint.is_done(chunk['id'])]
+
+                futures = {pool.submit(_process_one, agent, chunk): chunk for chunk in chunks}
+                for future in as_completed(futures):
+                    success = future.result()
+                    checkpoint.mark(futures[future]['id'], success)
+                    reporter.record(success)
+
+                checkpoint.finish_page(last_id)
+    finally:
+        reporter.stop()
+
     print("\n" + "="*60)
     print("PROCESSING COMPLETE")
     print("="*60)
-    print(f"✅ Successful: {successful}")
-    print(f"❌ Failed: {failed}")
-    print(f"📊 Total: {len(unprocessed)}")
+    print(f"✅ Successful: {reporter.successful}")
+    print(f"❌ Failed: {reporter.failed}")
+    print(f"📊 Total: {reporter.successful + reporter.failed}")
+
+    # A finished run starts fresh next time
+    checkpoint.clear()
 
 
 def reprocess_chunk(audio_chunk_id: str):
     """Reprocess a specific audio chunk (useful for testing)"""
     agent = MemoryRAGAgent()
-    
+
     print(f"Reprocessing audio chunk: {audio_chunk_id}")
-    
+
     # Delete existing summaries/events for this chunk
     agent.supabase.table('conversation_summaries').delete().eq('audio_chunk_id', audio_chunk_id).execute()
     agent.supabase.table('person_interactions').delete().eq('audio_chunk_id', audio_chunk_id).execute()
     agent.supabase.table('memory_events').delete().eq('audio_chunk_id', audio_chunk_id).execute()
-    
+
     # Process again
     result = agent.process_audio_chunk(audio_chunk_id)
-    
+
     print("\nResult:")
     print(f"Summary: {result.get('summary', '')}")
     print(f"Sentiment: {result.get('sentiment', '')}")
@@ -97,12 +352,25 @@ def reprocess_chunk(audio_chunk_id: str):
 
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) > 1:
+    parser = argparse.ArgumentParser(description="Build the knowledge graph from audio chunks")
+    parser.add_argument('chunk_id', nargs='?', help="Reprocess a single audio chunk")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Number of worker threads")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help="Chunks fetched per page")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="Checkpoint file path")
+    parser.add_argument('--initial-rpm', type=float, default=DEFAULT_INITIAL_RPM,
+                        help="Request rate to use until OpenAI rate-limit headers are seen")
+    parser.add_argument('--fresh', action='store_true', help="Ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    if args.chunk_id:
         # Reprocess specific chunk
-        chunk_id = sys.argv[1]
-        reprocess_chunk(chunk_id)
+        reprocess_chunk(args.chunk_id)
     else:
         # Process all unprocessed chunks
-        process_all_audio_chunks()
+        process_all_audio_chunks(
+            concurrency=args.concurrency,
+            page_size=args.page_size,
+            checkpoint_path=args.checkpoint,
+            resume=not args.fresh,
+            initial_rpm=args.initial_rpm
+        )
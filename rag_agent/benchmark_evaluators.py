@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Evaluator Micro-benchmark
+Per-answer latency of the three keyword evaluators, comparing the old pairwise
+SequenceMatcher loop with the keyword variant index they use now.
+
+No database or GPT calls are made: the dynamic flow uses its fallback
+questions, and the LLM / embedding tiers of simple_evaluator are disabled.
+
+Usage:
+    python benchmark_evaluators.py [--rounds 500]
+"""
+
+import time
+import argparse
+from difflib import SequenceMatcher
+from keyword_index import KeywordIndex
+
+ANSWERS = [
+    "it was my birthday", "Ray", "my sister came to see me", "choclate",
+    "a cake", "Hary", "a picture frame", "I think it showed photos",
+    "chips", "something in the garden", "pastry",
+    "my brother harry brought me a smartphone frame for my pictures"
+]
+
+SAMPLE_MEMORIES = [
+    {'person': 'rae', 'event': 'Birthday cake in living room'},
+    {'person': 'harry', 'event': 'Smartphone frame gift'}
+]
+
+
+def legacy_matches(answer_lower, keywords):
+    """The matching loop the evaluators used before the keyword index"""
+    for keyword in keywords:
+        if keyword in answer_lower:
+            return True
+    for keyword in keywords:
+        for word in answer_lower.split():
+            if SequenceMatcher(None, word.lower(), keyword.lower()).ratio() >= 0.75:
+                return True
+    return False
+
+
+def time_answers(run, flow_steps, rounds):
+    """Microseconds per answer, averaged over every (step, answer) pair"""
+    calls = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for step_index in range(flow_steps):
+            for answer in ANSWERS:
+                run(step_index, answer)
+                calls += 1
+    return (time.perf_counter() - start) / calls * 1_000_000
+
+
+def bench_flow(name, flow, rounds):
+    """Time legacy matching, index matching and the full evaluate_answer of a flow"""
+    keyword_sets = [step['expected_keywords'] for step in flow.flow]
+    indexes = [KeywordIndex(keywords) for keywords in keyword_sets]
+
+    def run_evaluate(step_index, answer):
+        flow.current_step = step_index
+        flow.wrong_attempts = {}
+        flow.evaluate_answer(answer)
+
+    legacy = time_answers(lambda i, a: legacy_matches(a.lower(), keyword_sets[i]), len(keyword_sets), rounds)
+    indexed = time_answers(lambda i, a: indexes[i].matches(a), len(keyword_sets), rounds)
+    full = time_answers(run_evaluate, len(keyword_sets), rounds)
+
+    print(f"{name:<24} {legacy:>12.1f} {indexed:>12.1f} {legacy / indexed:>8.1f}x {full:>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-answer latency of the keyword evaluators")
+    parser.add_argument('--rounds', type=int, default=500, help='Passes over every (question, answer) pair')
+    args = parser.parse_args()
+
+    import simple_evaluator
+    import simple_evaluator_static
+    import dynamic_evaluator
+    from answer_evaluator import AnswerEvaluator
+
+    # Keyword tiers only - no embedding client, and GPT always abstains
+    simple_evaluator._evaluator = AnswerEvaluator()
+    simple_evaluator.llm_semantic_match = lambda *args, **kwargs: False
+
+    # Skip __init__: no database or GPT needed to time matching
+    dynamic = dynamic_evaluator.DynamicConversationFlow.__new__(dynamic_evaluator.DynamicConversationFlow)
+    dynamic.memories = SAMPLE_MEMORIES
+    dynamic.flow = dynamic._generate_fallback_questions()
+    dynamic.keyword_indexes = [KeywordIndex(step['expected_keywords']) for step in dynamic.flow]
+    dynamic.current_step = 0
+    dynamic.wrong_attempts = {}
+
+    print(f"\n⏱  {len(ANSWERS)} answers × every question × {args.rounds} rounds (µs per answer)\n")
+    print(f"{'evaluator':<24} {'legacy match':>12} {'index match':>12} {'speedup':>9} {'evaluate_answer':>16}")
+    print("-" * 78)
+    bench_flow("simple_evaluator", simple_evaluator.SimpleConversationFlow({}), args.rounds)
+    bench_flow("simple_evaluator_static", simple_evaluator_static.SimpleConversationFlow({}), args.rounds)
+    bench_flow("dynamic_evaluator", dynamic, args.rounds)
+
+    print(f"\n📊 Tier hits (simple_evaluator): {simple_evaluator.get_evaluator().stats()['hits']}")
+
+
+if __name__ == "__main__":
+    main()
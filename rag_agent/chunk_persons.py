@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Chunk → Persons accessor
+The single place that answers "which persons were in which audio chunk".
+
+Reads the denormalized audio_chunks.persons column, which the ingest API
+keeps current whenever an image is linked to a chunk
+(see raspberry-confirmation/add_chunk_persons.sql).
+
+Names keep their display case ("Rae"): they end up in LLM prompts and in
+person_memories, whose RPCs match names exactly. Lookups by name are
+case-insensitive.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+CHUNK_COLUMNS = 'id, filename, start_time, end_time, transcription, persons'
+IN_QUERY_BATCH = 200  # Ids per in_() filter, keeps request URLs short
+PAGE_SIZE = 1000      # PostgREST max-rows: a single larger read comes back truncated
+
+
+def get_chunk_persons(supabase, audio_chunk_id: str, chunk: Dict = None) -> List[str]:
+    """
+    Persons detected in one audio chunk.
+    Pass the already-fetched chunk row to avoid a query; rows from databases
+    that predate the persons column fall back to the images table.
+    """
+    if chunk is not None and 'persons' in chunk:
+        return list(chunk.get('persons') or [])
+
+    try:
+        result = supabase.table('audio_chunks') \
+            .select('persons') \
+            .eq('id', audio_chunk_id) \
+            .execute()
+        if result.data:
+            return list(result.data[0].get('persons') or [])
+        return []
+    except Exception:
+        # persons column not migrated yet
+        images = supabase.table('images') \
+            .select('detected_persons') \
+            .eq('audio_chunk_id', audio_chunk_id) \
+            .execute()
+        return merge_names(p for img in images.data for p in img.get('detected_persons') or [])
+
+
+def merge_names(names) -> List[str]:
+    """Distinct names, compared case-insensitively, first spelling kept"""
+    merged = {}
+    for name in names:
+        merged.setdefault(name.lower(), name)
+    return sorted(merged.values(), key=str.lower)
+
+
+def _read_pages(make_query, sort_column: str, after: Tuple = None) -> List[Dict]:
+    """
+    Every row of make_query(), in PAGE_SIZE keyset pages on (sort_column, id).
+    Starts after the (value, id) position `after` if given. The selected
+    columns must include sort_column and id.
+    """
+    rows = []
+    while True:
+        query = make_query()
+        position = (rows[-1][sort_column], rows[-1]['id']) if rows else after
+        if position:
+            value, row_id = position
+            query = query.or_(f'{sort_column}.gt."{value}",and({sort_column}.eq."{value}",id.gt.{row_id})')
+        page = query.order(sort_column).order('id').limit(PAGE_SIZE).execute().data
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+
+def get_chunks_with_persons(supabase, start_time: datetime = None, end_time: datetime = None,
+                            columns: str = CHUNK_COLUMNS) -> List[Dict]:
+    """
+    Audio chunks that had at least one recognized person, optionally limited
+    to chunks ending inside [start_time, end_time], ordered by start_time.
+    Read in keyset pages, so the result is complete however many chunks match.
+    """
+    def make_query():
+        query = supabase.table('audio_chunks') \
+            .select(columns) \
+            .neq('persons', '{}')
+        if start_time:
+            query = query.gte('end_time', start_time.isoformat())
+        if end_time:
+            query = query.lte('end_time', end_time.isoformat())
+        return query
+
+    return _read_pages(make_query, 'start_time')
+
+
+def get_chunks_with_new_persons(supabase, after: Tuple = None, before: datetime = None,
+                                columns: str = CHUNK_COLUMNS) -> List[Dict]:
+    """
+    Audio chunks whose persons changed after the (persons_updated_at, id)
+    position `after`, and before `before`, oldest change first. This includes
+    chunks whose images were linked after the chunk was uploaded.
+    Rows carry persons_updated_at in addition to columns.
+    """
+    def make_query():
+        query = supabase.table('audio_chunks') \
+            .select(f'{columns}, persons_updated_at') \
+            .not_.is_('persons_updated_at', 'null')
+        if before:
+            query = query.lt('persons_updated_at', before.isoformat())
+        return query
+
+    return _read_pages(make_query, 'persons_updated_at', after)
+
+
+def latest_persons_change(supabase) -> Optional[Tuple[str, str]]:
+    """(persons_updated_at, id) of the most recent persons change, or None"""
+    latest = supabase.table('audio_chunks') \
+        .select('id, persons_updated_at') \
+        .not_.is_('persons_updated_at', 'null') \
+        .order('persons_updated_at', desc=True) \
+        .order('id', desc=True) \
+        .limit(1) \
+        .execute().data
+    return (latest[0]['persons_updated_at'], latest[0]['id']) if latest else None
+
+
+def get_chunks_by_person(supabase, columns: str = CHUNK_COLUMNS) -> Dict[str, List[Dict]]:
+    """
+    {person: [audio_chunk, ...]} for every person, from a single query.
+    Keys are lowercased names, as combined_conversations stores them.
+    """
+    person_chunks = {}
+    for chunk in get_chunks_with_persons(supabase, columns=columns):
+        for person in {p.lower() for p in chunk.get('persons') or []}:
+            person_chunks.setdefault(person, []).append(chunk)
+    return person_chunks
+
+
+def fetch_chunks(supabase, chunk_ids: List[str], columns: str = CHUNK_COLUMNS) -> List[Dict]:
+    """Fetch audio chunks by id with batched in_() filters"""
+    chunks = []
+    for i in range(0, len(chunk_ids), IN_QUERY_BATCH):
+        result = supabase.table('audio_chunks') \
+            .select(columns) \
+            .in_('id', chunk_ids[i:i + IN_QUERY_BATCH]) \
+            .execute()
+        chunks.extend(result.data)
+    return chunks
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Shared API Clients
+One OpenAI and one Supabase client per process (per credentials), each with a
+tuned connection pool, timeouts and retries. Every rag_agent class takes its
+clients from here, so requests reuse keep-alive connections and TLS sessions
+instead of paying a handshake per request or per session.
+"""
+
+import os
+import threading
+import httpx
+from openai import OpenAI
+from supabase import create_client, Client
+from supabase.client import ClientOptions
+
+# OpenAI: generous read timeout for completions, fast failure on connect
+OPENAI_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+OPENAI_MAX_RETRIES = 2  # SDK retries connection errors, 429s and 5xx with backoff
+OPENAI_POOL_LIMITS = httpx.Limits(
+    max_connections=50,
+    max_keepalive_connections=20,
+    keepalive_expiry=120
+)
+
+# Supabase: postgrest / storage requests are small and should be quick
+SUPABASE_POSTGREST_TIMEOUT = 15
+SUPABASE_STORAGE_TIMEOUT = 30
+
+_lock = threading.Lock()
+_openai_clients = {}
+_supabase_clients = {}
+
+
+def get_openai(api_key: str = None) -> OpenAI:
+    """Process-wide OpenAI client for the given (or environment) API key"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    with _lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                timeout=OPENAI_TIMEOUT,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=httpx.Client(limits=OPENAI_POOL_LIMITS, timeout=OPENAI_TIMEOUT)
+            )
+            _openai_clients[api_key] = client
+        return client
+
+
+def get_supabase(url: str = None, key: str = None) -> Client:
+    """Process-wide Supabase client for the given (or environment) project"""
+    url = url or os.getenv("SUPABASE_URL")
+    key = key or os.getenv("SUPABASE_KEY")
+    with _lock:
+        client = _supabase_clients.get((url, key))
+        if client is None:
+            client = create_client(url, key, options=ClientOptions(
+                postgrest_client_timeout=SUPABASE_POSTGREST_TIMEOUT,
+                storage_client_timeout=SUPABASE_STORAGE_TIMEOUT
+            ))
+            _supabase_clients[(url, key)] = client
+        return client
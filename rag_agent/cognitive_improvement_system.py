@@ -4,23 +4,18 @@ Cognitive Improvement System for Alzheimer's Patients
 Tracks memory performance over time and adapts to improve cognition
 """
 
-import os
 import json
 from datetime import datetime, timedelta
-from openai import OpenAI
-from supabase import create_client
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
 
 load_dotenv()
 
 
 class CognitiveImprovementSystem:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, supabase_client=None, openai_client=None):
+        self.supabase = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
         self.patient_id = "patient_001"  # Can be dynamic
     
     def create_memory_tracking_tables(self):
@@ -18,3 +18,6 @@ CREATE TABLE IF NOT EXISTS combined_conversations (
 CREATE INDEX IF NOT EXISTS idx_combined_conversations_person ON combined_conversations(person_name);
 CREATE INDEX IF NOT EXISTS idx_combined_conversations_date ON combined_conversations(conversation_date);
 CREATE INDEX IF NOT EXISTS idx_combined_conversations_start ON combined_conversations(start_time);
+
+-- Natural key for idempotent upserts
+CREATE UNIQUE INDEX IF NOT EXISTS uq_combined_conversations_person_start ON combined_conversations(person_name, start_time);
@@ -10,20 +10,17 @@ COMPLETE Intelligent Memory System for Alzheimer's Patients
 import os
 import json
 from datetime import datetime, timedelta
-from openai import OpenAI
-from supabase import create_client
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
+from chunk_persons import get_chunks_with_persons
 
 load_dotenv()
 
 
 class CompleteMemorySystem:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, supabase_client=None, openai_client=None):
+        self.supabase = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
         self.conversation_state = {}
         self.memory_score = {'correct': 0, 'total': 0}
     
@@ -37,41 +34,21 @@ class CompleteMemorySystem:
         start_time = target_day.replace(hour=0, minute=0, second=0)
         end_time = target_day.replace(hour=23, minute=59, second=59)
         
-        # Get ALL audio chunks
-        audio_data = self.supabase.table('audio_chunks') \
-            .select('*') \
-            .gte('end_time', start_time.isoformat()) \
-            .lte('end_time', end_time.isoformat()) \
-            .execute()
-        
-        if not audio_data.data:
-            return {
-                'question': "Hello! How are you feeling today?",
-                'type': 'greeting',
-                'has_memories': False
-            }
-        
-        # Get ALL images
-        images_data = self.supabase.table('images').select('*').execute()
+        # One indexed query: the day's audio chunks that had someone in them
+        audio_data = get_chunks_with_persons(self.supabase, start_time, end_time)
         
         # Build complete memory map: person -> conversations
         person_conversations = {}
         
-        for audio in audio_data.data:
+        for audio in audio_data:
             audio_id = audio['id']
             transcription = audio.get('transcription', '')
             
             if not transcription:
                 continue
             
-            # Find persons in this conversation
-            persons = []
-            for img in images_data.data:
-                if img.get('audio_chunk_id') == audio_id:
-                    detected = img.get('detected_persons', [])
-                    persons.extend(detected)
-            
-            persons = list(set(persons))  # Remove duplicates
+            # Persons in this conversation (materialized at ingest)
+            persons = audio.get('persons') or []
             
             # Store conversation for each person
             for person in persons:
@@ -6,21 +6,31 @@ If end_time difference <= 1 minute, merge them
 """
 
 import os
-from datetime import datetime, timedelta
-from supabase import create_client
+import json
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from clients import get_supabase
+from chunk_persons import (get_chunks_by_person, get_chunks_with_new_persons, latest_persons_change,
+                           fetch_chunks, IN_QUERY_BATCH)
 
 load_dotenv()
 
+MERGE_GAP_SECONDS = 60  # Chunks closer than this belong to the same conversation
+DEFAULT_STATE_PATH = "combiner_state.json"
+HWM_SETTLE_SECONDS = 30  # Persons changes younger than this are left for the next run
+COMBINER_COLUMNS = 'id, start_time, end_time, transcription, persons'
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
 
 class ConversationCombiner:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
+    def __init__(self, state_path: str = DEFAULT_STATE_PATH, supabase_client=None):
+        self.supabase = supabase_client or get_supabase()
+        self.state_path = state_path
     
-    def combine_conversations(self, person_name: str) -> list:
+    def combine_conversations(self, person_name: str, person_chunks: dict = None) -> list:
         """
         Combine audio chunks for a specific person into complete conversations
         
@@ -29,81 +39,254 @@ class ConversationCombiner:
         2. Sort by start_time ascending
         3. If end_time difference <= 1 minute, combine them
         4. Return list of combined conversations
-        """
         
-        # Get all images with this person
-        images = self.supabase.table('images') \
-            .select('audio_chunk_id, detected_persons') \
-            .execute()
+        person_chunks ({person: [chunk, ...]}) can be passed in to reuse one
+        prefetch across persons; otherwise it is loaded here.
+        """
         
-        # Find audio_chunk_ids where this person appears
-        audio_chunk_ids = []
-        for img in images.data:
-            if img.get('detected_persons') and person_name.lower() in [p.lower() for p in img['detected_persons']]:
-                audio_chunk_ids.append(img['audio_chunk_id'])
+        if person_chunks is None:
+            person_chunks = get_chunks_by_person(self.supabase, columns=COMBINER_COLUMNS)
         
-        audio_chunk_ids = list(set(audio_chunk_ids))  # Remove duplicates
+        audio_chunks = person_chunks.get(person_name.lower(), [])
         
-        if not audio_chunk_ids:
+        if not audio_chunks:
             return []
         
-        # Get all audio chunks for this person
-        audio_chunks = []
-        for chunk_id in audio_chunk_ids:
-            result = self.supabase.table('audio_chunks') \
+        segments = [self._chunk_segment(chunk) for chunk in audio_chunks if chunk.get('transcription')]
+        
+        return self._merge_segments(person_name, segments)
+    
+    def combine_all_conversations(self) -> dict:
+        """Combine conversations for ALL detected persons"""
+        
+        # One query over audio_chunks.persons serves every person
+        person_chunks = get_chunks_by_person(self.supabase, columns=COMBINER_COLUMNS)
+        
+        # Combine conversations for each person
+        results = {}
+        for person in person_chunks:
+            conversations = self.combine_conversations(person, person_chunks)
+            results[person] = conversations
+        
+        return results
+    
+    def rebuild_all_conversations(self) -> dict:
+        """
+        Full rebuild: combine every person's chunks from scratch, upsert the
+        result, delete stored rows that no longer match a conversation (their
+        start time changed or they were merged away), and reset the
+        incremental state so the next incremental run starts from here.
+        """
+        
+        # Take the high-water mark first: persons that change during the
+        # rebuild are picked up again by the next incremental run
+        latest = latest_persons_change(self.supabase)
+        
+        # Complete read (keyset-paged), so the stale-row delete below never
+        # mistakes chunks past a truncated page for removed ones
+        person_chunks = get_chunks_by_person(self.supabase, columns=COMBINER_COLUMNS)
+        results = {}
+        pending = {}
+        for person in person_chunks:
+            results[person] = self.combine_conversations(person, person_chunks)
+            for chunk in person_chunks[person]:
+                if not chunk.get('transcription'):
+                    pending.setdefault(chunk['id'], []).append(person)
+        
+        self.save_combined_conversations(results)
+        
+        # Rows the rebuild did not produce are superseded
+        current = {(person, conv['start_time']) for person, convs in results.items() for conv in convs}
+        stored, page_size = [], 1000
+        while True:
+            page = self.supabase.table('combined_conversations') \
+                .select('id, person_name, start_time') \
+                .order('id') \
+                .range(len(stored), len(stored) + page_size - 1) \
+                .execute().data
+            stored.extend(page)
+            if len(page) < page_size:
+                break
+        stale_ids = [row['id'] for row in stored
+                     if (row['person_name'], _parse_time(row['start_time'])) not in current]
+        for i in range(0, len(stale_ids), IN_QUERY_BATCH):
+            self.supabase.table('combined_conversations').delete().in_('id', stale_ids[i:i + IN_QUERY_BATCH]).execute()
+        if stale_ids:
+            print(f"🗑️  Removed {len(stale_ids)} superseded combined conversations")
+        
+        self._save_state({
+            'chunks_hwm': latest[0] if latest else None,
+            'chunks_hwm_id': latest[1] if latest else None,
+            'pending': {chunk_id: sorted(persons) for chunk_id, persons in pending.items()}
+        })
+        
+        return results
+    
+    def combine_new_conversations(self) -> dict:
+        """
+        Incremental combine: only look at chunks whose persons changed since
+        the last run (audio_chunks.persons_updated_at). That includes chunks
+        uploaded after their images, which get their persons when the images
+        are linked.
+        
+        1. Fetch chunks past the high-water mark (keyset-paged)
+        2. Re-fetch chunks that were waiting for a transcription
+        3. Fetch the stored conversations those chunks could extend (one query)
+        4. Extend/merge in place, upsert only changed rows, delete rows that
+           were absorbed into an earlier-starting conversation
+        
+        Chunks that aren't transcribed yet are remembered and retried next run.
+        Returns {person: [changed conversations]}.
+        """
+        
+        state = self._load_state()
+        
+        # 1. Chunks whose persons changed since the high-water mark. Changes
+        # younger than HWM_SETTLE_SECONDS wait for the next run, so one that
+        # commits late with an earlier timestamp is not skipped
+        after = (state['chunks_hwm'], state['chunks_hwm_id']) if state['chunks_hwm'] else None
+        settled = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=HWM_SETTLE_SECONDS)
+        changed = get_chunks_with_new_persons(self.supabase, after, before=settled, columns=COMBINER_COLUMNS)
+        
+        if changed:
+            state['chunks_hwm'] = changed[-1]['persons_updated_at']
+            state['chunks_hwm_id'] = changed[-1]['id']
+        
+        # 2. Chunks still waiting for their transcription
+        chunks = {chunk['id']: chunk for chunk in changed}
+        waiting = [chunk_id for chunk_id in state['pending'] if chunk_id not in chunks]
+        if waiting:
+            chunks.update((chunk['id'], chunk) for chunk in fetch_chunks(self.supabase, waiting, COMBINER_COLUMNS))
+        
+        if not chunks:
+            state['pending'] = {}
+            self._save_state(state)
+            return {}
+        
+        pending = {}
+        new_segments = {}
+        for chunk in chunks.values():
+            persons = {p.lower() for p in chunk.get('persons') or []}
+            if not chunk.get('transcription'):
+                pending[chunk['id']] = sorted(persons)
+                continue
+            for person in persons:
+                new_segments.setdefault(person, []).append(self._chunk_segment(chunk))
+        
+        results = {}
+        if new_segments:
+            # 3. Stored conversations that could absorb the new chunks
+            gap = timedelta(seconds=MERGE_GAP_SECONDS)
+            all_new = [seg for segs in new_segments.values() for seg in segs]
+            window_start = min(seg['start_time'] for seg in all_new) - gap
+            window_end = max(seg['end_time'] for seg in all_new) + gap
+            
+            existing = self.supabase.table('combined_conversations') \
                 .select('*') \
-                .eq('id', chunk_id) \
-                .execute()
+                .in_('person_name', list(new_segments)) \
+                .gte('end_time', window_start.isoformat()) \
+                .lte('start_time', window_end.isoformat()) \
+                .execute().data
+            
+            existing_by_person = {}
+            for row in existing:
+                existing_by_person.setdefault(row['person_name'], []).append(self._row_segment(row))
+            
+            # 4. Merge per person, keep only conversations that gained chunks
+            stale_ids = []
+            for person, segments in new_segments.items():
+                stored = existing_by_person.get(person, [])
+                known_ids = {cid for seg in stored for cid in seg['audio_chunk_ids']}
+                fresh = [seg for seg in segments if seg['audio_chunk_ids'][0] not in known_ids]
+                
+                if not fresh:
+                    continue
+                
+                for conv in self._merge_segments(person, stored + fresh):
+                    if not conv['is_new']:
+                        continue
+                    results.setdefault(person, []).append(conv)
+                    stale_ids.extend(
+                        row_id for row_id, row_start in conv['absorbed_rows']
+                        if row_start != conv['start_time']
+                    )
             
-            if result.data:
-                audio_chunks.extend(result.data)
+            if results:
+                self.save_combined_conversations(results)
+            if stale_ids:
+                self.supabase.table('combined_conversations').delete().in_('id', stale_ids).execute()
+        
+        state['pending'] = pending
+        self._save_state(state)
+        
+        return results
+    
+    def _chunk_segment(self, chunk: dict) -> dict:
+        """A single new audio chunk, in the shape _merge_segments expects"""
+        return {
+            'start_time': _parse_time(chunk['start_time']),
+            'end_time': _parse_time(chunk['end_time']),
+            'transcription': chunk.get('transcription', ''),
+            'audio_chunk_ids': [chunk['id']],
+            'row': None
+        }
+    
+    def _row_segment(self, row: dict) -> dict:
+        """A stored combined_conversations row, in the shape _merge_segments expects"""
+        return {
+            'start_time': _parse_time(row['start_time']),
+            'end_time': _parse_time(row['end_time']),
+            'transcription': row['full_transcription'],
+            'audio_chunk_ids': list(row['audio_chunk_ids']),
+            'row': (row['id'], _parse_time(row['start_time']))
+        }
+    
+    def _merge_segments(self, person_name: str, segments: list) -> list:
+        """
+        Merge time-ordered segments whose gap is <= MERGE_GAP_SECONDS.
+        A segment is either a new chunk or an already stored conversation;
+        each result records which stored rows it absorbed and whether it
+        contains anything new.
+        """
         
         # Sort by start_time
-        audio_chunks.sort(key=lambda x: x.get('start_time', ''))
+        segments = sorted(segments, key=lambda seg: seg['start_time'])
         
-        # Combine consecutive chunks
+        # Combine consecutive segments
         combined_conversations = []
         current_conversation = None
         
-        for chunk in audio_chunks:
-            start_time = datetime.fromisoformat(chunk['start_time'].replace('Z', '+00:00'))
-            end_time = datetime.fromisoformat(chunk['end_time'].replace('Z', '+00:00'))
-            transcription = chunk.get('transcription', '')
-            
-            if not transcription:
-                continue
-            
-            if current_conversation is None:
-                # Start new conversation
-                current_conversation = {
-                    'person': person_name,
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'transcription': transcription,
-                    'audio_chunk_ids': [chunk['id']],
-                    'chunk_count': 1
-                }
-            else:
-                # Check if this chunk is within 1 minute of previous
-                time_diff = (start_time - current_conversation['end_time']).total_seconds()
+        for seg in segments:
+            if current_conversation is not None:
+                # Check if this segment is within 1 minute of previous
+                time_diff = (seg['start_time'] - current_conversation['end_time']).total_seconds()
                 
-                if time_diff <= 60:  # <= 1 minute
+                if time_diff <= MERGE_GAP_SECONDS:
                     # Combine with current conversation
-                    current_conversation['transcription'] += ' ' + transcription
-                    current_conversation['end_time'] = end_time
-                    current_conversation['audio_chunk_ids'].append(chunk['id'])
-                    current_conversation['chunk_count'] += 1
-                else:
-                    # Save current conversation and start new one
-                    combined_conversations.append(current_conversation)
-                    current_conversation = {
-                        'person': person_name,
-                        'start_time': start_time,
-                        'end_time': end_time,
-                        'transcription': transcription,
-                        'audio_chunk_ids': [chunk['id']],
-                        'chunk_count': 1
-                    }
+                    current_conversation['transcription'] += ' ' + seg['transcription']
+                    current_conversation['end_time'] = max(current_conversation['end_time'], seg['end_time'])
+                    current_conversation['audio_chunk_ids'].extend(seg['audio_chunk_ids'])
+                    current_conversation['chunk_count'] = len(current_conversation['audio_chunk_ids'])
+                    if seg['row']:
+                        current_conversation['absorbed_rows'].append(seg['row'])
+                    else:
+                        current_conversation['is_new'] = True
+                    continue
+                
+                # Save current conversation and start new one
+                combined_conversations.append(current_conversation)
+            
+            # Start new conversation
+            current_conversation = {
+                'person': person_name,
+                'start_time': seg['start_time'],
+                'end_time': seg['end_time'],
+                'transcription': seg['transcription'],
+                'audio_chunk_ids': list(seg['audio_chunk_ids']),
+                'chunk_count': len(seg['audio_chunk_ids']),
+                'absorbed_rows': [seg['row']] if seg['row'] else [],
+                'is_new': seg['row'] is None
+            }
         
         # Add last conversation
         if current_conversation:
@@ -111,26 +294,25 @@ class ConversationCombiner:
         
         return combined_conversations
     
-    def combine_all_conversations(self) -> dict:
-        """Combine conversations for ALL detected persons"""
-        
-        # Get all unique persons
-        images = self.supabase.table('images').select('detected_persons').execute()
-        
-        all_persons = set()
-        for img in images.data:
-            if img.get('detected_persons'):
-                all_persons.update([p.lower() for p in img['detected_persons']])
-        
-        all_persons = list(all_persons)
-        
-        # Combine conversations for each person
-        results = {}
-        for person in all_persons:
-            conversations = self.combine_conversations(person)
-            results[person] = conversations
-        
-        return results
+    def _load_state(self) -> dict:
+        """High-water mark over audio_chunks (persons_updated_at, id) + chunks waiting for transcription"""
+        state = {'chunks_hwm': None, 'chunks_hwm_id': None, 'pending': {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                saved = json.load(f)
+            # State from the images-based high-water mark: its pending chunks still
+            # count, the first run reads every chunk (already combined ones are skipped)
+            saved.pop('images_hwm', None)
+            saved.pop('images_hwm_id', None)
+            state.update(saved)
+        return state
+    
+    def _save_state(self, state: dict):
+        state['updated_at'] = datetime.now().isoformat()
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
     
     def print_summary(self, results: dict):
         """Print summary of combined conversations"""
@@ -174,13 +356,22 @@ class ConversationCombiner:
         CREATE INDEX IF NOT EXISTS idx_combined_conversations_person ON combined_conversations(person_name);
         CREATE INDEX IF NOT EXISTS idx_combined_conversations_date ON combined_conversations(conversation_date);
         CREATE INDEX IF NOT EXISTS idx_combined_conversations_start ON combined_conversations(start_time);
+        
+        -- Natural key for idempotent upserts
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_combined_conversations_person_start
+            ON combined_conversations(person_name, start_time);
         """
         
         return sql
     
     def save_combined_conversations(self, results: dict):
-        """Save combined conversations to database"""
+        """
+        Save combined conversations to database
+        All rows go out in one bulk upsert keyed on (person_name, start_time),
+        so re-running the combiner updates conversations instead of duplicating them.
+        """
         
+        rows = {}
         for person, conversations in results.items():
             for conv in conversations:
                 duration = int((conv['end_time'] - conv['start_time']).total_seconds())
@@ -196,10 +387,14 @@ class ConversationCombiner:
                     'conversation_date': conv['start_time'].date().isoformat()
                 }
                 
-                self.supabase.table('combined_conversations').insert(data).execute()
+                rows[(data['person_name'], data['start_time'])] = data
         
-        print("\n✅ Combined conversations saved to database!")
-
+        if rows:
+            self.supabase.table('combined_conversations') \
+                .upsert(list(rows.values()), on_conflict='person_name,start_time') \
+                .execute()
+        
+        print(f"\n✅ {len(rows)} combined conversations saved to database!")
 
 if __name__ == "__main__":
     combiner = ConversationCombiner()
@@ -6,30 +6,21 @@ This is the HEART of the solution - adapts to any new conversations!
 """
 
 import os
-from openai import OpenAI
-from supabase import create_client
 from dotenv import load_dotenv
-from difflib import SequenceMatcher
+from clients import get_openai, get_supabase
 from family_context import FAMILY_CONTEXT, get_person_context
+from keyword_index import KeywordIndex
 
 load_dotenv()
 
 
-def fuzzy_match(word1, word2, threshold=0.75):
-    """Check if two words are similar enough (handles typos)"""
-    return SequenceMatcher(None, word1.lower(), word2.lower()).ratio() >= threshold
-
-
 class DynamicConversationFlow:
-    def __init__(self, days_back=1):
+    def __init__(self, days_back=1, supabase_client=None, openai_client=None):
         """
         Initialize with dynamic question generation from actual memories
         """
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.supabase = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
         self.current_step = 0
         self.wrong_attempts = {}
         self.days_back = days_back
@@ -37,6 +28,9 @@ class DynamicConversationFlow:
         # Load memories and generate questions dynamically
         self.memories = self._load_memories()
         self.flow = self._generate_question_flow()
+        
+        # Keyword variants indexed once per flow (typos, sound-alikes)
+        self.keyword_indexes = [KeywordIndex(step['expected_keywords']) for step in self.flow]
     
     def _load_memories(self):
         """Load memories from the database"""
@@ -381,24 +375,7 @@ Example format:
             }
         
         # Check answer with fuzzy matching
-        is_correct = False
-        
-        # Exact match first
-        for keyword in step['expected_keywords']:
-            if keyword in answer_lower:
-                is_correct = True
-                break
-        
-        # Fuzzy match for typos
-        if not is_correct:
-            answer_words = answer_lower.split()
-            for keyword in step['expected_keywords']:
-                for word in answer_words:
-                    if fuzzy_match(word, keyword, threshold=0.75):
-                        is_correct = True
-                        break
-                if is_correct:
-                    break
+        is_correct = self.keyword_indexes[self.current_step].matches(answer_lower)
         
         if is_correct:
             # Correct! Move to next question
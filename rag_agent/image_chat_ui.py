@@ -17,6 +17,17 @@ CORS(app)
 # Store active sessions
 sessions = {}
 
+# One chat for all sessions - per-session state lives in `sessions`
+_chat = None
+
+
+def get_chat():
+    """Get shared ImageMemoryChat instance"""
+    global _chat
+    if _chat is None:
+        _chat = ImageMemoryChat()
+    return _chat
+
 
 @app.route('/')
 def index():
@@ -30,16 +41,13 @@ def start_conversation():
     try:
         session_id = secrets.token_hex(8)
         
-        # Create image chat
-        chat = ImageMemoryChat()
-        result = chat.start_conversation()
+        result = get_chat().start_conversation()
         
         if not result['success']:
             return jsonify(result), 400
         
         # Store session
         sessions[session_id] = {
-            'chat': chat,
             'questions': result['questions'],
             'current_index': 0,
             'correct_answers': 0,
@@ -97,7 +105,7 @@ def submit_answer():
         attempt = session_data['attempts'].get(current_index, 0)
         
         # Evaluate answer
-        result = session_data['chat'].evaluate_answer(
+        result = get_chat().evaluate_answer(
             answer,
             current_question,
             attempt
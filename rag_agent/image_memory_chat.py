@@ -4,10 +4,8 @@ Image-Based Memory Chat
 Shows photos from Supabase storage and asks recognition questions
 """
 
-import os
-from supabase import create_client
-from openai import OpenAI
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
 from family_context import get_person_context
 from datetime import datetime, timedelta
 
@@ -15,14 +13,9 @@ load_dotenv()
 
 
 class ImageMemoryChat:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.current_step = 0
-        self.wrong_attempts = {}
+    def __init__(self, supabase_client=None, openai_client=None):
+        self.supabase = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
         
     def get_recent_photos(self, days_back=7):
         """Get photos from database by detected_persons"""
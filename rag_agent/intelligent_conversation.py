@@ -4,23 +4,19 @@ Intelligent Conversation System for Alzheimer's Patients
 Proactively starts conversations and tests memory
 """
 
-import os
 import json
 from datetime import datetime, timedelta
-from openai import OpenAI
-from supabase import create_client
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
+from chunk_persons import get_chunks_with_persons
 
 load_dotenv()
 
 
 class IntelligentConversation:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, supabase_client=None, openai_client=None):
+        self.supabase = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
         self.conversation_state = {
             'current_question': None,
             'expected_answer': None,
@@ -39,40 +35,19 @@ class IntelligentConversation:
         start_time = target_day.replace(hour=0, minute=0, second=0)
         end_time = target_day.replace(hour=23, minute=59, second=59)
         
-        # Get audio chunks from yesterday
-        audio_data = self.supabase.table('audio_chunks') \
-            .select('*') \
-            .gte('end_time', start_time.isoformat()) \
-            .lte('end_time', end_time.isoformat()) \
-            .execute()
-        
-        if not audio_data.data:
-            return {
-                'question': "Hello! How are you feeling today?",
-                'type': 'greeting',
-                'has_memories': False
-            }
+        # Audio chunks from that day that had someone in them (one indexed query)
+        audio_data = get_chunks_with_persons(self.supabase, start_time, end_time)
         
         # Get all persons from yesterday
         all_persons = set()
         conversations = []
         
-        for audio in audio_data.data:
+        for audio in audio_data:
             audio_id = audio['id']
             transcription = audio.get('transcription', '')
             
-            # Get images/persons for this audio
-            images = self.supabase.table('images') \
-                .select('*') \
-                .eq('audio_chunk_id', audio_id) \
-                .execute()
-            
-            persons_in_conversation = []
-            for img in images.data:
-                if img.get('detected_persons'):
-                    persons_in_conversation.extend(img['detected_persons'])
-            
-            persons_in_conversation = list(set(persons_in_conversation))
+            # Persons for this audio (materialized at ingest)
+            persons_in_conversation = list(audio.get('persons') or [])
             all_persons.update(persons_in_conversation)
             
             if transcription and persons_in_conversation:
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Keyword Variant Index
+Expected keywords prepared once per question, so matching an answer is a few
+set lookups instead of a SequenceMatcher run per (answer word × keyword) pair.
+
+Each keyword word is indexed by:
+- its normalized form          exact hits
+- trigram signatures           typo candidates ("choclate" → chocolate)
+- Metaphone code (names only)  sound-alikes from Whisper ("Ray" → Rae,
+                               "Catherine" → Kathryn)
+Only the handful of candidates found this way get a bounded edit distance.
+Candidates are scored by letter similarity. Short keywords must match
+exactly, since one letter turns "cake" into "coke". Person names also match
+by sound: same Metaphone code and same first vowel, so "tim" is not "tom".
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MIN_SCORE = 0.75  # Same cut-off the SequenceMatcher fuzzy_match used
+PHONETIC_SCORE = 0.8      # Score of a sound-alike person name
+MIN_FUZZY_LENGTH = 5      # Shorter keyword words only match exactly (or inflected)
+PREFIX_SCORE = 0.9        # "photos" / "visited" for the keywords "photo" / "visit"
+MIN_PREFIX_LENGTH = 4
+INFLECTION_SUFFIXES = ('s', 'es', "'s", 'd', 'ed', 'ing')  # Not "rainbow" for "rain"
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_VOWELS = 'aeiou'
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase word tokens without punctuation"""
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def metaphone(word: str) -> str:
+    """
+    Simplified Metaphone - the consonant skeleton of a word
+    ('chocolate' and 'choclate' → XKLT, 'harry' and 'hary' → HR)
+    """
+    word = ''.join(c for c in word.lower() if c.isalpha())
+    if not word:
+        return ''
+    if word[:2] in ('kn', 'gn', 'pn', 'wr', 'ae'):
+        word = word[1:]
+    if word[0] == 'x':
+        word = 's' + word[1:]
+
+    code = []
+    i = 0
+    while i < len(word):
+        c = word[i]
+        prev = word[i - 1] if i else ''
+        nxt = word[i + 1] if i + 1 < len(word) else ''
+
+        if c == prev and c != 'c':
+            pass
+        elif c in _VOWELS:
+            if i == 0:
+                code.append(c.upper())
+        elif c == 'b':
+            if not (prev == 'm' and not nxt):
+                code.append('B')
+        elif c == 'c':
+            if nxt == 'h':
+                code.append('X')
+                i += 1
+            else:
+                code.append('S' if nxt in ('i', 'e', 'y') else 'K')
+        elif c == 'd':
+            code.append('J' if nxt == 'g' and word[i + 2:i + 3] in ('i', 'e', 'y') else 'T')
+        elif c == 'g':
+            if nxt == 'h' and word[i + 2:i + 3] not in tuple(_VOWELS):
+                i += 1
+            else:
+                code.append('J' if nxt in ('i', 'e', 'y') else 'K')
+        elif c == 'h':
+            if nxt and nxt in _VOWELS and not (prev and prev in _VOWELS):
+                code.append('H')
+        elif c == 'k':
+            if prev != 'c':
+                code.append('K')
+        elif c == 'p':
+            if nxt == 'h':
+                code.append('F')
+                i += 1
+            else:
+                code.append('P')
+        elif c == 'q':
+            code.append('K')
+        elif c in ('s', 't'):
+            if nxt == 'h':
+                code.append('X' if c == 's' else '0')
+                i += 1
+            elif word[i + 1:i + 3] in ('io', 'ia'):
+                code.append('X')
+            else:
+                code.append(c.upper())
+        elif c == 'v':
+            code.append('F')
+        elif c in ('w', 'y'):
+            if nxt and nxt in _VOWELS:
+                code.append(c.upper())
+        elif c == 'x':
+            code.append('KS')
+        elif c == 'z':
+            code.append('S')
+        else:
+            code.append(c.upper())
+        i += 1
+
+    return ''.join(code)
+
+
+@lru_cache(maxsize=4096)
+def trigrams(word: str) -> frozenset:
+    """Padded character trigrams ('$$r', '$ra', 'rae', 'ae$')"""
+    padded = f"$${word}$"
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+@lru_cache(maxsize=4096)
+def sound_key(word: str) -> Optional[tuple]:
+    """
+    (Metaphone code, first vowel) of a name, or None: 'rae' and 'ray' share
+    (R, a), 'tim' and 'tom' differ in the vowel
+    """
+    if len(word) < 2 or word.isdigit():
+        return None
+    vowels = [c for c in word if c in _VOWELS]
+    return metaphone(word), vowels[0] if vowels else ''
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Edit distance between a and b, or None once it must exceed max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > max_distance:
+            return None
+        previous = current
+
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class KeywordIndex:
+    def __init__(self, keywords: List[str], min_score: float = DEFAULT_MIN_SCORE,
+                 names: Optional[List[str]] = None):
+        """
+        keywords: acceptable answers - single words or short phrases.
+        min_score: similarity (0-1) a fuzzy word match needs to count.
+        names: keyword words that are person names and also match by sound
+               (default: the capitalized words of the keywords, "Rae").
+        """
+        self.min_score = min_score
+        self.keywords = []  # [(keyword, (word, ...)), ...]
+        self.words = set()
+        self._grams = {}
+        self._sounds = {}  # sound key -> name words
+
+        for keyword in keywords:
+            words = tuple(normalize(keyword))
+            if not words:
+                continue
+            self.keywords.append((keyword, words))
+            self.words.update(words)
+
+        if names is None:
+            names = [w for keyword in keywords for w in keyword.split() if w[:1].isupper()]
+        self.names = {word for name in names for word in normalize(name)} & self.words
+
+        for word in self.words:
+            for gram in trigrams(word):
+                self._grams.setdefault(gram, set()).add(word)
+        for word in self.names:
+            key = sound_key(word)
+            if key:
+                self._sounds.setdefault(key, set()).add(word)
+
+    # ============================================================
+    # MATCHING
+    # ============================================================
+
+    def matches(self, answer: str) -> bool:
+        """True if the answer contains (a close variant of) any keyword"""
+        return self.match(normalize(answer)) is not None
+
+    def match(self, tokens: List[str]) -> Optional[Tuple[str, float]]:
+        """
+        Best (keyword, score) for the answer tokens, or None.
+        A phrase keyword scores as its weakest word, so every word must match.
+        """
+        padded = f" {' '.join(tokens)} "
+        for keyword, words in self.keywords:
+            if f" {' '.join(words)} " in padded:
+                return keyword, 1.0
+
+        word_scores = {}
+        for token in set(tokens):
+            for word, score in self.word_scores(token).items():
+                word_scores[word] = max(score, word_scores.get(word, 0.0))
+
+        best = None
+        for keyword, words in self.keywords:
+            score = min(word_scores.get(w, 0.0) for w in words)
+            if score >= self.min_score and (best is None or score > best[1]):
+                best = (keyword, score)
+        return best
+
+    def word_scores(self, token: str) -> Dict[str, float]:
+        """Keyword words similar to one answer token, with their scores"""
+        scores = {}
+        if token in self.words:
+            scores[token] = 1.0
+
+        # "photos" → photo, but only for inflections - a longer word is a different word
+        for suffix in INFLECTION_SUFFIXES:
+            stem = token[:-len(suffix)]
+            if token.endswith(suffix) and len(stem) >= MIN_PREFIX_LENGTH and stem in self.words:
+                scores[stem] = max(PREFIX_SCORE, scores.get(stem, 0.0))
+
+        # Names that sound the same, however they are spelled
+        if self._sounds:
+            for word in self._sounds.get(sound_key(token), ()):
+                scores[word] = max(PHONETIC_SCORE, scores.get(word, 0.0))
+
+        candidates = set()
+        for gram in trigrams(token):
+            candidates.update(self._grams.get(gram, ()))
+
+        for word in candidates:
+            if scores.get(word) == 1.0 or len(word) < MIN_FUZZY_LENGTH:
+                continue
+            longest = max(len(word), len(token))
+            distance = bounded_levenshtein(token, word, int((1 - self.min_score) * longest))
+            if distance is None:
+                continue
+
+            score = 1 - distance / longest
+            if score >= self.min_score:
+                scores[word] = max(score, scores.get(word, 0.0))
+
+        return scores
@@ -26,6 +26,7 @@ CREATE TABLE IF NOT EXISTS person_interactions (
 CREATE TABLE IF NOT EXISTS memory_events (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     audio_chunk_id UUID REFERENCES audio_chunks(id) ON DELETE CASCADE,
+    event_index INTEGER NOT NULL DEFAULT 0, -- position in the chunk's analysis
     event_type TEXT NOT NULL, -- e.g., 'meal', 'medication', 'visitor', 'activity'
     event_description TEXT NOT NULL,
     participants TEXT[] DEFAULT '{}',
@@ -42,3 +43,8 @@ CREATE INDEX IF NOT EXISTS idx_person_interactions_audio ON person_interactions(
 CREATE INDEX IF NOT EXISTS idx_memory_events_time ON memory_events(event_time);
 CREATE INDEX IF NOT EXISTS idx_memory_events_type ON memory_events(event_type);
 CREATE INDEX IF NOT EXISTS idx_memory_events_importance ON memory_events(importance_score);
+
+-- Natural keys so reprocessing a chunk upserts instead of duplicating rows
+CREATE UNIQUE INDEX IF NOT EXISTS uq_conversation_summaries_audio ON conversation_summaries(audio_chunk_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_person_interactions_key ON person_interactions(audio_chunk_id, person_name, interaction_type);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_memory_events_key ON memory_events(audio_chunk_id, event_index);
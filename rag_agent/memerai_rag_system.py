@@ -13,22 +13,20 @@ Flow:
 import os
 import json
 from datetime import datetime, timedelta
-from openai import OpenAI
-from supabase import create_client
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
 from family_context import FAMILY_CONTEXT, get_person_context
+from answer_evaluator import AnswerEvaluator
 
 load_dotenv()
 
 
 class MemerAIRAG:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, supabase_client=None, openai_client=None):
+        self.supabase = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
         self.embedding_model = "text-embedding-3-small"
+        self.evaluator = AnswerEvaluator(self.openai, self.embedding_model)
     
     # ============================================================
     # STEP 1: CREATE MEMORY UNITS
@@ -210,11 +208,8 @@ Return JSON:
                 .execute()
             return result.data
     
-    def generate_response(self, query: str, memories: list) -> str:
-        """
-        Generate response using retrieved memories
-        This is the "Smart Brain" part
-        """
+    def _response_messages(self, query: str, memories: list) -> list:
+        """Build the chat messages for answering from retrieved memories"""
         
         # Build context from memories
         context = "Here are the relevant memories:\n\n"
@@ -233,16 +228,40 @@ Answer in ONE simple sentence using ONLY the memories above.
 Be warm, clear, and reassuring.
 """
         
+        return [
+            {"role": "system", "content": "You are a gentle memory assistant."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def generate_response(self, query: str, memories: list) -> str:
+        """
+        Generate response using retrieved memories
+        This is the "Smart Brain" part
+        """
+        
         response = self.openai.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a gentle memory assistant."},
-                {"role": "user", "content": prompt}
-            ]
+            messages=self._response_messages(query, memories)
         )
         
         return response.choices[0].message.content
     
+    def stream_response(self, query: str, memories: list):
+        """
+        Streaming version of generate_response
+        Yields text pieces as the model produces them
+        """
+        
+        stream = self.openai.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=self._response_messages(query, memories),
+            stream=True
+        )
+        
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
     def ask(self, query: str) -> dict:
         """
         Complete RAG pipeline: Query → Retrieve → Generate
@@ -271,6 +290,31 @@ Be warm, clear, and reassuring.
             'memories': memories
         }
     
+    def ask_stream(self, query: str) -> dict:
+        """
+        Streaming RAG pipeline: Query → Retrieve → Generate (token by token)
+        
+        Retrieval happens up front; the returned 'answer' is a generator
+        so the caller can start sending words right away.
+        """
+        
+        print(f"\n🔍 Query (stream): {query}")
+        
+        memories = self.recall(query, top_k=3)
+        
+        if not memories:
+            return {
+                'answer': iter(["I don't have any memories about that yet."]),
+                'memories': []
+            }
+        
+        print(f"📚 Found {len(memories)} relevant memories")
+        
+        return {
+            'answer': self.stream_response(query, memories),
+            'memories': memories
+        }
+    
     # ============================================================
     # STEP 5: DAILY CHECK (PROACTIVE MODE)
     # ============================================================
@@ -427,6 +471,52 @@ Generate SHORT explanation:
             return response.choices[0].message.content
     
     def evaluate_answer(self, patient_answer: str, memory: dict, question: str, all_memories: list = None) -> dict:
+        """
+        Evaluate John's answer with the tiered evaluator
+        Cheap keyword tiers confirm "who" answers; everything else goes to the RAG evaluation
+        """
+        person = memory['person']
+        person_info = get_person_context(person)
+        
+        # A "who" question has a known answer - the person's name or relation.
+        # Embeddings are skipped here: "brother" and "sister" sit too close together.
+        if question.strip().lower().startswith('who'):
+            expected = [person, person_info['relation'].split()[-1]]
+            tiers = ('exact', 'fuzzy', 'llm')
+        else:
+            expected = [memory['event']]
+            tiers = ('llm',)
+        
+        verdict = self.evaluator.evaluate(
+            patient_answer,
+            expected,
+            llm_judge=lambda: self._llm_evaluate_answer(patient_answer, memory, question, all_memories),
+            tiers=tiers
+        )
+        
+        if verdict['llm_result'] is not None:
+            return {**verdict['llm_result'], 'tier': 'llm'}
+        
+        if verdict['correct']:
+            return {
+                'correct': True,
+                'confidence': verdict['confidence'],
+                'response': f"Yes! That's right, John. It was {person.title()}.",
+                'next_question': None,
+                'correction_hint': None,
+                'tier': verdict['tier']
+            }
+        
+        return {
+            'correct': False,
+            'confidence': 0.0,
+            'response': "Let me help you remember...",
+            'next_question': None,
+            'correction_hint': None,
+            'tier': verdict['tier']
+        }
+    
+    def _llm_evaluate_answer(self, patient_answer: str, memory: dict, question: str, all_memories: list = None) -> dict:
         """
         Sophisticated RAG-based answer evaluation
         Uses family context to intelligently assess responses
@@ -513,13 +603,7 @@ Ask next_question separately.
             
         except Exception as e:
             print(f"Error evaluating answer: {e}")
-            return {
-                'correct': False,
-                'confidence': 0.0,
-                'response': "Let me help you remember...",
-                'next_question': None,
-                'correction_hint': None
-            }
+            return None
 
 
 if __name__ == "__main__":
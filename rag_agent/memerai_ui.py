@@ -11,6 +11,7 @@ from memerai_rag_system import MemerAIRAG
 # from cognitive_improvement_system import CognitiveImprovementSystem  # Not needed for basic API
 # from dynamic_evaluator import DynamicConversationFlow  # Dynamic questions from real data!
 from simple_evaluator import SimpleConversationFlow  # Static - reliable and tested
+from streaming import wants_stream, sse_response
 import secrets
 import os
 
@@ -194,7 +195,11 @@ def get_help():
 
 @app.route('/api/ask', methods=['POST'])
 def ask_question():
-    """Patient asks a question (classic RAG)"""
+    """
+    Patient asks a question (classic RAG)
+    Send {"stream": true} (or Accept: text/event-stream) to get the
+    answer as Server-Sent Events while it is being generated.
+    """
     try:
         data = request.json
         question = data.get('question', '')
@@ -202,6 +207,13 @@ def ask_question():
         if not question:
             return jsonify({'error': 'No question provided'}), 400
         
+        if wants_stream(request, data):
+            result = rag.ask_stream(question)
+            return sse_response(result['answer'], meta={
+                'success': True,
+                'memories_used': len(result.get('memories', []))
+            })
+        
         # Use RAG to answer
         result = rag.ask(question)
         
@@ -12,9 +12,9 @@ from memory_rag_agent import MemoryRAGAgent
 
 
 class MemoryQuizAgent:
-    def __init__(self):
-        """Initialize the Memory Quiz Agent"""
-        self.rag_agent = MemoryRAGAgent()
+    def __init__(self, rag_agent: MemoryRAGAgent = None):
+        """Initialize the Memory Quiz Agent (pass an existing agent to share it)"""
+        self.rag_agent = rag_agent or MemoryRAGAgent()
         
     def generate_memory_question(self, days_back: int = 1) -> Dict:
         """
@@ -6,31 +6,49 @@ Processes audio transcriptions and images to build a knowledge graph
 
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from openai import OpenAI
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
+from chunk_persons import get_chunk_persons
 
 # Load environment variables
 load_dotenv()
 
+# Per-stage timeouts (seconds) for the query_memories retrieval fan-out.
+# A stage that misses its budget is dropped so the answer isn't stalled.
+DEFAULT_STAGE_TIMEOUTS = {
+    'embedding': 3.0,
+    'summaries': 4.0,
+    'events': 4.0,
+    'interactions': 4.0
+}
+
 
 class MemoryRAGAgent:
     def __init__(
         self,
         supabase_url: str = None,
         supabase_key: str = None,
-        openai_api_key: str = None
+        openai_api_key: str = None,
+        stage_timeouts: Dict[str, float] = None,
+        max_workers: int = 8,
+        supabase_client: Client = None,
+        openai_client: OpenAI = None
     ):
-        """Initialize the Memory RAG Agent"""
-        self.supabase: Client = create_client(
-            supabase_url or os.getenv("SUPABASE_URL"),
-            supabase_key or os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=openai_api_key or os.getenv("OPENAI_API_KEY"))
+        """Initialize the Memory RAG Agent (clients default to the shared process-wide pool)"""
+        self.supabase: Client = supabase_client or get_supabase(supabase_url, supabase_key)
+        self.openai = openai_client or get_openai(openai_api_key)
         self.embedding_model = "text-embedding-3-small"  # OpenAI embedding model
         
+        # Retrieval fan-out: independent network calls run on this pool
+        self.stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-retrieval")
+        
     def process_audio_chunk(self, audio_chunk_id: str) -> Dict:
         """
         Process an audio chunk to extract:
@@ -52,21 +70,24 @@ class MemoryRAGAgent:
         if not transcription:
             return {"error": "No transcription available"}
         
-        # Get associated images (detected persons)
-        images_result = self.supabase.table('images').select('*').eq('audio_chunk_id', audio_chunk_id).execute()
-        detected_persons = []
-        for img in images_result.data:
-            if img.get('detected_persons'):
-                detected_persons.extend(img['detected_persons'])
-        detected_persons = list(set(detected_persons))  # Remove duplicates
+        # Detected persons come with the chunk row (audio_chunks.persons)
+        detected_persons = get_chunk_persons(self.supabase, audio_chunk_id, audio_chunk)
         
         # Use LLM to analyze the conversation
         analysis = self._analyze_conversation(transcription, detected_persons)
         
-        # Store in knowledge graph
-        self._store_conversation_summary(audio_chunk_id, analysis)
-        self._store_person_interactions(audio_chunk_id, analysis, detected_persons)
-        self._store_memory_events(audio_chunk_id, analysis, audio_chunk)
+        # One embeddings request covers the summary and every event description
+        events = analysis.get('memory_events', [])
+        embeddings = self._generate_embeddings(
+            [analysis.get('summary', '')] + [event.get('event_description', '') for event in events]
+        )
+        
+        # Store in knowledge graph (one upsert per table)
+        self._store_conversation_summary(audio_chunk_id, analysis, embedding=embeddings[0])
+        if not analysis.get('analysis_failed'):
+            # These replace the chunk's earlier rows, so a failed analysis must not empty them
+            self._store_person_interactions(audio_chunk_id, analysis, detected_persons)
+            self._store_memory_events(audio_chunk_id, analysis, audio_chunk, embeddings=embeddings[1:])
         
         return analysis
     
@@ -131,7 +152,8 @@ Focus on:
                 "topics": [],
                 "key_points": [],
                 "memory_events": [],
-                "person_interactions": []
+                "person_interactions": [],
+                "analysis_failed": True
             }
     
     def _generate_embedding(self, text: str) -> List[float]:
@@ -146,13 +168,38 @@ Focus on:
             print(f"Error generating embedding: {e}")
             return None
     
-    def _store_conversation_summary(self, audio_chunk_id: str, analysis: Dict):
+    def _generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Generate embeddings for several texts in a single request.
+        Returns one entry per input text (None for empty text or on error).
+        """
+        embeddings = [None] * len(texts)
+        non_empty = [(i, text) for i, text in enumerate(texts) if text]
+        
+        if not non_empty:
+            return embeddings
+        
+        try:
+            response = self.openai.embeddings.create(
+                model=self.embedding_model,
+                input=[text for _, text in non_empty]
+            )
+            for (i, _), item in zip(non_empty, sorted(response.data, key=lambda d: d.index)):
+                embeddings[i] = item.embedding
+        except Exception as e:
+            print(f"Error generating embeddings: {e}")
+        
+        return embeddings
+    
+    def _store_conversation_summary(self, audio_chunk_id: str, analysis: Dict, embedding: List[float] = None):
         """Store conversation summary in database with embedding"""
         try:
             summary = analysis.get('summary', '')
             
-            # Generate embedding for the summary
-            embedding = self._generate_embedding(summary)
+            # Generate embedding for the summary unless the caller batched it
+            # (an empty summary has nothing to embed)
+            if embedding is None and summary:
+                embedding = self._generate_embedding(summary)
             
             insert_data = {
                 'audio_chunk_id': audio_chunk_id,
@@ -166,87 +213,215 @@ Focus on:
             if embedding:
                 insert_data['embedding'] = embedding
             
-            self.supabase.table('conversation_summaries').insert(insert_data).execute()
+            # One summary per chunk: reprocessing replaces it
+            self.supabase.table('conversation_summaries') \
+                .upsert(insert_data, on_conflict='audio_chunk_id') \
+                .execute()
         except Exception as e:
             print(f"Error storing conversation summary: {e}")
     
     def _store_person_interactions(self, audio_chunk_id: str, analysis: Dict, detected_persons: List[str]):
-        """Store person interactions in database"""
+        """Store person interactions in database (single bulk upsert), replacing the chunk's earlier ones"""
         try:
-            interactions = analysis.get('person_interactions', [])
-            for interaction in interactions:
-                self.supabase.table('person_interactions').insert({
+            rows = {}
+            for interaction in analysis.get('person_interactions', []):
+                row = {
                     'audio_chunk_id': audio_chunk_id,
                     'person_name': interaction.get('person_name', 'Unknown'),
                     'interaction_type': interaction.get('interaction_type', 'conversation'),
                     'context': interaction.get('context', '')
-                }).execute()
+                }
+                # Natural key - duplicates within one batch would fail the upsert
+                rows[(row['person_name'], row['interaction_type'])] = row
+            
+            if rows:
+                self.supabase.table('person_interactions') \
+                    .upsert(list(rows.values()), on_conflict='audio_chunk_id,person_name,interaction_type') \
+                    .execute()
+            
+            # Drop interactions from an earlier analysis whose person is no longer found
+            stored = self.supabase.table('person_interactions') \
+                .select('id, person_name, interaction_type') \
+                .eq('audio_chunk_id', audio_chunk_id) \
+                .execute()
+            stale = [row['id'] for row in stored.data or []
+                     if (row['person_name'], row['interaction_type']) not in rows]
+            if stale:
+                self.supabase.table('person_interactions').delete().in_('id', stale).execute()
         except Exception as e:
             print(f"Error storing person interactions: {e}")
     
-    def _store_memory_events(self, audio_chunk_id: str, analysis: Dict, audio_chunk: Dict):
-        """Store memory events in database with embeddings"""
+    def _store_memory_events(self, audio_chunk_id: str, analysis: Dict, audio_chunk: Dict, embeddings: List = None):
+        """Store memory events in database with embeddings (single bulk upsert)"""
         try:
             events = analysis.get('memory_events', [])
-            for event in events:
-                # Use audio chunk end_time as event time
-                event_time = audio_chunk.get('end_time', datetime.now().isoformat())
-                event_description = event.get('event_description', '')
-                
-                # Generate embedding for the event description
-                embedding = self._generate_embedding(event_description)
-                
-                insert_data = {
+            
+            # Embed all event descriptions in one request unless the caller batched it
+            if embeddings is None and events:
+                embeddings = self._generate_embeddings([event.get('event_description', '') for event in events])
+            
+            # Use audio chunk end_time as event time
+            event_time = audio_chunk.get('end_time', datetime.now().isoformat())
+            
+            rows = []
+            for event_index, (event, embedding) in enumerate(zip(events, embeddings)):
+                rows.append({
                     'audio_chunk_id': audio_chunk_id,
+                    'event_index': event_index,
                     'event_type': event.get('event_type', 'other'),
-                    'event_description': event_description,
+                    'event_description': event.get('event_description', ''),
                     'participants': event.get('participants', []),
                     'event_time': event_time,
-                    'importance_score': event.get('importance_score', 0.5)
-                }
-                
-                # Add embedding if generated successfully
-                if embedding:
-                    insert_data['embedding'] = embedding
-                
-                self.supabase.table('memory_events').insert(insert_data).execute()
+                    'importance_score': event.get('importance_score', 0.5),
+                    # Always present so every row in the batch has the same columns
+                    'embedding': embedding
+                })
+            
+            # Keyed on the event's position in the analysis: a rerun that rewords
+            # the descriptions replaces the rows instead of adding new ones
+            if rows:
+                self.supabase.table('memory_events') \
+                    .upsert(rows, on_conflict='audio_chunk_id,event_index') \
+                    .execute()
+            # Drop events left over from an earlier analysis that found more (or all of them if none now)
+            self.supabase.table('memory_events') \
+                .delete() \
+                .eq('audio_chunk_id', audio_chunk_id) \
+                .gte('event_index', len(rows)) \
+                .execute()
         except Exception as e:
             print(f"Error storing memory events: {e}")
     
-    def query_memories(self, query: str, days_back: int = 7) -> str:
+    def query_memories(self, query: str, days_back: int = 7, timings: Optional[Dict] = None) -> str:
         """
         Query memories using natural language with semantic search
         Examples:
         - "What did I do yesterday?"
         - "Who visited me this week?"
         - "Did I take my medication today?"
+        
+        Retrieval runs concurrently: the interaction fetch starts alongside the
+        query embedding, and the summary/event searches start together as soon
+        as the embedding is back. Pass a dict as timings to get the
+        per-stage timings (ms) of this call filled in.
         """
-        # Generate embedding for the query
-        query_embedding = self._generate_embedding(query)
+        query_started = time.perf_counter()
+        context, stage_timings = self._retrieve_context(query, days_back)
+        timings = self._own_timings(timings, stage_timings)
+        
+        # Use LLM to answer the query
+        answer_started = time.perf_counter()
+        answer = self._generate_answer(query, context)
+        timings['stages']['answer'] = round((time.perf_counter() - answer_started) * 1000, 1)
+        timings['total'] = round((time.perf_counter() - query_started) * 1000, 1)
+        
+        self._print_timings(timings)
+        
+        return answer
+    
+    def stream_query_memories(self, query: str, days_back: int = 7, timings: Optional[Dict] = None):
+        """
+        Streaming variant of query_memories.
+        Yields pieces of the answer as soon as retrieval finishes and the
+        model starts producing tokens. timings is filled in like query_memories'.
+        """
+        query_started = time.perf_counter()
+        context, stage_timings = self._retrieve_context(query, days_back)
+        timings = self._own_timings(timings, stage_timings)
+        
+        answer_started = time.perf_counter()
+        for piece in self._stream_answer(query, context):
+            if 'first_token' not in timings['stages']:
+                timings['stages']['first_token'] = round((time.perf_counter() - answer_started) * 1000, 1)
+            yield piece
+        
+        timings['stages']['answer'] = round((time.perf_counter() - answer_started) * 1000, 1)
+        timings['total'] = round((time.perf_counter() - query_started) * 1000, 1)
+        
+        self._print_timings(timings)
+    
+    @staticmethod
+    def _own_timings(timings: Optional[Dict], stage_timings: Dict) -> Dict:
+        """The caller's timings dict (per call, never shared) filled with the retrieval timings"""
+        if timings is None:
+            return stage_timings
+        timings.update(stage_timings)
+        return timings
+    
+    def _retrieve_context(self, query: str, days_back: int):
+        """Run the retrieval fan-out and build the LLM context string"""
+        retrieval_started = time.perf_counter()
+        timings = {'stages': {}, 'timed_out': []}
         
         # Get relevant time range
         end_time = datetime.now()
         start_time = end_time - timedelta(days=days_back)
         
+        # Person interactions don't depend on the embedding - start right away
+        interactions_stage = self._submit_stage(self._get_recent_interactions, start_time, end_time)
+        embedding_stage = self._submit_stage(self._generate_embedding, query)
+        
+        query_embedding = self._collect_stage('embedding', embedding_stage, timings, default=None)
+        
         # Use semantic search to find similar conversations and events
         if query_embedding:
-            summaries = self._semantic_search_summaries(query_embedding, start_time, end_time)
-            events = self._semantic_search_events(query_embedding, start_time, end_time)
+            summaries_stage = self._submit_stage(self._semantic_search_summaries, query_embedding, start_time, end_time)
+            events_stage = self._submit_stage(self._semantic_search_events, query_embedding, start_time, end_time)
         else:
             # Fallback to time-based retrieval if embedding fails
-            summaries = self._get_recent_summaries(start_time, end_time)
-            events = self._get_recent_events(start_time, end_time)
+            summaries_stage = self._submit_stage(self._get_recent_summaries, start_time, end_time)
+            events_stage = self._submit_stage(self._get_recent_events, start_time, end_time)
+        
+        summaries = self._collect_stage('summaries', summaries_stage, timings, default=[])
+        events = self._collect_stage('events', events_stage, timings, default=[])
+        interactions = self._collect_stage('interactions', interactions_stage, timings, default=[])
         
-        # Get person interactions (no embedding search for these)
-        interactions = self._get_recent_interactions(start_time, end_time)
+        timings['retrieval'] = round((time.perf_counter() - retrieval_started) * 1000, 1)
         
         # Build context for LLM
         context = self._build_context(summaries, events, interactions)
         
-        # Use LLM to answer the query
-        answer = self._generate_answer(query, context)
+        return context, timings
+    
+    def _submit_stage(self, fn, *args) -> Dict:
+        """Start a retrieval stage on the pool, remembering when it was submitted"""
+        submitted = time.perf_counter()
         
-        return answer
+        def timed():
+            result = fn(*args)
+            return result, time.perf_counter() - submitted
+        
+        return {'future': self._executor.submit(timed), 'submitted': submitted}
+    
+    def _collect_stage(self, name: str, stage: Dict, timings: Dict, default=None):
+        """
+        Wait for a stage within its timeout (measured from submission).
+        On timeout or error the stage degrades to `default`.
+        """
+        budget = self.stage_timeouts.get(name, DEFAULT_STAGE_TIMEOUTS.get(name, 5.0))
+        remaining = max(0.0, budget - (time.perf_counter() - stage['submitted']))
+        
+        try:
+            result, elapsed = stage['future'].result(timeout=remaining)
+            timings['stages'][name] = round(elapsed * 1000, 1)
+            return result
+        except FutureTimeoutError:
+            print(f"⚠️  Retrieval stage '{name}' exceeded {budget:.1f}s, continuing without it")
+            timings['stages'][name] = round(budget * 1000, 1)
+            timings['timed_out'].append(name)
+            return default
+        except Exception as e:
+            print(f"Error in retrieval stage '{name}': {e}")
+            timings['stages'][name] = round((time.perf_counter() - stage['submitted']) * 1000, 1)
+            return default
+    
+    def _print_timings(self, timings: Dict):
+        """Log a one-line per-stage timing breakdown"""
+        stages = ', '.join(f"{name}={ms:.0f}ms" for name, ms in timings['stages'].items())
+        line = f"⏱️  query_memories: {stages} | retrieval={timings['retrieval']:.0f}ms total={timings['total']:.0f}ms"
+        if timings['timed_out']:
+            line += f" | timed out: {', '.join(timings['timed_out'])}"
+        print(line)
     
     def _semantic_search_summaries(self, query_embedding: List[float], start_time: datetime, end_time: datetime, limit: int = 10) -> List[Dict]:
         """Search for similar conversation summaries using vector similarity"""
@@ -363,21 +538,25 @@ Focus on:
         
         return "\n".join(context_parts)
     
+    def _answer_messages(self, query: str, context: str) -> List[Dict]:
+        """Chat messages for answering a query from retrieved context"""
+        return [
+            {
+                "role": "system",
+                "content": "You are a helpful memory assistant for an Alzheimer's patient. Use the provided context to answer their questions warmly and clearly. If you don't have enough information, say so gently."
+            },
+            {
+                "role": "user",
+                "content": f"Context from recent memories:\n{context}\n\nQuestion: {query}"
+            }
+        ]
+    
     def _generate_answer(self, query: str, context: str) -> str:
         """Generate answer using LLM with retrieved context"""
         try:
             response = self.openai.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful memory assistant for an Alzheimer's patient. Use the provided context to answer their questions warmly and clearly. If you don't have enough information, say so gently."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Context from recent memories:\n{context}\n\nQuestion: {query}"
-                    }
-                ]
+                messages=self._answer_messages(query, context)
             )
             
             return response.choices[0].message.content
@@ -385,7 +564,26 @@ Focus on:
         except Exception as e:
             print(f"Error generating answer: {e}")
             return "I'm having trouble accessing your memories right now. Please try again."
-
+    
+    def _stream_answer(self, query: str, context: str):
+        """Generate answer with the streaming API, yielding text pieces"""
+        produced = False
+        try:
+            stream = self.openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=self._answer_messages(query, context),
+                stream=True
+            )
+            
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    produced = True
+                    yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            print(f"Error streaming answer: {e}")
+            if not produced:
+                yield "I'm having trouble accessing your memories right now. Please try again."
 
 if __name__ == "__main__":
     # Example usage
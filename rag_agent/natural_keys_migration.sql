@@ -0,0 +1,58 @@
+-- Natural Keys Migration
+-- Run this in Supabase SQL Editor on databases created before bulk upserts.
+-- Removes duplicate rows (keeping the newest) and adds the unique indexes
+-- used by the on_conflict upserts in memory_rag_agent.py and conversation_combiner.py
+
+-- conversation_summaries: one per audio chunk
+DELETE FROM conversation_summaries a
+USING conversation_summaries b
+WHERE a.audio_chunk_id = b.audio_chunk_id
+AND (a.created_at, a.id) < (b.created_at, b.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_conversation_summaries_audio
+ON conversation_summaries(audio_chunk_id);
+
+-- person_interactions: one per (chunk, person, interaction type)
+DELETE FROM person_interactions a
+USING person_interactions b
+WHERE a.audio_chunk_id = b.audio_chunk_id
+AND a.person_name = b.person_name
+AND a.interaction_type IS NOT DISTINCT FROM b.interaction_type
+AND (a.created_at, a.id) < (b.created_at, b.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_person_interactions_key
+ON person_interactions(audio_chunk_id, person_name, interaction_type);
+
+-- memory_events: one per (chunk, position in the analysis).
+-- Descriptions are not part of the key: they are unbounded text, and the
+-- LLM rewords them when a chunk is reanalyzed.
+DELETE FROM memory_events a
+USING memory_events b
+WHERE a.audio_chunk_id = b.audio_chunk_id
+AND a.event_type = b.event_type
+AND a.event_description = b.event_description
+AND (a.created_at, a.id) < (b.created_at, b.id);
+
+ALTER TABLE memory_events ADD COLUMN IF NOT EXISTS event_index INTEGER NOT NULL DEFAULT 0;
+
+UPDATE memory_events m
+SET event_index = numbered.event_index
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY audio_chunk_id ORDER BY created_at, id) - 1 AS event_index
+    FROM memory_events
+) numbered
+WHERE m.id = numbered.id;
+
+DROP INDEX IF EXISTS uq_memory_events_key;
+CREATE UNIQUE INDEX uq_memory_events_key
+ON memory_events(audio_chunk_id, event_index);
+
+-- combined_conversations: one per (person, start time)
+DELETE FROM combined_conversations a
+USING combined_conversations b
+WHERE a.person_name = b.person_name
+AND a.start_time = b.start_time
+AND (a.created_at, a.id) < (b.created_at, b.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_combined_conversations_person_start
+ON combined_conversations(person_name, start_time);
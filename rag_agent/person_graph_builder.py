@@ -9,24 +9,22 @@ import os
 import json
 from datetime import datetime
 from typing import List, Dict
-from openai import OpenAI
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
+from chunk_persons import get_chunk_persons
 
 load_dotenv()
 
 
 class PersonGraphBuilder:
-    def __init__(self):
+    def __init__(self, supabase_client=None, openai_client=None):
         """Initialize the Person Graph Builder"""
-        self.supabase: Client = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.supabase: Client = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
         self.embedding_model = "text-embedding-3-small"
     
-    def build_person_memory(self, audio_chunk_id: str) -> Dict:
+    def build_person_memory(self, audio_chunk_id: str, single_call: bool = True) -> Dict:
         """
         Build person-centric memory from audio chunk
         
@@ -37,6 +35,10 @@ class PersonGraphBuilder:
         4. Create summary
         5. Generate embedding
         6. Store in person_memories table
+        
+        With single_call=True (default) steps 3-6 cost one chat completion,
+        one embeddings request and one insert no matter how many people
+        were in the photos. single_call=False keeps the per-person calls.
         """
         # Get audio chunk
         audio_result = self.supabase.table('audio_chunks').select('*').eq('id', audio_chunk_id).execute()
@@ -51,15 +53,8 @@ class PersonGraphBuilder:
         if not transcription:
             return {"error": "No transcription available"}
         
-        # Get detected persons from images
-        images_result = self.supabase.table('images').select('*').eq('audio_chunk_id', audio_chunk_id).execute()
-        
-        detected_persons = set()
-        for img in images_result.data:
-            if img.get('detected_persons'):
-                detected_persons.update(img['detected_persons'])
-        
-        detected_persons = list(detected_persons)
+        # Detected persons come with the chunk row (audio_chunks.persons)
+        detected_persons = get_chunk_persons(self.supabase, audio_chunk_id, audio_chunk)
         
         if not detected_persons:
             print("⚠️  No persons detected in images")
@@ -67,18 +62,26 @@ class PersonGraphBuilder:
         
         print(f"📸 Detected persons: {', '.join(detected_persons)}")
         
-        # For each person, extract their conversation
-        results = []
-        for person_name in detected_persons:
-            person_memory = self._extract_person_conversation(
-                person_name,
+        if single_call:
+            results = self._extract_all_person_conversations(
+                detected_persons,
                 transcription,
                 audio_chunk_id,
                 conversation_date
             )
-            
-            if person_memory:
-                results.append(person_memory)
+        else:
+            # For each person, extract their conversation
+            results = []
+            for person_name in detected_persons:
+                person_memory = self._extract_person_conversation(
+                    person_name,
+                    transcription,
+                    audio_chunk_id,
+                    conversation_date
+                )
+                
+                if person_memory:
+                    results.append(person_memory)
         
         return {
             "success": True,
@@ -87,6 +90,114 @@ class PersonGraphBuilder:
             "results": results
         }
     
+    def _extract_all_person_conversations(
+        self,
+        person_names: List[str],
+        full_transcription: str,
+        audio_chunk_id: str,
+        conversation_date: str
+    ) -> List[Dict]:
+        """Extract every person's conversation slice in one LLM call, then embed and insert in bulk"""
+        
+        try:
+            names = ', '.join(person_names)
+            prompt = f"""Analyze this conversation and, for EACH person listed, extract what was said TO or ABOUT them.
+
+Full Conversation:
+{full_transcription}
+
+Persons: {names}
+
+Provide a JSON response with one entry per person, using the names exactly as listed:
+{{
+    "persons": [
+        {{
+            "person_name": "Name",
+            "conversation_text": "The parts of conversation involving this person",
+            "summary": "Brief summary of what was discussed with/about this person",
+            "topics": ["topic1", "topic2"],
+            "sentiment": "positive/neutral/negative/mixed",
+            "key_points": ["point1", "point2"]
+        }}
+    ]
+}}
+
+If a person is not mentioned or involved, return empty strings for them.
+"""
+            
+            response = self.openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are extracting person-specific conversations for memory assistance."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
+            
+            analysis = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"  ❌ Error extracting persons: {e}")
+            return []
+        
+        # Match entries back to the detected names (case-insensitive)
+        by_name = {name.lower(): name for name in person_names}
+        extracted = []
+        seen = set()
+        for entry in analysis.get('persons', []):
+            person_name = by_name.get(str(entry.get('person_name', '')).lower())
+            conversation_text = entry.get('conversation_text', '')
+            
+            if not person_name or person_name in seen:
+                continue
+            seen.add(person_name)
+            
+            # Skip if no relevant conversation
+            if not conversation_text or len(conversation_text) < 10:
+                print(f"  ⏭️  No relevant conversation for {person_name}")
+                continue
+            
+            extracted.append((person_name, entry))
+        
+        if not extracted:
+            return []
+        
+        # One embeddings request for all persons
+        embeddings = self._generate_embeddings(
+            [f"{person_name}: {entry['conversation_text']}" for person_name, entry in extracted]
+        )
+        
+        rows = []
+        results = []
+        for (person_name, entry), embedding in zip(extracted, embeddings):
+            rows.append({
+                'person_name': person_name,
+                'conversation_text': entry['conversation_text'],
+                'summary': entry.get('summary', ''),
+                'topics': entry.get('topics', []),
+                'sentiment': entry.get('sentiment', 'neutral'),
+                'audio_chunk_id': audio_chunk_id,
+                'conversation_date': conversation_date,
+                'embedding': embedding
+            })
+            results.append({
+                'person_name': person_name,
+                'summary': entry.get('summary', ''),
+                'topics': entry.get('topics', []),
+                'sentiment': entry.get('sentiment', 'neutral')
+            })
+        
+        try:
+            self.supabase.table('person_memories').insert(rows).execute()
+        except Exception as e:
+            print(f"  ❌ Error storing person memories: {e}")
+            return []
+        
+        for result in results:
+            print(f"  ✅ Stored memory for {result['person_name']}")
+            print(f"     Summary: {result['summary'][:80]}...")
+        
+        return results
+    
     def _extract_person_conversation(
         self,
         person_name: str,
@@ -182,6 +293,18 @@ If {person_name} is not mentioned or involved, return empty strings.
             print(f"Error generating embedding: {e}")
             return None
     
+    def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts in one request (None entries on error)"""
+        try:
+            response = self.openai.embeddings.create(
+                model=self.embedding_model,
+                input=texts
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except Exception as e:
+            print(f"Error generating embeddings: {e}")
+            return [None] * len(texts)
+    
     def get_person_memories(self, person_name: str, days_back: int = 7) -> List[Dict]:
         """Get all memories for a specific person"""
         try:
@@ -2,26 +2,44 @@
 """
 Populate combined_conversations table
 Run this AFTER creating the table in Supabase
+
+By default only audio chunks whose persons changed since the last run are
+considered (audio_chunks.persons_updated_at, see add_chunk_persons.sql) and
+the affected conversations are extended in place (see combiner_state.json).
+Pass --full to rebuild every conversation from scratch (this also deletes
+stale rows and resets combiner_state.json); do that once after applying the
+persons_updated_at migration.
 """
 
+import sys
 from conversation_combiner import ConversationCombiner
 
+full_rebuild = '--full' in sys.argv
+
 print("="*60)
 print("POPULATING COMBINED CONVERSATIONS")
 print("="*60)
 
 combiner = ConversationCombiner()
 
-# Combine all conversations
-print("\n1. Combining audio chunks...")
-results = combiner.combine_all_conversations()
-
-# Show summary
-combiner.print_summary(results)
-
-# Save to database
-print("\n2. Saving to database...")
-combiner.save_combined_conversations(results)
+if full_rebuild:
+    # Rebuild all conversations, drop superseded rows and reset the
+    # incremental state to this point
+    print("\n1. Rebuilding from all audio chunks...")
+    results = combiner.rebuild_all_conversations()
+    
+    # Show summary
+    combiner.print_summary(results)
+else:
+    # Only chunks whose persons changed since the last run
+    print("\n1. Combining new audio chunks...")
+    results = combiner.combine_new_conversations()
+    
+    # Show summary
+    combiner.print_summary(results)
+    
+    if not results:
+        print("\nNo new conversations since the last run.")
 
 print("\n" + "="*60)
 print("✅ DONE! Check Supabase 'combined_conversations' table")
@@ -4,21 +4,38 @@ Simple, deterministic conversation flow
 Uses rich family context and actual conversation details
 """
 
-import os
-from difflib import SequenceMatcher
-from openai import OpenAI
 from dotenv import load_dotenv
+from answer_evaluator import AnswerEvaluator
+from clients import get_openai
 
 load_dotenv()
 
-def fuzzy_match(word1, word2, threshold=0.75):
-    """Check if two words are similar enough (handles typos)"""
-    return SequenceMatcher(None, word1.lower(), word2.lower()).ratio() >= threshold
+_evaluator = None
+
+
+def get_evaluator():
+    """Shared tiered evaluator - keyword variants and embeddings are reused across turns"""
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = AnswerEvaluator(get_openai())
+    return _evaluator
 
 def semantic_match(user_answer, expected_keywords, context=""):
+    """
+    Check if answer is semantically correct with the tiered evaluator:
+    keywords → fuzzy/phonetic → embeddings, and GPT only when all of those abstain
+    """
+    verdict = get_evaluator().evaluate(
+        user_answer,
+        expected_keywords,
+        llm_judge=lambda: {'correct': llm_semantic_match(user_answer, expected_keywords, context)}
+    )
+    return verdict['correct']
+
+def llm_semantic_match(user_answer, expected_keywords, context=""):
     """Use GPT to check if answer is semantically correct"""
     try:
-        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        openai_client = get_openai()
         
         prompt = f"""Is the user's answer semantically correct or close enough?
 
@@ -123,6 +140,10 @@ class SimpleConversationFlow:
                 'next_step': 7
             }
         ]
+        
+        # Keyword variants indexed once per flow (typos, sound-alikes)
+        for step in self.flow:
+            get_evaluator().prepare(step['expected_keywords'])
     
     def get_current_question(self):
         """Get the current question"""
@@ -249,30 +270,9 @@ class SimpleConversationFlow:
             }
         
         # Check if any expected keyword is in the answer
-        # Use 3-tier matching: exact → fuzzy → semantic (GPT)
-        is_correct = False
-        
-        # Tier 1: Exact match
-        for keyword in step['expected_keywords']:
-            if keyword in answer_lower:
-                is_correct = True
-                break
-        
-        # Tier 2: Fuzzy matching for typos
-        if not is_correct:
-            answer_words = answer_lower.split()
-            for keyword in step['expected_keywords']:
-                for word in answer_words:
-                    if fuzzy_match(word, keyword, threshold=0.75):
-                        is_correct = True
-                        break
-                if is_correct:
-                    break
-        
-        # Tier 3: Semantic matching with GPT (for similar concepts)
-        if not is_correct:
-            context = f"Question: {step['question']}"
-            is_correct = semantic_match(answer_lower, step['expected_keywords'], context)
+        # Tiered matching: exact → fuzzy/phonetic → embedding → semantic (GPT)
+        context = f"Question: {step['question']}"
+        is_correct = semantic_match(answer_lower, step['expected_keywords'], context)
         
         if is_correct:
             # Correct! Move to next question and reset attempts
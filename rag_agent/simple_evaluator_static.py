@@ -4,11 +4,7 @@ Simple, deterministic conversation flow
 Uses rich family context and actual conversation details
 """
 
-from difflib import SequenceMatcher
-
-def fuzzy_match(word1, word2, threshold=0.75):
-    """Check if two words are similar enough (handles typos)"""
-    return SequenceMatcher(None, word1.lower(), word2.lower()).ratio() >= threshold
+from keyword_index import KeywordIndex
 
 class SimpleConversationFlow:
     def __init__(self, memory_data):
@@ -84,6 +80,9 @@ class SimpleConversationFlow:
                 'next_step': 7
             }
         ]
+        
+        # Keyword variants indexed once per flow (typos, sound-alikes)
+        self.keyword_indexes = [KeywordIndex(step['expected_keywords']) for step in self.flow]
     
     def get_current_question(self):
         """Get the current question"""
@@ -210,24 +209,7 @@ class SimpleConversationFlow:
             }
         
         # Check if any expected keyword is in the answer (with fuzzy matching for typos)
-        is_correct = False
-        
-        # First try exact match
-        for keyword in step['expected_keywords']:
-            if keyword in answer_lower:
-                is_correct = True
-                break
-        
-        # If no exact match, try fuzzy matching for typos
-        if not is_correct:
-            answer_words = answer_lower.split()
-            for keyword in step['expected_keywords']:
-                for word in answer_words:
-                    if fuzzy_match(word, keyword, threshold=0.75):
-                        is_correct = True
-                        break
-                if is_correct:
-                    break
+        is_correct = self.keyword_indexes[self.current_step].matches(answer_lower)
         
         if is_correct:
             # Correct! Move to next question and reset attempts
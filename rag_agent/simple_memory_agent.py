@@ -3,20 +3,15 @@
 SIMPLE Memory Agent - No complex database, just works!
 """
 
-import os
-from openai import OpenAI
-from supabase import create_client
 from dotenv import load_dotenv
+from clients import get_openai, get_supabase
 
 load_dotenv()
 
 class SimpleMemoryAgent:
-    def __init__(self):
-        self.supabase = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_KEY")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, supabase_client=None, openai_client=None):
+        self.supabase = supabase_client or get_supabase()
+        self.openai = openai_client or get_openai()
     
     def ask_question(self, question: str) -> str:
         """Ask a question about memories - SIMPLE!"""
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events helpers
+Shared by the Flask UIs that stream answers token by token
+"""
+
+import json
+from flask import Response, stream_with_context
+
+
+def wants_stream(request, data: dict = None) -> bool:
+    """
+    A client asks for streaming with {"stream": true} in the JSON body
+    or with an 'Accept: text/event-stream' header.
+    Everyone else keeps getting the regular JSON response.
+    """
+    if data and data.get('stream'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(pieces, meta: dict = None) -> Response:
+    """
+    Stream answer pieces as SSE:
+      meta  -> sent once before the first token (optional)
+      token -> {"text": "..."} for every piece
+      done  -> {"answer": "<full text>"}
+      error -> {"error": "..."} if generation fails mid-stream
+    """
+    def generate():
+        if meta is not None:
+            yield sse_event('meta', meta)
+
+        answer = []
+        try:
+            for piece in pieces:
+                answer.append(piece)
+                yield sse_event('token', {'text': piece})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+            return
+
+        yield sse_event('done', {'answer': ''.join(answer)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Keep proxies from buffering the stream
+        }
+    )
@@ -7,6 +7,7 @@ from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 from memory_rag_agent import MemoryRAGAgent
 from memory_quiz_agent import MemoryQuizAgent
+from streaming import wants_stream, sse_response
 import os
 
 app = Flask(__name__)
@@ -14,7 +15,7 @@ CORS(app)
 
 # Initialize agents
 agent = MemoryRAGAgent()
-quiz_agent = MemoryQuizAgent()
+quiz_agent = MemoryQuizAgent(rag_agent=agent)
 
 
 @app.route('/')
@@ -25,7 +26,11 @@ def index():
 
 @app.route('/api/query', methods=['POST'])
 def query():
-    """Handle memory queries"""
+    """
+    Handle memory queries
+    Send {"stream": true} (or Accept: text/event-stream) to receive the
+    answer as Server-Sent Events as soon as retrieval finishes.
+    """
     try:
         data = request.json
         question = data.get('question', '')
@@ -34,13 +39,21 @@ def query():
         if not question:
             return jsonify({'error': 'No question provided'}), 400
         
+        if wants_stream(request, data):
+            return sse_response(
+                agent.stream_query_memories(question, days_back=days_back),
+                meta={'success': True, 'question': question}
+            )
+        
         # Get answer from RAG agent
-        answer = agent.query_memories(question, days_back=days_back)
+        timings = {}
+        answer = agent.query_memories(question, days_back=days_back, timings=timings)
         
         return jsonify({
             'success': True,
             'question': question,
-            'answer': answer
+            'answer': answer,
+            'timings': timings
         })
         
     except Exception as e:
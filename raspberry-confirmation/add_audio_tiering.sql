@@ -0,0 +1,17 @@
+-- Storage tiering for audio chunks (see compact_audio.py)
+-- storage_tier: 'original' as uploaded, 'opus' after transcoding, 'deleted'
+-- once silent or unlinked audio was removed. The row itself is kept, so
+-- storage_url may now be NULL.
+
+ALTER TABLE audio_chunks
+ADD COLUMN IF NOT EXISTS storage_tier TEXT NOT NULL DEFAULT 'original',
+ADD COLUMN IF NOT EXISTS compacted_at TIMESTAMP DEFAULT NULL;
+
+ALTER TABLE audio_chunks
+ALTER COLUMN storage_url DROP NOT NULL;
+
+-- The compaction job pages through uncompacted chunks by age
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_uncompacted ON audio_chunks(end_time, id) WHERE compacted_at IS NULL;
+
+-- Ingest-activity check (the job pauses while the device uploads)
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_uploaded_at ON audio_chunks(uploaded_at);
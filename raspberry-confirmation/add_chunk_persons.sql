@@ -0,0 +1,72 @@
+-- Materialized chunk -> persons mapping
+-- audio_chunks.persons holds the names detected in any image
+-- linked to the chunk. It is kept current at ingest time by upload_image /
+-- upload_audio, so readers never have to join through the images table.
+
+ALTER TABLE audio_chunks
+ADD COLUMN IF NOT EXISTS persons TEXT[] DEFAULT '{}';
+
+-- When persons last changed: lets readers pick up chunks whose images were
+-- linked after the fact (images usually arrive before their audio)
+ALTER TABLE audio_chunks
+ADD COLUMN IF NOT EXISTS persons_updated_at TIMESTAMP DEFAULT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_persons_updated ON audio_chunks(persons_updated_at, id);
+
+-- "Who was in this chunk" / "which chunks had Rae" lookups
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_persons ON audio_chunks USING GIN (persons);
+
+-- "Conversations from a given day" lookups
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_end_time ON audio_chunks(end_time);
+
+-- Atomically merge names into a chunk's persons (no read-modify-write race
+-- when several images for the same chunk arrive together)
+CREATE OR REPLACE FUNCTION add_chunk_persons(
+    p_audio_chunk_id UUID,
+    p_persons TEXT[]
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    -- Names are matched case-insensitively but keep their display case;
+    -- the spelling already stored wins over a new one
+    UPDATE audio_chunks
+    SET persons = ARRAY(
+        SELECT name FROM (
+            SELECT DISTINCT ON (lower(p)) p AS name
+            FROM unnest(COALESCE(persons, '{}') || p_persons) WITH ORDINALITY AS u(p, n)
+            ORDER BY lower(p), n
+        ) merged
+        ORDER BY lower(name)
+    ),
+    -- High-water mark for incremental readers (conversation_combiner.py)
+    persons_updated_at = clock_timestamp()
+    WHERE id = p_audio_chunk_id;
+$$;
+
+-- Backfill from existing images (re-running it restores the display case
+-- of names an earlier version of this migration lowercased)
+UPDATE audio_chunks ac
+SET persons = linked.persons
+FROM (
+    SELECT i.audio_chunk_id, ARRAY(
+        SELECT name FROM (
+            SELECT DISTINCT ON (lower(p)) p AS name
+            FROM images i2, unnest(i2.detected_persons) AS p
+            WHERE i2.audio_chunk_id = i.audio_chunk_id
+            ORDER BY lower(p), i2.uploaded_at
+        ) merged
+        ORDER BY lower(name)
+    ) AS persons
+    FROM images i
+    WHERE i.audio_chunk_id IS NOT NULL
+    AND i.detected_persons IS NOT NULL
+    GROUP BY i.audio_chunk_id
+) linked
+WHERE ac.id = linked.audio_chunk_id;
+
+-- Chunks with persons from before the column existed count as changed at upload
+UPDATE audio_chunks
+SET persons_updated_at = uploaded_at
+WHERE persons_updated_at IS NULL
+AND persons <> '{}';
@@ -0,0 +1,9 @@
+-- Perceptual hash of each image (64-bit dHash, 16 hex chars)
+-- upload_image drops near-duplicates: same persons, few differing hash bits,
+-- captured within the dedupe window (see DEDUPE_WINDOW_SECONDS in app.py).
+
+ALTER TABLE images
+ADD COLUMN IF NOT EXISTS phash TEXT DEFAULT NULL;
+
+-- Exact re-uploads and the windowed duplicate check at ingest
+CREATE INDEX IF NOT EXISTS idx_images_phash ON images(phash, captured_at);
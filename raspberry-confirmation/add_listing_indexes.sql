@@ -0,0 +1,9 @@
+-- Indexes for the /files listing
+-- Keyset pagination walks (time, id) newest first; prefix filters
+-- (filename LIKE 'temp/pic_2025-11-08%') need text_pattern_ops.
+
+CREATE INDEX IF NOT EXISTS idx_images_listing ON images(captured_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_listing ON audio_chunks(end_time DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_images_filename_prefix ON images(filename text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_filename_prefix ON audio_chunks(filename text_pattern_ops);
@@ -0,0 +1,17 @@
+-- Capture location from the device's GPS track
+-- latitude/longitude are joined on the Pi at capture time; geohash (precision 9,
+-- ~5 m) makes "what happened around here" a prefix range scan on an index.
+
+ALTER TABLE images
+ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION DEFAULT NULL,
+ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION DEFAULT NULL,
+ADD COLUMN IF NOT EXISTS geohash TEXT DEFAULT NULL;
+
+ALTER TABLE audio_chunks
+ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION DEFAULT NULL,
+ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION DEFAULT NULL,
+ADD COLUMN IF NOT EXISTS geohash TEXT DEFAULT NULL;
+
+-- Prefix lookups (geohash LIKE 'u33db%') need text_pattern_ops
+CREATE INDEX IF NOT EXISTS idx_images_geohash ON images(geohash text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_audio_chunks_geohash ON audio_chunks(geohash text_pattern_ops);
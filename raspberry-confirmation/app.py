@@ -3,15 +3,23 @@ Backend API - Receive Images and Audio, Store in Supabase
 Includes Voice Recognition for Patient Detection
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from supabase import create_client, Client
 from robust_voice_system import RobustVoiceSystem
 import tempfile
+import json
+import time
+import base64
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
+from media_cache import DiskLRUCache, CLIP_FORMATS, write_clip
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -53,11 +61,125 @@ UPLOAD_FOLDER = 'data'
 IMAGES_FOLDER = os.path.join(UPLOAD_FOLDER, 'images')
 AUDIO_FOLDER = os.path.join(UPLOAD_FOLDER, 'audio')
 
+# Batch uploads: items stored in parallel (audio mostly waits on Whisper)
+BATCH_WORKERS = 4
+
+# /files listing: page size, and how long a page is served from memory
+FILES_PAGE_SIZE = 100
+FILES_MAX_PAGE_SIZE = 500
+FILES_CACHE_TTL = 10  # seconds
+FILES_CACHE_MAX_ENTRIES = 256
+
+# /media endpoints: longest clip, and how long clients may keep media (immutable per URL)
+MAX_CLIP_SECONDS = 300
+MEDIA_MAX_AGE = 24 * 3600
+
+# Image dedupe at ingest: near-identical photos of the same persons are stored once per window
+DEDUPE_WINDOW_SECONDS = 30  # One audio chunk: every chunk keeps at least one photo
+DEDUPE_MAX_DISTANCE = 8  # dHash bits of 64
+
+# Audio formats accepted from the device (the Pi sends 16 kHz FLAC or Ogg/Opus by default)
+AUDIO_CONTENT_TYPES = {
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.mp3': 'audio/mpeg',
+}
+
+
+def audio_suffix(filename):
+    """File extension of an uploaded audio file, '.wav' if unknown (Whisper detects the format by name)"""
+    suffix = os.path.splitext(filename or '')[1].lower()
+    return suffix if suffix in AUDIO_CONTENT_TYPES else '.wav'
+
 # Create directories
 Path(IMAGES_FOLDER).mkdir(parents=True, exist_ok=True)
 Path(AUDIO_FOLDER).mkdir(parents=True, exist_ok=True)
 
 
+# Geohash of stored capture locations (precision 9 = ~5 m cells, see add_location_columns.sql)
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash of a coordinate; nearby points share a prefix"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def parse_location(value):
+    """Location sent as {lat, lon} or 'lat,lon' -> (lat, lon), or None if missing or invalid"""
+    if not value:
+        return None
+    try:
+        if isinstance(value, dict):
+            lat, lon = float(value['lat']), float(value['lon'])
+        else:
+            lat, lon = (float(v) for v in str(value).split(','))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def location_columns(location):
+    """latitude/longitude/geohash columns for an images or audio_chunks row"""
+    if not location:
+        return {}
+    lat, lon = location
+    return {'latitude': lat, 'longitude': lon, 'geohash': geohash_encode(lat, lon)}
+
+
+def add_chunk_persons(audio_chunk_id, persons):
+    """Merge detected persons into audio_chunks.persons (atomic, see add_chunk_persons.sql)"""
+    try:
+        supabase.rpc('add_chunk_persons', {
+            'p_audio_chunk_id': audio_chunk_id,
+            'p_persons': list(persons)
+        }).execute()
+    except Exception as e:
+        print(f"⚠️  Could not update chunk persons: {e}")
+
+
+def link_orphan_images(audio_chunk_id, start_time, end_time):
+    """Attach not-yet-linked images captured inside [start_time, end_time] to this chunk"""
+    try:
+        result = supabase.table('images') \
+            .update({'audio_chunk_id': audio_chunk_id}) \
+            .is_('audio_chunk_id', 'null') \
+            .gte('captured_at', start_time.isoformat()) \
+            .lte('captured_at', end_time.isoformat()) \
+            .execute()
+        
+        persons = set()
+        for img in result.data or []:
+            persons.update(img.get('detected_persons') or [])
+        
+        if persons:
+            add_chunk_persons(audio_chunk_id, sorted(persons))
+            print(f"✅ Linked {len(result.data)} earlier images to audio chunk, persons: {sorted(persons)}")
+    except Exception as e:
+        print(f"⚠️  Could not link earlier images: {e}")
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Check if backend is running"""
@@ -67,6 +189,228 @@ def health_check():
     }), 200
 
 
+def parse_detected_persons(value):
+    """detected_persons sent as a JSON array or a comma-separated string"""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return value
+    import json
+    try:
+        # Try parsing as JSON array
+        return json.loads(value)
+    except:
+        # Fall back to comma-separated string
+        return [p.strip() for p in value.split(',')]
+
+
+def parse_phash(value):
+    """Client dHash -> 16 lowercase hex chars, or None if missing; raises ValueError if malformed"""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if len(value) != 16 or any(c not in '0123456789abcdef' for c in value):
+        raise ValueError(f"phash must be 16 hex characters, got '{value}'")
+    return value
+
+
+def image_phash(file_data):
+    """64-bit difference hash (16 hex chars) like the Pi's motion_gate.dhash, or None without Pillow"""
+    try:
+        from io import BytesIO
+        from PIL import Image
+        image = Image.open(BytesIO(file_data))
+        image.draft('L', (image.width // 8, image.height // 8))  # Decode JPEGs at reduced size
+        pixels = list(image.convert('L').resize((9, 8), Image.Resampling.BOX).getdata())
+    except Exception as e:
+        print(f"⚠️  Could not hash image: {e}")
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col + 1] > pixels[row * 9 + col])
+    return f"{value:016x}"
+
+
+def find_audio_chunk(captured_at):
+    """Audio chunk whose [start_time, end_time] contains captured_at, or None"""
+    # Image captured_at should fall between audio start_time and end_time
+    try:
+        result = supabase.table('audio_chunks').select('id, start_time, end_time, filename').execute()
+        for chunk in result.data:
+            # Parse timestamps and make timezone-aware
+            start_str = chunk['start_time'].replace('Z', '+00:00') if 'Z' in chunk['start_time'] else chunk['start_time']
+            end_str = chunk['end_time'].replace('Z', '+00:00') if 'Z' in chunk['end_time'] else chunk['end_time']
+            
+            start = datetime.fromisoformat(start_str)
+            end = datetime.fromisoformat(end_str)
+            
+            # Make timezone-aware if not already
+            if start.tzinfo is None:
+                start = start.replace(tzinfo=timezone.utc)
+            if end.tzinfo is None:
+                end = end.replace(tzinfo=timezone.utc)
+            
+            if start <= captured_at <= end:
+                print(f"✅ Matched image to audio chunk: {chunk['filename']}")
+                return chunk
+    except Exception as e:
+        print(f"⚠️  Could not find matching audio chunk: {e}")
+    return None
+
+
+def find_duplicate_image(phash, captured_at, detected_persons, audio_chunk_id):
+    """
+    An image of audio_chunk_id with the same persons and a near-identical
+    hash captured within DEDUPE_WINDOW_SECONDS of captured_at, or None.
+    Only images of the same chunk count, so every chunk keeps its own photo.
+    """
+    window = timedelta(seconds=DEDUPE_WINDOW_SECONDS)
+    persons = sorted(p.lower() for p in detected_persons or [])
+    try:
+        result = supabase.table('images') \
+            .select('id, filename, storage_url, phash, detected_persons') \
+            .eq('audio_chunk_id', audio_chunk_id) \
+            .gte('captured_at', (captured_at - window).isoformat()) \
+            .lte('captured_at', (captured_at + window).isoformat()) \
+            .not_.is_('phash', 'null') \
+            .limit(200) \
+            .execute()
+    except Exception as e:
+        print(f"⚠️  Duplicate check failed: {e}")
+        return None
+    
+    for image in result.data or []:
+        same_persons = sorted(p.lower() for p in image.get('detected_persons') or []) == persons
+        try:
+            distance = bin(int(image['phash'], 16) ^ int(phash, 16)).count('1')
+        except ValueError:
+            continue  # Malformed hash stored before clients were validated
+        if same_persons and distance <= DEDUPE_MAX_DISTANCE:
+            return image
+    return None
+
+
+def image_capture_time(base_filename, captured_at=None):
+    """
+    Capture time (UTC-aware): captured_at if the device sent it, else parsed
+    from pic_YYYY-MM-DD+HH-MM[-SS].jpg, else now.
+    """
+    if captured_at is None and 'pic_' in base_filename and '+' in base_filename:
+        try:
+            parts = os.path.splitext(base_filename)[0].replace('pic_', '').split('+')
+            date_part = parts[0]  # 2025-11-08
+            time_part = parts[1].replace('-', ':')  # 17:37:03 or 17:37
+            
+            # Handle both formats: HH:MM:SS and HH:MM
+            if time_part.count(':') == 2:
+                # Format: HH:MM:SS (e.g., 17:37:03)
+                captured_at = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S")
+            else:
+                # Format: HH:MM (e.g., 17:37)
+                captured_at = datetime.strptime(f"{date_part} {time_part}:00", "%Y-%m-%d %H:%M:%S")
+        except (IndexError, ValueError):
+            print(f"⚠️  Could not parse capture time from {base_filename}, using now")
+    if captured_at is None:
+        captured_at = datetime.now()
+    
+    # Make captured_at timezone-aware (UTC)
+    if captured_at.tzinfo is None:
+        captured_at = captured_at.replace(tzinfo=timezone.utc)
+    return captured_at
+
+
+def stored_row(table, filename, columns='id, filename, storage_url'):
+    """The row already indexed under filename (a retried upload), or None"""
+    try:
+        result = supabase.table(table).select(columns).eq('filename', filename).limit(1).execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"⚠️  Could not check for {filename}: {e}")
+        return None
+
+
+def store_image(file_data, base_filename=None, folder='', detected_persons=None, captured_at=None, location=None,
+                phash=None):
+    """
+    Store one image in Supabase (or locally) and index it in the images table.
+    captured_at overrides the time parsed from the filename; location is (lat, lon);
+    phash is the device's dHash (computed here if missing).
+    A near-duplicate of an image already stored in the same audio chunk for
+    the same persons within the dedupe window is not stored again: the
+    existing image is returned with 'duplicate_of'. Without a matching chunk
+    the image is always stored, so a chunk uploaded later keeps its photo. A filename that is already indexed (the device
+    retrying a batch whose response was lost) is returned with 'already_stored'.
+    Returns {'filename', 'url'}; raises if the file could not be stored or indexed.
+    """
+    # Use original filename from Raspberry Pi
+    # Format: pic_2025-11-08+01-07.jpg (date + hour-minute)
+    base_filename = base_filename or f"image_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+    
+    # Add folder prefix if provided
+    filename = f"{folder}/{base_filename}" if folder else base_filename
+    
+    if supabase:
+        existing = stored_row('images', filename)
+        if existing:
+            print(f"⏭️  Already stored: {filename}")
+            return {'filename': filename, 'url': existing['storage_url'], 'already_stored': True}
+        
+        captured_at = image_capture_time(filename.split('/')[-1], captured_at)
+        phash = phash or image_phash(file_data)
+        
+        # Find matching audio chunk based on timestamp
+        chunk = find_audio_chunk(captured_at)
+        audio_chunk_id = chunk['id'] if chunk else None
+        
+        # Collapse near-duplicates before spending storage on them
+        duplicate = None
+        if phash and audio_chunk_id:
+            duplicate = find_duplicate_image(phash, captured_at, detected_persons, audio_chunk_id)
+        if duplicate:
+            print(f"⏭️  Near-duplicate of {duplicate['filename']}, not stored: {filename}")
+            # The chunk still learns who was there, even without a photo of its own
+            if detected_persons:
+                add_chunk_persons(audio_chunk_id, detected_persons)
+            return {'filename': duplicate['filename'], 'url': duplicate['storage_url'],
+                    'duplicate_of': duplicate['id']}
+        
+        # Upload to Supabase Storage
+        supabase.storage.from_('alzheimer-images').upload(
+            filename,
+            file_data,
+            file_options={"content-type": "image/jpeg", "upsert": "true"}
+        )
+        storage_url = supabase.storage.from_('alzheimer-images').get_public_url(filename)
+        
+        # Insert into images table with audio_chunk_id and detected_persons.
+        # Upsert on filename: a retry racing the first upload updates the row.
+        # A failure raises, so the device keeps the file and retries.
+        supabase.table('images').upsert({
+            'filename': filename,
+            'storage_url': storage_url,
+            'captured_at': captured_at.isoformat(),
+            'detected_persons': detected_persons,
+            'audio_chunk_id': audio_chunk_id,
+            'phash': phash,
+            **location_columns(location)
+        }, on_conflict='filename').execute()
+        print(f"✅ Image inserted with audio_chunk_id: {audio_chunk_id}, detected_persons: {detected_persons}")
+        invalidate_files_cache()
+        
+        # Keep the materialized chunk -> persons mapping current
+        if audio_chunk_id and detected_persons:
+            add_chunk_persons(audio_chunk_id, detected_persons)
+    else:
+        # Fallback to local storage
+        filepath = os.path.join(IMAGES_FOLDER, filename)
+        with open(filepath, 'wb') as f:
+            f.write(file_data)
+        storage_url = f"/local/{filename}"
+    
+    return {'filename': filename, 'url': storage_url}
+
+
 @app.route('/upload/image', methods=['POST'])
 def upload_image():
     """Receive image and store in Supabase"""
@@ -79,118 +423,29 @@ def upload_image():
         
         file = request.files['image']
         
-        # Check if folder parameter is provided (e.g., "temp")
-        folder = request.form.get('folder', '')
-        
-        # Get detected persons (sent as JSON array or comma-separated string)
-        detected_persons = None
-        if 'detected_persons' in request.form:
-            import json
-            try:
-                # Try parsing as JSON array
-                detected_persons = json.loads(request.form.get('detected_persons'))
-            except:
-                # Fall back to comma-separated string
-                detected_persons = [p.strip() for p in request.form.get('detected_persons').split(',')]
-        
-        # Use original filename from Raspberry Pi
-        # Format: pic_2025-11-08+01-07.jpg (date + hour-minute)
-        base_filename = file.filename if file.filename else f"image_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-        
-        # Add folder prefix if provided
-        filename = f"{folder}/{base_filename}" if folder else base_filename
+        try:
+            phash = parse_phash(request.form.get('phash'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        # Read file data
-        file_data = file.read()
-        
-        # Upload to Supabase Storage
-        if supabase:
-            supabase.storage.from_('alzheimer-images').upload(
-                filename,
-                file_data,
-                file_options={"content-type": "image/jpeg", "upsert": "true"}
-            )
-            storage_url = supabase.storage.from_('alzheimer-images').get_public_url(filename)
-            
-            # Extract timestamp from filename: pic_2025-11-08+01-07.jpg
-            # Format: pic_YYYY-MM-DD+HH-MM.jpg
-            try:
-                from datetime import datetime
-                
-                # Parse timestamp from filename or use current time
-                from datetime import timezone
-                
-                # Remove folder prefix before parsing
-                base_filename = filename.split('/')[-1] if '/' in filename else filename
-                
-                if 'pic_' in base_filename and '+' in base_filename:
-                    parts = base_filename.replace('pic_', '').replace('.jpg', '').replace('.png', '').split('+')
-                    date_part = parts[0]  # 2025-11-08
-                    time_part = parts[1].replace('-', ':')  # 17:37:03 or 17:37
-                    
-                    # Handle both formats: HH:MM:SS and HH:MM
-                    if time_part.count(':') == 2:
-                        # Format: HH:MM:SS (e.g., 17:37:03)
-                        captured_at = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S")
-                    else:
-                        # Format: HH:MM (e.g., 17:37)
-                        captured_at = datetime.strptime(f"{date_part} {time_part}:00", "%Y-%m-%d %H:%M:%S")
-                else:
-                    captured_at = datetime.now()
-                
-                # Make captured_at timezone-aware (UTC)
-                if captured_at.tzinfo is None:
-                    captured_at = captured_at.replace(tzinfo=timezone.utc)
-                
-                # Find matching audio chunk based on timestamp
-                # Image captured_at should fall between audio start_time and end_time
-                audio_chunk_id = None
-                try:
-                    result = supabase.table('audio_chunks').select('id, start_time, end_time, filename').execute()
-                    for chunk in result.data:
-                        # Parse timestamps and make timezone-aware
-                        start_str = chunk['start_time'].replace('Z', '+00:00') if 'Z' in chunk['start_time'] else chunk['start_time']
-                        end_str = chunk['end_time'].replace('Z', '+00:00') if 'Z' in chunk['end_time'] else chunk['end_time']
-                        
-                        start = datetime.fromisoformat(start_str)
-                        end = datetime.fromisoformat(end_str)
-                        
-                        # Make timezone-aware if not already
-                        if start.tzinfo is None:
-                            start = start.replace(tzinfo=timezone.utc)
-                        if end.tzinfo is None:
-                            end = end.replace(tzinfo=timezone.utc)
-                        
-                        if start <= captured_at <= end:
-                            audio_chunk_id = chunk['id']
-                            print(f"✅ Matched image to audio chunk: {chunk['filename']}")
-                            break
-                except Exception as e:
-                    print(f"⚠️  Could not find matching audio chunk: {e}")
-                
-                # Insert into images table with audio_chunk_id and detected_persons
-                supabase.table('images').insert({
-                    'filename': filename,
-                    'storage_url': storage_url,
-                    'captured_at': captured_at.isoformat(),
-                    'detected_persons': detected_persons,
-                    'audio_chunk_id': audio_chunk_id
-                }).execute()
-                print(f"✅ Image inserted with audio_chunk_id: {audio_chunk_id}, detected_persons: {detected_persons}")
-            except Exception as e:
-                print(f"⚠️  Could not insert into database: {e}")
-        else:
-            # Fallback to local storage
-            filepath = os.path.join(IMAGES_FOLDER, filename)
-            with open(filepath, 'wb') as f:
-                f.write(file_data)
-            storage_url = f"/local/{filename}"
+        stored = store_image(
+            file.read(),
+            base_filename=file.filename,
+            folder=request.form.get('folder', ''),  # e.g. "temp"
+            detected_persons=parse_detected_persons(request.form.get('detected_persons')),
+            location=parse_location(request.form.get('location')),  # "lat,lon"
+            phash=phash
+        )
         
         return jsonify({
             'success': True,
             'message': 'Image received and stored successfully',
-            'filename': filename,
-            'url': storage_url
+            'filename': stored['filename'],
+            'url': stored['url'],
+            'duplicate_of': stored.get('duplicate_of')
         }), 200
         
     except Exception as e:
@@ -200,6 +455,118 @@ def upload_image():
         }), 500
 
 
+def store_audio(file_data, base_filename=None, folder='', end_time=None, location=None):
+    """
+    Transcribe one audio chunk, store it in Supabase (or locally) and index it
+    in audio_chunks. end_time overrides the time parsed from the filename;
+    location is (lat, lon).
+    A filename that is already indexed is not transcribed again: the stored
+    chunk is returned with 'already_stored'.
+    Returns {'filename', 'url', 'transcription'}; raises if the file could not be stored or indexed.
+    """
+    # Use original filename from Raspberry Pi
+    # Format: audio_2025-11-08+01-05.wav (date + hour-minute, end time of 5-min chunk)
+    base_filename = base_filename or f"audio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+    
+    # Add folder prefix if provided
+    filename = f"{folder}/{base_filename}" if folder else base_filename
+    
+    if supabase:
+        existing = stored_row('audio_chunks', filename, 'id, filename, storage_url, transcription')
+        if existing:
+            print(f"⏭️  Already stored: {filename}")
+            return {'filename': filename, 'url': existing['storage_url'],
+                    'transcription': existing['transcription'], 'already_stored': True}
+    
+    # Save to temporary file for transcription
+    with tempfile.NamedTemporaryFile(delete=False, suffix=audio_suffix(base_filename)) as temp_file:
+        temp_file.write(file_data)
+        temp_path = temp_file.name
+    
+    # Transcribe audio using OpenAI Whisper (if available)
+    transcription_text = None
+    if openai_client:
+        try:
+            print(f"Auto-transcribing: {filename}")
+            with open(temp_path, 'rb') as audio:
+                transcript = openai_client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio,
+                    language="en"
+                )
+            transcription_text = transcript.text
+            print(f"✅ Transcription complete: {len(transcription_text)} characters")
+        except Exception as e:
+            print(f"⚠️  Transcription failed: {e}")
+    
+    # Clean up temp file
+    os.unlink(temp_path)
+    
+    # Upload to Supabase Storage
+    if supabase:
+        supabase.storage.from_('alzheimer-audio').upload(
+            filename,
+            file_data,
+            file_options={"content-type": AUDIO_CONTENT_TYPES[audio_suffix(base_filename)], "upsert": "true"}
+        )
+        storage_url = supabase.storage.from_('alzheimer-audio').get_public_url(filename)
+        
+        # Extract timestamp from filename: audio_2025-11-08+01-05.wav
+        # Format: audio_YYYY-MM-DD+HH-MM.wav (end time of 5-min chunk)
+        from datetime import timedelta
+        
+        # Try to parse timestamp from filename
+        # Remove folder prefix (e.g., "temp/") before parsing
+        base_filename = filename.split('/')[-1] if '/' in filename else filename
+        
+        try:
+            if end_time is None and 'audio_' in base_filename and '+' in base_filename:
+                parts = os.path.splitext(base_filename)[0].replace('audio_', '').split('+')
+                date_part = parts[0]  # 2025-11-08
+                time_part = parts[1].replace('-', ':')  # 17:37:03 or 17:37
+                
+                # Handle both formats: HH:MM:SS and HH:MM
+                if time_part.count(':') == 2:
+                    # Format: HH:MM:SS (e.g., 17:37:03)
+                    end_time = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S")
+                else:
+                    # Format: HH:MM (e.g., 17:37)
+                    end_time = datetime.strptime(f"{date_part} {time_part}:00", "%Y-%m-%d %H:%M:%S")
+        except (ValueError, IndexError) as e:
+            print(f"⚠️  Could not parse time from {base_filename}: {e}")
+        
+        # End time sent by the device or parsed from the filename, else now
+        end_time = end_time or datetime.now()
+        start_time = end_time - timedelta(minutes=5)
+        
+        # Insert into audio_chunks table with transcription.
+        # Upsert on filename: a retry racing the first upload updates the row.
+        # A failure raises, so the device keeps the file and retries.
+        inserted = supabase.table('audio_chunks').upsert({
+            'filename': filename,
+            'storage_url': storage_url,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'transcription': transcription_text,
+            'transcribed_at': datetime.now().isoformat() if transcription_text else None,
+            **location_columns(location)
+        }, on_conflict='filename').execute()
+        print(f"✅ Inserted into database: {filename}")
+        invalidate_files_cache()
+        
+        # Images captured during this chunk may have been uploaded first
+        if inserted.data:
+            link_orphan_images(inserted.data[0]['id'], start_time, end_time)
+    else:
+        # Fallback to local storage
+        filepath = os.path.join(AUDIO_FOLDER, filename)
+        with open(filepath, 'wb') as f:
+            f.write(file_data)
+        storage_url = f"/local/{filename}"
+    
+    return {'filename': filename, 'url': storage_url, 'transcription': transcription_text}
+
+
 @app.route('/upload/audio', methods=['POST'])
 def upload_audio():
     """Receive audio and store in Supabase"""
@@ -212,104 +579,19 @@ def upload_audio():
         
         file = request.files['audio']
         
-        # Check if folder parameter is provided (e.g., "temp")
-        folder = request.form.get('folder', '')
-        
-        # Use original filename from Raspberry Pi
-        # Format: audio_2025-11-08+01-05.wav (date + hour-minute, end time of 5-min chunk)
-        base_filename = file.filename if file.filename else f"audio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-        
-        # Add folder prefix if provided
-        filename = f"{folder}/{base_filename}" if folder else base_filename
-        
-        # Read file data
-        file_data = file.read()
-        
-        # Save to temporary file for transcription
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            temp_file.write(file_data)
-            temp_path = temp_file.name
-        
-        # Transcribe audio using OpenAI Whisper (if available)
-        transcription_text = None
-        if openai_client:
-            try:
-                print(f"Auto-transcribing: {filename}")
-                with open(temp_path, 'rb') as audio:
-                    transcript = openai_client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio,
-                        language="en"
-                    )
-                transcription_text = transcript.text
-                print(f"✅ Transcription complete: {len(transcription_text)} characters")
-            except Exception as e:
-                print(f"⚠️  Transcription failed: {e}")
-        
-        # Clean up temp file
-        os.unlink(temp_path)
-        
-        # Upload to Supabase Storage
-        if supabase:
-            supabase.storage.from_('alzheimer-audio').upload(
-                filename,
-                file_data,
-                file_options={"content-type": "audio/wav", "upsert": "true"}
-            )
-            storage_url = supabase.storage.from_('alzheimer-audio').get_public_url(filename)
-            
-            # Extract timestamp from filename: audio_2025-11-08+01-05.wav
-            # Format: audio_YYYY-MM-DD+HH-MM.wav (end time of 5-min chunk)
-            try:
-                from datetime import datetime, timedelta
-                
-                # Try to parse timestamp from filename
-                # Remove folder prefix (e.g., "temp/") before parsing
-                base_filename = filename.split('/')[-1] if '/' in filename else filename
-                
-                if 'audio_' in base_filename and '+' in base_filename:
-                    parts = base_filename.replace('audio_', '').replace('.wav', '').replace('.mp3', '').split('+')
-                    date_part = parts[0]  # 2025-11-08
-                    time_part = parts[1].replace('-', ':')  # 17:37:03 or 17:37
-                    
-                    # Handle both formats: HH:MM:SS and HH:MM
-                    if time_part.count(':') == 2:
-                        # Format: HH:MM:SS (e.g., 17:37:03)
-                        end_time = datetime.strptime(f"{date_part} {time_part}", "%Y-%m-%d %H:%M:%S")
-                    else:
-                        # Format: HH:MM (e.g., 17:37)
-                        end_time = datetime.strptime(f"{date_part} {time_part}:00", "%Y-%m-%d %H:%M:%S")
-                    
-                    start_time = end_time - timedelta(minutes=5)
-                else:
-                    # Use current time if filename doesn't match pattern
-                    end_time = datetime.now()
-                    start_time = end_time - timedelta(minutes=5)
-                
-                # Insert into audio_chunks table with transcription
-                supabase.table('audio_chunks').insert({
-                    'filename': filename,
-                    'storage_url': storage_url,
-                    'start_time': start_time.isoformat(),
-                    'end_time': end_time.isoformat(),
-                    'transcription': transcription_text,
-                    'transcribed_at': datetime.now().isoformat() if transcription_text else None
-                }).execute()
-                print(f"✅ Inserted into database: {filename}")
-            except Exception as e:
-                print(f"⚠️  Could not insert into database: {e}")
-        else:
-            # Fallback to local storage
-            filepath = os.path.join(AUDIO_FOLDER, filename)
-            with open(filepath, 'wb') as f:
-                f.write(file_data)
-            storage_url = f"/local/{filename}"
+        stored = store_audio(
+            file.read(),
+            base_filename=file.filename,
+            folder=request.form.get('folder', ''),  # e.g. "temp"
+            location=parse_location(request.form.get('location'))  # "lat,lon"
+        )
+        transcription_text = stored['transcription']
         
         return jsonify({
             'success': True,
             'message': 'Audio received, stored, and transcribed successfully',
-            'filename': filename,
-            'url': storage_url,
+            'filename': stored['filename'],
+            'url': stored['url'],
             'transcription': transcription_text,
             'transcription_length': len(transcription_text) if transcription_text else 0
         }), 200
@@ -321,10 +603,87 @@ def upload_audio():
         }), 500
 
 
+def parse_capture_time(value):
+    """ISO timestamp from a batch manifest (None if missing or malformed)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def store_batch_item(item, upload, folder):
+    """Store one manifest item like /upload/image or /upload/audio -> its result (never raises)"""
+    item_id = item.get('id')
+    try:
+        if upload is None:
+            return {'id': item_id, 'success': False, 'error': f"Missing file part '{item.get('field')}'"}
+        
+        original_filename, file_data = upload
+        base_filename = item.get('filename') or original_filename
+        timestamp = parse_capture_time(item.get('timestamp'))
+        location = parse_location(item.get('location'))
+        
+        if item.get('type') == 'image':
+            stored = store_image(file_data, base_filename, folder,
+                                 detected_persons=parse_detected_persons(item.get('tags')),
+                                 captured_at=timestamp, location=location, phash=parse_phash(item.get('phash')))
+        elif item.get('type') == 'audio':
+            stored = store_audio(file_data, base_filename, folder, end_time=timestamp, location=location)
+        else:
+            return {'id': item_id, 'success': False, 'error': f"Unknown type '{item.get('type')}'"}
+        
+        result = {'id': item_id, 'success': True, 'filename': stored['filename'], 'url': stored['url']}
+        for flag in ('duplicate_of', 'already_stored'):
+            if stored.get(flag):
+                result[flag] = stored[flag]
+        return result
+    
+    except Exception as e:
+        print(f"❌ Batch item {item_id} failed: {e}")
+        return {'id': item_id, 'success': False, 'error': str(e)}
+
+
+def upload_manifest_batch():
+    """Store every file listed in the manifest, in parallel, with one result per item"""
+    import json
+    manifest = json.loads(request.form['manifest'])
+    folder = request.form.get('folder', '')
+    
+    # Read the parts here - the worker threads have no request context
+    uploads = {field: (f.filename, f.read()) for field, f in request.files.items()}
+    
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+        results = list(executor.map(
+            lambda item: store_batch_item(item, uploads.get(item.get('field')), folder),
+            manifest
+        ))
+    
+    stored = sum(1 for r in results if r['success'])
+    print(f"📦 Batch: {stored}/{len(results)} items stored")
+    
+    return jsonify({
+        'success': True,
+        'stored': stored,
+        'failed': len(results) - stored,
+        'results': results
+    }), 200
+
+
 @app.route('/upload/batch', methods=['POST'])
 def upload_batch():
-    """Receive both image and audio together"""
+    """
+    Receive many files in one request.
+    With a 'manifest' form field (JSON list of {id, field, type, filename,
+    timestamp, tags, location, phash}) each item is stored like /upload/image or /upload/audio
+    and gets its own result, so the device can acknowledge items one by one.
+    Without it, one 'image' and/or 'audio' file is saved locally.
+    """
     try:
+        if 'manifest' in request.form:
+            return upload_manifest_batch()
+        
         results = {}
         
         # Save image
@@ -356,42 +715,311 @@ def upload_batch():
         }), 500
 
 
+@app.route('/places/<geohash_prefix>', methods=['GET'])
+def list_place(geohash_prefix):
+    """
+    Images and audio chunks captured in the area of a geohash prefix
+    (5 chars ~5 km, 7 chars ~150 m), newest first. Uses the geohash index.
+    """
+    try:
+        if not supabase:
+            return jsonify({
+                'success': False,
+                'error': 'Supabase not configured'
+            }), 503
+        
+        geohash_prefix = geohash_prefix.lower()
+        if not geohash_prefix or any(c not in GEOHASH_ALPHABET for c in geohash_prefix):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid geohash'
+            }), 400
+        
+        limit = min(request.args.get('limit', 100, type=int), 500)
+        images = supabase.table('images') \
+            .select('filename, storage_url, captured_at, detected_persons, latitude, longitude') \
+            .like('geohash', f"{geohash_prefix}%") \
+            .order('captured_at', desc=True) \
+            .limit(limit) \
+            .execute()
+        audio = supabase.table('audio_chunks') \
+            .select('filename, storage_url, start_time, end_time, persons, latitude, longitude') \
+            .like('geohash', f"{geohash_prefix}%") \
+            .order('end_time', desc=True) \
+            .limit(limit) \
+            .execute()
+        
+        return jsonify({
+            'success': True,
+            'geohash': geohash_prefix,
+            'images': images.data,
+            'audio': audio.data
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+# Listing pages by query string -> (expires_at, body, etag); per worker process
+files_cache = {}
+files_cache_lock = threading.Lock()
+
+# Listing sources: table, time column for ordering and date filters, extra columns
+FILE_LISTINGS = {
+    'images': ('images', 'captured_at', 'detected_persons'),
+    'audio': ('audio_chunks', 'end_time', 'start_time, persons, storage_tier'),
+}
+
+
+def invalidate_files_cache():
+    """Drop cached /files pages after new uploads (other workers expire within FILES_CACHE_TTL)"""
+    with files_cache_lock:
+        files_cache.clear()
+
+
+def encode_cursor(row, time_column):
+    """Opaque keyset cursor: (time, id) of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps([row[time_column], row['id']]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(time, id) from a cursor; ValueError if it is malformed"""
+    try:
+        time_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        datetime.fromisoformat(time_value.replace('Z', '+00:00'))
+        return time_value, str(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def list_file_page(kind, args):
+    """
+    One page of a listing, newest first, from the images / audio_chunks table.
+    Keyset pagination on (time, id) keeps deep pages as cheap as the first.
+    """
+    table, time_column, extra_columns = FILE_LISTINGS[kind]
+    limit = max(1, min(args.get('limit', FILES_PAGE_SIZE, type=int), FILES_MAX_PAGE_SIZE))
+    
+    query = supabase.table(table) \
+        .select(f"id, filename, storage_url, {time_column}, {extra_columns}")
+    if kind == 'audio':
+        query = query.neq('storage_tier', 'deleted')  # Rows kept after compact_audio.py removed the audio
+    
+    # Filename prefix, e.g. "temp/" or "temp/pic_2025-11-08" (LIKE wildcards escaped)
+    prefix = args.get('prefix')
+    if prefix:
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.like('filename', f"{escaped}%")
+    
+    # One day, or a since/until range (ISO dates or timestamps)
+    if args.get('date'):
+        day = datetime.strptime(args['date'], '%Y-%m-%d')
+        query = query.gte(time_column, day.isoformat()).lt(time_column, (day + timedelta(days=1)).isoformat())
+    if args.get('since'):
+        query = query.gte(time_column, datetime.fromisoformat(args['since']).isoformat())
+    if args.get('until'):
+        query = query.lt(time_column, datetime.fromisoformat(args['until']).isoformat())
+    
+    if args.get('cursor'):
+        after_time, after_id = decode_cursor(args['cursor'])
+        query = query.or_(f'{time_column}.lt."{after_time}",and({time_column}.eq."{after_time}",id.lt.{after_id})')
+    
+    # One extra row tells whether there is a next page
+    rows = query.order(time_column, desc=True).order('id', desc=True).limit(limit + 1).execute().data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        'count': len(rows),
+        'files': [row['filename'] for row in rows],
+        'items': rows,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(rows[-1], time_column) if has_more else None
+    }
+
+
+def list_local_files(kind, args):
+    """Fallback listing of the local upload folders (no Supabase), filtered by prefix"""
+    if kind == 'images':
+        folder, extensions = IMAGES_FOLDER, ('.jpg', '.jpeg', '.png')
+    else:
+        folder, extensions = AUDIO_FOLDER, tuple(AUDIO_CONTENT_TYPES)
+    
+    files = []
+    if os.path.exists(folder):
+        files = sorted((f for f in os.listdir(folder)
+                        if f.lower().endswith(extensions) and f.startswith(args.get('prefix', ''))),
+                       reverse=True)
+    return {'count': len(files), 'files': files, 'has_more': False, 'next_cursor': None}
+
+
 @app.route('/files', methods=['GET'])
 def list_files():
-    """List all uploaded files from Supabase"""
+    """
+    List uploaded files, newest first, one page at a time.
+    Query: type (images|audio, default both), limit, cursor (next_cursor of
+    the previous page, requires type), prefix, date (YYYY-MM-DD), since, until.
+    Pages carry an ETag (If-None-Match -> 304) and are cached for FILES_CACHE_TTL seconds.
+    """
     try:
-        images = []
-        audio = []
-        
-        # List from Supabase if available
-        if supabase:
-            # List images
-            image_list = supabase.storage.from_('alzheimer-images').list()
-            images = [f['name'] for f in image_list if f['name'].endswith('.jpg')]
-            
-            # List audio
-            audio_list = supabase.storage.from_('alzheimer-audio').list()
-            audio = [f['name'] for f in audio_list if f['name'].endswith('.wav')]
+        kinds = [request.args['type']] if request.args.get('type') else list(FILE_LISTINGS)
+        if any(kind not in FILE_LISTINGS for kind in kinds):
+            return jsonify({
+                'success': False,
+                'error': f"type must be one of: {', '.join(FILE_LISTINGS)}"
+            }), 400
+        if request.args.get('cursor') and len(kinds) > 1:
+            return jsonify({
+                'success': False,
+                'error': 'cursor requires type'
+            }), 400
+        
+        cache_key = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        now = time.time()
+        with files_cache_lock:
+            cached = files_cache.get(cache_key)
+        
+        if cached and cached[0] > now:
+            body, etag = cached[1], cached[2]
         else:
-            # Fallback to local storage
-            if os.path.exists(IMAGES_FOLDER):
-                images = sorted([f for f in os.listdir(IMAGES_FOLDER) if f.endswith('.jpg')])
-            
-            if os.path.exists(AUDIO_FOLDER):
-                audio = sorted([f for f in os.listdir(AUDIO_FOLDER) if f.endswith('.wav')])
+            listing = {'success': True}
+            for kind in kinds:
+                listing[kind] = list_file_page(kind, request.args) if supabase else list_local_files(kind, request.args)
+            body = json.dumps(listing, default=str)
+            etag = hashlib.sha1(body.encode()).hexdigest()
+            with files_cache_lock:
+                if len(files_cache) >= FILES_CACHE_MAX_ENTRIES:
+                    files_cache.pop(min(files_cache, key=lambda k: files_cache[k][0]))
+                files_cache[cache_key] = (now + FILES_CACHE_TTL, body, etag)
+        
+        response = app.response_class(body, status=200, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f"private, max-age={FILES_CACHE_TTL}"
+        return response.make_conditional(request)
         
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'images': {
-                'count': len(images),
-                'files': sorted(images)
-            },
-            'audio': {
-                'count': len(audio),
-                'files': sorted(audio)
-            }
-        }), 200
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+# Downloaded originals and cut clips, shared by all requests of this worker
+media_cache = DiskLRUCache()
+
+MEDIA_BUCKETS = {
+    'audio': ('alzheimer-audio', AUDIO_FOLDER),
+    'images': ('alzheimer-images', IMAGES_FOLDER),
+}
+
+
+@contextmanager
+def media_source(kind, filename):
+    """
+    Local path of a stored file: the disk cache (from Supabase, pinned until
+    the with block exits) or the local upload folder
+    """
+    bucket, folder = MEDIA_BUCKETS[kind]
+    if '..' in filename.split('/'):
+        raise FileNotFoundError(filename)
+    
+    if not supabase:
+        path = os.path.join(folder, filename)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(filename)
+        yield path
+        return
+    
+    def download(path):
+        try:
+            data = supabase.storage.from_(bucket).download(filename)
+        except Exception as e:
+            raise FileNotFoundError(f"{filename}: {e}")
+        with open(path, 'wb') as f:
+            f.write(data)
+    
+    with media_cache.pinned(f"{bucket}/{filename}", os.path.splitext(filename)[1].lower(), download) as path:
+        yield path
+
+
+def cut_clip(kind, filename, start, end, extension):
+    """create() for a clip cache entry: cut it from the (cached) original"""
+    def create(clip_path):
+        with media_source(kind, filename) as source_path:
+            write_clip(source_path, clip_path, start, end, extension)
+    return create
+
+
+def parse_clip_span(args):
+    """(start, end) seconds from ?start=&end= (end defaults to start + 30 s), or None for the whole file"""
+    if 'start' not in args and 'end' not in args:
+        return None
+    start = args.get('start', 0.0, type=float)
+    end = args.get('end', start + 30.0, type=float)
+    if start < 0 or end <= start:
+        raise ValueError('Need 0 <= start < end')
+    if end - start > MAX_CLIP_SECONDS:
+        raise ValueError(f"Clips are limited to {MAX_CLIP_SECONDS} seconds")
+    return start, end
+
+
+@app.route('/media/<kind>/<path:filename>', methods=['GET'])
+def serve_media(kind, filename):
+    """
+    Serve a stored image or audio file with HTTP Range support, so players
+    can seek and fetch only what they play. For audio, ?start=&end= (seconds
+    from the start of the chunk) returns just that clip, e.g. the span of a
+    memory event; ?format=wav|flac|ogg picks the clip encoding (default wav).
+    Originals and clips are kept in an LRU disk cache.
+    """
+    try:
+        if kind not in MEDIA_BUCKETS:
+            return jsonify({
+                'success': False,
+                'error': f"kind must be one of: {', '.join(MEDIA_BUCKETS)}"
+            }), 404
+        
+        span = parse_clip_span(request.args) if kind == 'audio' else None
+        if span is None:
+            extension = os.path.splitext(filename)[1].lower()
+            source = media_source(kind, filename)
+            mimetype = AUDIO_CONTENT_TYPES.get(extension) if kind == 'audio' else None
+            download_name = os.path.basename(filename)
+        else:
+            extension = '.' + request.args.get('format', 'wav').lower().lstrip('.')
+            if extension not in CLIP_FORMATS:
+                raise ValueError(f"format must be one of: {', '.join(e[1:] for e in CLIP_FORMATS)}")
+            start, end = span
+            # A cached clip needs no original; otherwise cut it from the (cached) original
+            source = media_cache.pinned(f"clip/{filename}/{start:.3f}-{end:.3f}{extension}", extension,
+                                        cut_clip(kind, filename, start, end, extension))
+            mimetype = AUDIO_CONTENT_TYPES[extension]
+            download_name = f"{os.path.splitext(os.path.basename(filename))[0]}_{start:g}-{end:g}{extension}"
         
+        # conditional=True: Range -> 206 Partial Content, plus ETag / If-None-Match.
+        # send_file opens the file, so it stays readable once unpinned and evicted.
+        with source as path:
+            return send_file(path, mimetype=mimetype, conditional=True, max_age=MEDIA_MAX_AGE,
+                             download_name=download_name)
+    
+    except FileNotFoundError:
+        return jsonify({
+            'success': False,
+            'error': f"Not found: {filename}"
+        }), 404
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -424,7 +1052,7 @@ def verify_voice():
         audio_file = request.files['audio']
         
         # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=audio_suffix(audio_file.filename)) as temp_file:
             audio_file.save(temp_file.name)
             temp_path = temp_file.name
         
@@ -485,7 +1113,7 @@ def transcribe_audio():
         filename = audio_file.filename
         
         # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=audio_suffix(filename)) as temp_file:
             audio_file.save(temp_file.name)
             temp_path = temp_file.name
         
@@ -560,9 +1188,12 @@ def sync_temp_audio():
             try:
                 filename = f"temp/{file_obj['name']}"
                 
-                # Check if already in database
-                existing = supabase.table('audio_chunks').select('filename').eq('filename', filename).execute()
-                if existing.data:
+                # Check if already in database, under any extension: compact_audio.py
+                # uploads x.ogg before it removes x.wav and renames the row
+                base = os.path.splitext(filename)[0]
+                escaped = base.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                existing = supabase.table('audio_chunks').select('filename').like('filename', f"{escaped}%").execute()
+                if any(os.path.splitext(row['filename'])[0] == base for row in existing.data or []):
                     print(f"⏭️  Skipping (already in DB): {filename}")
                     continue
                 
@@ -570,7 +1201,7 @@ def sync_temp_audio():
                 file_data = supabase.storage.from_('alzheimer-audio').download(filename)
                 
                 # Save to temp file for transcription
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=audio_suffix(filename)) as temp_file:
                     temp_file.write(file_data)
                     temp_path = temp_file.name
                 
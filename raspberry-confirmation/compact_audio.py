@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Audio Storage Compaction
+Background job for the alzheimer-audio bucket. Chunks older than --days are:
+- deleted if silent (below SILENCE_DBFS, or Whisper found no words)
+- deleted if no image was ever linked to them (unless --keep-unlinked)
+- otherwise transcoded to 16 kHz mono Ogg/Opus (~10x smaller than WAV),
+  or kept as is if the Pi already sent Opus
+
+The audio_chunks row is kept either way (transcription, times, persons):
+filename/storage_url point to the .ogg, or storage_url is NULL once the
+audio is deleted, and storage_tier/compacted_at record what happened.
+Every action is appended to a JSONL manifest for auditing.
+
+Resumable: rows with compacted_at set are never picked up again, and a
+crash between upload and row update is repaired on the next run. Until
+then /sync/temp-audio skips the .ogg, since a row has its base name.
+Rate-limited, niced, and paused while the Pi is uploading, so it never
+competes with live ingest.
+
+Requires add_audio_tiering.sql.
+
+Usage:
+    python compact_audio.py [--days 30] [--workers 2] [--per-minute 20] [--dry-run]
+"""
+
+import io
+import os
+import json
+import time
+import argparse
+import threading
+from math import gcd
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+from supabase import create_client
+
+BUCKET = 'alzheimer-audio'
+OPUS_SAMPLERATE = 16000        # Speech; one of the rates Opus supports
+SILENCE_DBFS = -50.0           # Chunks quieter than this (RMS) count as silent
+INGEST_QUIET_SECONDS = 120     # Pause while chunks were uploaded this recently
+BATCH_SIZE = 50
+
+
+class RateLimiter:
+    def __init__(self, per_minute):
+        """Spaces calls at least 60/per_minute seconds apart, across threads"""
+        self.interval = 60.0 / per_minute
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AudioCompactor:
+    def __init__(self, supabase, days=30, keep_unlinked=False, dry_run=False,
+                 manifest_path='compaction_manifest.jsonl', per_minute=20):
+        self.supabase = supabase
+        self.cutoff = datetime.now() - timedelta(days=days)
+        self.keep_unlinked = keep_unlinked
+        self.dry_run = dry_run
+        self.manifest_path = manifest_path
+        self.manifest_lock = threading.Lock()
+        self.limiter = RateLimiter(per_minute)
+        self.totals = {'transcoded': 0, 'kept': 0, 'deleted_silent': 0, 'deleted_unlinked': 0, 'error': 0,
+                       'bytes_before': 0, 'bytes_after': 0}
+
+    def candidates(self, after=None):
+        """Next batch of uncompacted chunks older than the cutoff, oldest first (keyset by end_time, id)"""
+        query = self.supabase.table('audio_chunks') \
+            .select('id, filename, storage_url, end_time, transcription') \
+            .is_('compacted_at', 'null') \
+            .lt('end_time', self.cutoff.isoformat())
+        if after:
+            # Rows with the same end_time as the last one but a larger id, or a later end_time
+            query = query.or_(f'end_time.gt."{after[0]}",and(end_time.eq."{after[0]}",id.gt.{after[1]})')
+        return query.order('end_time').order('id').limit(BATCH_SIZE).execute().data or []
+
+    def ingest_active(self):
+        """True if the device uploaded audio in the last INGEST_QUIET_SECONDS"""
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=INGEST_QUIET_SECONDS)
+        try:
+            recent = self.supabase.table('audio_chunks').select('id') \
+                .gte('uploaded_at', since.isoformat()) \
+                .limit(1) \
+                .execute()
+            return bool(recent.data)
+        except Exception as e:
+            print(f"⚠️  Could not check ingest activity: {e}")
+            return False
+
+    def is_linked(self, chunk_id):
+        result = self.supabase.table('images').select('id') \
+            .eq('audio_chunk_id', chunk_id) \
+            .limit(1) \
+            .execute()
+        return bool(result.data)
+
+    def record(self, chunk, action, **details):
+        entry = {'time': datetime.now().isoformat(), 'id': chunk['id'], 'filename': chunk['filename'],
+                 'action': action, 'dry_run': self.dry_run, **details}
+        with self.manifest_lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.totals[action] = self.totals.get(action, 0) + 1
+            self.totals['bytes_before'] += details.get('bytes_before', 0)
+            self.totals['bytes_after'] += details.get('bytes_after', 0)
+
+    def process(self, chunk):
+        """Compact one chunk (never raises)"""
+        self.limiter.wait()
+        filename = chunk['filename']
+        target = os.path.splitext(filename)[0] + '.ogg'
+        try:
+            try:
+                data = self.supabase.storage.from_(BUCKET).download(filename)
+            except Exception:
+                # Resume: an earlier run uploaded the .ogg and removed the original, then stopped
+                if target != filename and not self.dry_run:
+                    self.supabase.storage.from_(BUCKET).download(target)
+                    self.update_row(chunk, target, 'opus')
+                    self.record(chunk, 'transcoded', new_filename=target, resumed=True)
+                    return
+                raise
+
+            audio, samplerate = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+            audio = audio.mean(axis=1)
+            rms = float(np.sqrt(np.mean(np.square(audio)))) if audio.size else 0.0
+            dbfs = 20 * np.log10(max(rms, 1e-10))
+            no_words = chunk.get('transcription') is not None and not chunk['transcription'].strip()
+
+            if dbfs < SILENCE_DBFS or no_words:
+                self.delete_audio(chunk)
+                self.record(chunk, 'deleted_silent', dbfs=round(dbfs, 1), bytes_before=len(data))
+                return
+            if not self.keep_unlinked and not self.is_linked(chunk['id']):
+                self.delete_audio(chunk)
+                self.record(chunk, 'deleted_unlinked', bytes_before=len(data))
+                return
+
+            if filename.endswith('.ogg'):
+                self.mark_compacted(chunk, 'opus')  # Uploaded as Opus already
+                self.record(chunk, 'kept', bytes_before=len(data), bytes_after=len(data))
+                return
+
+            if samplerate != OPUS_SAMPLERATE:
+                divisor = gcd(samplerate, OPUS_SAMPLERATE)
+                audio = resample_poly(audio, OPUS_SAMPLERATE // divisor, samplerate // divisor)
+            buffer = io.BytesIO()
+            sf.write(buffer, np.clip(audio, -1.0, 1.0), OPUS_SAMPLERATE, format='OGG', subtype='OPUS')
+            encoded = buffer.getvalue()
+
+            if not self.dry_run:
+                # New object first, then drop the original, then point the row at the new one
+                self.supabase.storage.from_(BUCKET).upload(
+                    target, encoded, file_options={"content-type": "audio/ogg", "upsert": "true"}
+                )
+                self.supabase.storage.from_(BUCKET).remove([filename])
+                self.update_row(chunk, target, 'opus')
+            self.record(chunk, 'transcoded', new_filename=target, bytes_before=len(data), bytes_after=len(encoded))
+        except Exception as e:
+            print(f"❌ {filename}: {e}")
+            self.record(chunk, 'error', error=str(e))
+
+    def update_row(self, chunk, filename, tier):
+        self.supabase.table('audio_chunks').update({
+            'filename': filename,
+            'storage_url': self.supabase.storage.from_(BUCKET).get_public_url(filename),
+            'storage_tier': tier,
+            'compacted_at': datetime.now().isoformat()
+        }).eq('id', chunk['id']).execute()
+
+    def mark_compacted(self, chunk, tier):
+        if not self.dry_run:
+            self.supabase.table('audio_chunks').update({
+                'storage_tier': tier,
+                'compacted_at': datetime.now().isoformat()
+            }).eq('id', chunk['id']).execute()
+
+    def delete_audio(self, chunk):
+        """Remove the media; the row (transcription, times, persons) stays"""
+        if self.dry_run:
+            return
+        # Row first: a crash in between leaves a stray file, never a row pointing at nothing
+        self.supabase.table('audio_chunks').update({
+            'storage_url': None,
+            'storage_tier': 'deleted',
+            'compacted_at': datetime.now().isoformat()
+        }).eq('id', chunk['id']).execute()
+        self.supabase.storage.from_(BUCKET).remove([chunk['filename']])
+
+    def run(self, workers=2, limit=None):
+        processed = 0
+        after = None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while limit is None or processed < limit:
+                while self.ingest_active():
+                    print(f"⏸️  Live ingest, pausing {INGEST_QUIET_SECONDS}s")
+                    time.sleep(INGEST_QUIET_SECONDS)
+
+                batch = self.candidates(after)
+                if limit is not None:
+                    batch = batch[:limit - processed]
+                if not batch:
+                    break
+                list(executor.map(self.process, batch))
+                processed += len(batch)
+                # Page past the batch: compacted rows drop out of the query anyway,
+                # failed ones are left for the next run instead of retried forever
+                after = (batch[-1]['end_time'], batch[-1]['id'])
+                print(f"📦 {processed} chunks processed: {self.totals}")
+        return self.totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcode or delete old audio chunks")
+    parser.add_argument('--days', type=int, default=30, help='Only touch chunks older than this')
+    parser.add_argument('--workers', type=int, default=2, help='Parallel transcodes')
+    parser.add_argument('--per-minute', type=float, default=20, help='Chunks started per minute (rate limit)')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many chunks')
+    parser.add_argument('--keep-unlinked', action='store_true', help='Transcode chunks without images instead of deleting them')
+    parser.add_argument('--dry-run', action='store_true', help='Decide and log, change nothing')
+    parser.add_argument('--manifest', default='compaction_manifest.jsonl', help='Audit log (JSONL)')
+    args = parser.parse_args()
+
+    url, key = os.environ.get('SUPABASE_URL', ''), os.environ.get('SUPABASE_KEY', '')
+    if not (url and key):
+        print("❌ SUPABASE_URL and SUPABASE_KEY must be set")
+        return
+
+    try:
+        os.nice(10)  # Below the web workers
+    except OSError:
+        pass
+
+    compactor = AudioCompactor(create_client(url, key), days=args.days, keep_unlinked=args.keep_unlinked,
+                               dry_run=args.dry_run, manifest_path=args.manifest, per_minute=args.per_minute)
+    print(f"🗜️  Compacting audio older than {compactor.cutoff:%Y-%m-%d}{' (dry run)' if args.dry_run else ''}")
+    totals = compactor.run(workers=args.workers, limit=args.limit)
+
+    saved = totals['bytes_before'] - totals['bytes_after']
+    print(f"\n✅ Done: {totals['transcoded']} transcoded, {totals['deleted_silent']} silent and "
+          f"{totals['deleted_unlinked']} unlinked deleted, {totals['error']} errors, "
+          f"{saved / 1024 / 1024:.1f} MB freed. Manifest: {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
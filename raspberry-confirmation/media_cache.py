@@ -0,0 +1,157 @@
+"""
+Media Cache
+Disk cache with LRU eviction for the /media endpoints: original files
+downloaded from Supabase storage, and audio clips cut from them.
+"""
+
+import os
+import hashlib
+import threading
+from math import gcd
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import soundfile as sf
+from scipy.signal import resample_poly
+
+MEDIA_CACHE_DIR = os.environ.get('MEDIA_CACHE_DIR', 'media_cache')
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# soundfile format per clip extension
+CLIP_FORMATS = {
+    '.wav': ('WAV', 'PCM_16'),
+    '.flac': ('FLAC', 'PCM_16'),
+    '.ogg': ('OGG', 'OPUS'),
+}
+OPUS_SAMPLERATES = (8000, 12000, 16000, 24000, 48000)
+
+
+class DiskLRUCache:
+    def __init__(self, directory=MEDIA_CACHE_DIR, max_bytes=MEDIA_CACHE_MAX_BYTES):
+        """
+        Files on local disk, evicted least recently used first once the
+        total size passes max_bytes. The index is rebuilt from file mtimes
+        on start, so the cache survives restarts. Files in use are pinned
+        and never evicted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._fill_locks = {}  # cache file name -> [lock, users]: one fill per key at a time
+        self._entries = OrderedDict()  # cache file name -> size, least recently used first
+        self._pins = {}  # cache file name -> number of callers using its path
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.part'):
+                os.remove(path)  # Left by a crash mid-write
+            elif os.path.isfile(path):
+                files.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+        self.hits = self.misses = 0
+
+    def _name(self, key, extension):
+        return hashlib.sha1(key.encode()).hexdigest() + extension
+
+    @contextmanager
+    def pinned(self, key, extension, create):
+        """
+        Path of the cached file for key, calling create(path) to write it on
+        a miss. The file is not evicted until the with block exits, so open
+        it inside the block. Concurrent requests for the same key wait for
+        one fill. create may itself pin another key (a clip reading its
+        original): each key has its own lock, so that cannot deadlock.
+        """
+        name = self._name(key, extension)
+        path = os.path.join(self.directory, name)
+
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+            fill_lock = self._fill_locks.setdefault(name, [threading.Lock(), 0])
+            fill_lock[1] += 1
+        try:
+            try:
+                with fill_lock[0]:
+                    self._get_or_fill(name, path, create)
+            finally:
+                with self._lock:
+                    fill_lock[1] -= 1
+                    if not fill_lock[1]:
+                        del self._fill_locks[name]
+            yield path
+        finally:
+            with self._lock:
+                self._pins[name] -= 1
+                if not self._pins[name]:
+                    del self._pins[name]
+
+    def _get_or_fill(self, name, path, create):
+        with self._lock:
+            if name in self._entries and os.path.exists(path):
+                self._entries.move_to_end(name)
+                self.hits += 1
+                os.utime(path)  # Keeps LRU order across restarts
+                return
+            self.misses += 1
+
+        partial_path = path + '.part'
+        try:
+            create(partial_path)
+            os.replace(partial_path, path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used files until under max_bytes, skipping pinned ones"""
+        for name in list(self._entries):
+            if self._total <= self.max_bytes:
+                break
+            if name in self._pins:
+                continue
+            self._total -= self._entries.pop(name)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                print(f"⚠️  Could not evict {name}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._entries), 'bytes': self._total, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def write_clip(source_path, clip_path, start, end, extension='.wav'):
+    """
+    Cut [start, end) seconds out of an audio file into clip_path. Only the
+    needed frames are read (seek), not the whole 5-minute chunk.
+    Raises ValueError if the span is outside the audio.
+    """
+    with sf.SoundFile(source_path) as source:
+        duration = source.frames / source.samplerate
+        if start >= duration:
+            raise ValueError(f"start {start}s is past the end of the audio ({duration:.1f}s)")
+        first = int(start * source.samplerate)
+        last = min(int(end * source.samplerate), source.frames)
+        source.seek(first)
+        audio = source.read(last - first, dtype='float32', always_2d=True)
+        samplerate = source.samplerate
+
+    file_format, subtype = CLIP_FORMATS[extension]
+    if subtype == 'OPUS' and samplerate not in OPUS_SAMPLERATES:
+        # Opus only encodes a few rates: 16 kHz mono is plenty for speech
+        divisor = gcd(samplerate, 16000)
+        audio = resample_poly(audio.mean(axis=1), 16000 // divisor, samplerate // divisor)
+        samplerate = 16000
+    sf.write(clip_path, audio, samplerate, format=file_format, subtype=subtype)
@@ -4,12 +4,19 @@
 CREATE TABLE audio_chunks (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     filename TEXT NOT NULL UNIQUE,
-    storage_url TEXT NOT NULL,
+    storage_url TEXT,  -- NULL once compact_audio.py deleted the audio
     start_time TIMESTAMP NOT NULL,
     end_time TIMESTAMP NOT NULL,
     has_conversation BOOLEAN DEFAULT NULL,
     transcription TEXT DEFAULT NULL,
     transcribed_at TIMESTAMP DEFAULT NULL,
+    persons TEXT[] DEFAULT '{}',  -- Detected persons of linked images (see add_chunk_persons.sql)
+    persons_updated_at TIMESTAMP DEFAULT NULL,  -- Last add_chunk_persons call
+    latitude DOUBLE PRECISION DEFAULT NULL,  -- Capture location (see add_location_columns.sql)
+    longitude DOUBLE PRECISION DEFAULT NULL,
+    geohash TEXT DEFAULT NULL,
+    storage_tier TEXT NOT NULL DEFAULT 'original',  -- original | opus | deleted (see add_audio_tiering.sql)
+    compacted_at TIMESTAMP DEFAULT NULL,
     uploaded_at TIMESTAMP DEFAULT NOW()
 );
 
@@ -21,10 +28,50 @@ CREATE TABLE images (
     captured_at TIMESTAMP NOT NULL,
     detected_persons TEXT[] DEFAULT NULL,
     audio_chunk_id UUID REFERENCES audio_chunks(id) ON DELETE SET NULL,
+    phash TEXT DEFAULT NULL,  -- Perceptual hash for dedupe (see add_image_phash.sql)
+    latitude DOUBLE PRECISION DEFAULT NULL,
+    longitude DOUBLE PRECISION DEFAULT NULL,
+    geohash TEXT DEFAULT NULL,
     uploaded_at TIMESTAMP DEFAULT NOW()
 );
 
 -- Indexes
 CREATE INDEX idx_audio_chunks_time ON audio_chunks(start_time, end_time);
+CREATE INDEX idx_audio_chunks_end_time ON audio_chunks(end_time);
+CREATE INDEX idx_audio_chunks_uncompacted ON audio_chunks(end_time, id) WHERE compacted_at IS NULL;
+CREATE INDEX idx_audio_chunks_uploaded_at ON audio_chunks(uploaded_at);
+CREATE INDEX idx_audio_chunks_persons ON audio_chunks USING GIN (persons);
+CREATE INDEX idx_audio_chunks_persons_updated ON audio_chunks(persons_updated_at, id);
 CREATE INDEX idx_images_captured_at ON images(captured_at);
 CREATE INDEX idx_images_audio_chunk ON images(audio_chunk_id);
+CREATE INDEX idx_images_listing ON images(captured_at DESC, id DESC);
+CREATE INDEX idx_audio_chunks_listing ON audio_chunks(end_time DESC, id DESC);
+CREATE INDEX idx_images_filename_prefix ON images(filename text_pattern_ops);
+CREATE INDEX idx_audio_chunks_filename_prefix ON audio_chunks(filename text_pattern_ops);
+CREATE INDEX idx_images_phash ON images(phash, captured_at);
+CREATE INDEX idx_images_geohash ON images(geohash text_pattern_ops);
+CREATE INDEX idx_audio_chunks_geohash ON audio_chunks(geohash text_pattern_ops);
+
+-- Merge detected persons into audio_chunks.persons (called at image ingest)
+CREATE OR REPLACE FUNCTION add_chunk_persons(
+    p_audio_chunk_id UUID,
+    p_persons TEXT[]
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    -- Names are matched case-insensitively but keep their display case;
+    -- the spelling already stored wins over a new one
+    UPDATE audio_chunks
+    SET persons = ARRAY(
+        SELECT name FROM (
+            SELECT DISTINCT ON (lower(p)) p AS name
+            FROM unnest(COALESCE(persons, '{}') || p_persons) WITH ORDINALITY AS u(p, n)
+            ORDER BY lower(p), n
+        ) merged
+        ORDER BY lower(name)
+    ),
+    -- High-water mark for incremental readers (conversation_combiner.py)
+    persons_updated_at = clock_timestamp()
+    WHERE id = p_audio_chunk_id;
+$$;
@@ -0,0 +1,90 @@
+import os
+import json
+import requests
+from requests.adapters import HTTPAdapter
+
+BATCH_MAX_ITEMS = 20
+BATCH_MAX_BYTES = 8 * 1024 * 1024  # Keep one request well under the server's body limit
+BATCH_MAX_AUDIO = 4  # The server transcribes audio inside the request, 4 at a time
+
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+}
+
+
+class BatchUploader:
+    def __init__(self, api_url_base, folder="temp", timeout=(5, 180)):
+        """
+        Upload many queued captures per request over one kept-alive connection.
+
+        Parameters:
+        api_url_base (str): Backend base URL
+        folder (str): Storage folder on the backend (default: 'temp')
+        timeout (tuple): (connect, read) seconds - the server transcribes audio before answering
+        """
+        self.api_url = f"{api_url_base}/upload/batch"
+        self.folder = folder
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def upload(self, items):
+        """
+        Send items (queue dicts with type, path, tags, timestamp, location, phash) as one
+        multipart request with a JSON manifest.
+
+        Returns the server's result for each item, in order ({"success",
+        "error", ...}), or None if the request never reached the server
+        (network down). A request the server failed (5xx, timed out) fails
+        every item, so it counts as an attempt. Items whose file no longer
+        exists are reported as failed.
+        """
+        manifest, files, handles = [], [], []
+        try:
+            for i, item in enumerate(items):
+                if not os.path.isfile(item["path"]):
+                    continue
+                field = f"file{i}"
+                name = os.path.basename(item["path"])
+                content_type = CONTENT_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream")
+                f = open(item["path"], "rb")
+                handles.append(f)
+                files.append((field, (name, f, content_type)))
+                manifest.append({
+                    "id": str(i),
+                    "field": field,
+                    "type": item["type"],
+                    "filename": name,
+                    "timestamp": item.get("timestamp"),
+                    "tags": item.get("tags"),
+                    "location": item.get("location"),
+                    "phash": item.get("phash"),
+                })
+
+            if not manifest:
+                return [{"success": False, "error": "file missing"} for _ in items]
+
+            data = {"folder": self.folder, "manifest": json.dumps(manifest)}
+            response = self.session.post(self.api_url, files=files, data=data, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"Batch upload failed: HTTP {response.status_code}")
+                return [{"success": False, "error": f"HTTP {response.status_code}"} for _ in items]
+            results = {r.get("id"): r for r in response.json().get("results", [])}
+        except requests.ConnectionError as e:
+            print(f"Batch upload error: {e}")
+            return None
+        except Exception as e:
+            print(f"Batch upload failed: {e}")
+            return [{"success": False, "error": str(e)} for _ in items]
+        finally:
+            for f in handles:
+                f.close()
+
+        return [results.get(str(i), {"success": False, "error": "no result"}) for i in range(len(items))]
@@ -2,12 +2,20 @@ import gpsd
 import time
 from datetime import datetime
 
-# 连接到本地的GPSD服务
-gpsd.connect()
-
 class GPS:
     def __init__(self):
-        pass
+        # 连接到本地的GPSD服务
+        gpsd.connect()
+
+    def read(self):
+        """(lat, lon) of the current fix, or None without a 2D/3D fix"""
+        try:
+            packet = gpsd.get_current()
+            if packet.mode >= 2:
+                return packet.lat, packet.lon
+        except Exception as e:
+            print('Error reading GPS data:', e)
+        return None
     
     def get_location(self):
         try:
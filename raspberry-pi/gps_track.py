@@ -0,0 +1,199 @@
+import os
+import math
+import struct
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+RECORD = struct.Struct("<dff")  # unix time, latitude, longitude: 16 bytes per fix
+MAX_GAP_SECONDS = 120           # Fixes further apart than this are not interpolated
+MIN_MOVE_METERS = 10            # Stationary fixes are only written as keep-alives...
+KEEPALIVE_SECONDS = 60          # ...this often, so the track stays joinable
+PLACE_PRECISION = 7             # Geohash cell of ~150 m for the place index
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precision=PLACE_PRECISION):
+    """Geohash of a coordinate; nearby points share a prefix"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    """Equirectangular approximation, plenty for walking distances"""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371000 * math.hypot(x, y)
+
+
+class GPSTrack:
+    def __init__(self, path=os.path.join("data", "gps_track.bin")):
+        """
+        Append-only track of GPS fixes in fixed-size binary records, in time
+        order, so a location lookup is a binary search over the file.
+
+        Parameters:
+        path (str): Track file (default: 'data/gps_track.bin')
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Drop a torn record left by a crash mid-write
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size % RECORD.size:
+            with open(path, "r+b") as f:
+                f.truncate(size - size % RECORD.size)
+        self.last = self._record(len(self) - 1) if len(self) else None
+
+    def __len__(self):
+        return os.path.getsize(self.path) // RECORD.size if os.path.exists(self.path) else 0
+
+    def append(self, timestamp, lat, lon):
+        """Add a fix. Returns False if it was skipped (out of order or stationary)."""
+        with self._lock:
+            if self.last:
+                last_time, last_lat, last_lon = self.last
+                if timestamp <= last_time:
+                    return False
+                if (timestamp - last_time < KEEPALIVE_SECONDS and
+                        distance_meters(last_lat, last_lon, lat, lon) < MIN_MOVE_METERS):
+                    return False
+            with open(self.path, "ab") as f:
+                f.write(RECORD.pack(timestamp, lat, lon))
+            self.last = (timestamp, lat, lon)
+            return True
+
+    def _record(self, index, f=None):
+        if f is None:
+            with open(self.path, "rb") as f:
+                return self._record(index, f)
+        f.seek(index * RECORD.size)
+        return RECORD.unpack(f.read(RECORD.size))
+
+    def location_at(self, timestamp, max_gap=MAX_GAP_SECONDS):
+        """
+        (lat, lon) at a unix time: interpolated between the surrounding fixes,
+        or the nearest fix within max_gap seconds. None if there is no fix close enough.
+        """
+        count = len(self)
+        if not count:
+            return None
+        with open(self.path, "rb") as f:
+            low, high = 0, count
+            while low < high:  # First fix at or after timestamp
+                middle = (low + high) // 2
+                if self._record(middle, f)[0] < timestamp:
+                    low = middle + 1
+                else:
+                    high = middle
+            after = self._record(low, f) if low < count else None
+            before = self._record(low - 1, f) if low > 0 else None
+
+        if before and after and after[0] - before[0] <= max_gap:
+            span = after[0] - before[0]
+            share = (timestamp - before[0]) / span if span else 0.0
+            return (before[1] + (after[1] - before[1]) * share,
+                    before[2] + (after[2] - before[2]) * share)
+        nearest = min((r for r in (before, after) if r), key=lambda r: abs(r[0] - timestamp))
+        if abs(nearest[0] - timestamp) <= max_gap:
+            return nearest[1], nearest[2]
+        return None
+
+
+class PlaceIndex:
+    def __init__(self, path=os.path.join("data", "places.db"), precision=PLACE_PRECISION):
+        """
+        Visits per geohash cell (cell, start, end), maintained as fixes come
+        in. Answers "where was I at ..." and "when was I here" from an index
+        instead of re-reading the whole track.
+
+        Parameters:
+        path (str): SQLite database file (default: 'data/places.db')
+        precision (int): Geohash length of a place (default: 7, ~150 m)
+        """
+        self.precision = precision
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS visits (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    geohash TEXT NOT NULL,
+                    start REAL NOT NULL,
+                    end REAL NOT NULL,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_visits_start ON visits (start);
+                CREATE INDEX IF NOT EXISTS idx_visits_geohash ON visits (geohash, start);
+            """)
+
+    def add(self, timestamp, lat, lon, max_gap=MAX_GAP_SECONDS):
+        """Extend the current visit, or start a new one when the cell changes or after a gap"""
+        cell = geohash_encode(lat, lon, self.precision)
+        with self._lock, self._conn:
+            last = self._conn.execute("SELECT id, geohash, end FROM visits ORDER BY start DESC LIMIT 1").fetchone()
+            if last and last[1] == cell and 0 <= timestamp - last[2] <= max_gap:
+                self._conn.execute("UPDATE visits SET end = ? WHERE id = ?", (timestamp, last[0]))
+            elif not last or timestamp > last[2]:
+                self._conn.execute("INSERT INTO visits (geohash, start, end, lat, lon) VALUES (?, ?, ?, ?, ?)",
+                                   (cell, timestamp, timestamp, lat, lon))
+
+    def place_at(self, timestamp, max_gap=MAX_GAP_SECONDS):
+        """The visit covering a unix time as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT geohash, start, end, lat, lon FROM visits WHERE start <= ? ORDER BY start DESC LIMIT 1",
+                (timestamp,)
+            ).fetchone()
+        if row and timestamp <= row[2] + max_gap:
+            return dict(zip(("geohash", "start", "end", "lat", "lon"), row))
+        return None
+
+    def visits(self, geohash_prefix, since=None, until=None):
+        """Visits to the area of a geohash prefix (shorter prefix = larger area), oldest first"""
+        sql = "SELECT geohash, start, end, lat, lon FROM visits WHERE geohash >= ? AND geohash < ?"
+        params = [geohash_prefix, geohash_prefix + "~"]  # '~' sorts after every geohash character
+        if since is not None:
+            sql += " AND end >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND start <= ?"
+            params.append(until)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY start", params).fetchall()
+        return [dict(zip(("geohash", "start", "end", "lat", "lon"), row)) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Where was I when...?")
+    parser.add_argument("--at", required=True, help="Local time, e.g. '2025-11-08 10:25'")
+    args = parser.parse_args()
+
+    when = datetime.fromisoformat(args.at).timestamp()
+    place = PlaceIndex().place_at(when)
+    location = GPSTrack().location_at(when)
+    print("Place:", f"{place['geohash']} ({place['lat']:.5f}, {place['lon']:.5f})" if place else "unknown")
+    print("Location:", f"{location[0]:.5f}, {location[1]:.5f}" if location else "no fix near that time")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
 import threading
 import time
 import os
-from persistqueue import Queue
+from datetime import datetime
 import requests
-from typing import Literal
+from batch_uploader import BatchUploader, BATCH_MAX_ITEMS, BATCH_MAX_BYTES, BATCH_MAX_AUDIO
+from upload_queue import UploadQueue
 from microphone import Microphone
 from camera import Camera
-from recognize_faces import FaceRecognition
+from recognize_faces import FaceRecognitionProcess
+from motion_gate import ChangeDetector, AdaptiveRate, SnapshotDeduper, dhash
+from resource_scheduler import ResourceScheduler, lower_thread_priority
+from gps_track import GPSTrack, PlaceIndex
+from get_location import GPS
 
 api_url_base = "https://2025-ai-hackathon-raspberry-api-api-production.up.railway.app"
-QUEUE_PATH = "temp/queue"
-queue = Queue(QUEUE_PATH, autosave=True)
+AUDIO_FORMAT = os.environ.get("AUDIO_FORMAT", "flac")  # wav | flac | opus (16 kHz mono)
+UPLOAD_WORKERS = 2  # Batches in flight at once
+MAX_IDLE_SECONDS = 300  # Longest wait between upload attempts while offline
+STATS_INTERVAL_SECONDS = 60
+GPS_INTERVAL_SECONDS = 5
+
+os.makedirs("temp", exist_ok=True)
+queue = UploadQueue(os.path.join("temp", "uploads.db"))
+scheduler = ResourceScheduler()
+track = GPSTrack(os.path.join("data", "gps_track.bin"))
+places = PlaceIndex(os.path.join("data", "places.db"))
+deduper = SnapshotDeduper()  # Shared: the audio worker resets it per chunk
 
 def check_network(url="https://www.google.com", timeout=3):
     try:
@@ -19,104 +34,178 @@ def check_network(url="https://www.google.com", timeout=3):
     except:
         return False
 
-def uploader(save_path, api_url_base, file_type: Literal["image", "audio"], tags=None):  # Only 'image' or 'audio' used
-    key = 'image' if file_type == 'image' else 'audio'
-    content_type = 'image/jpeg' if file_type == 'image' else 'audio/wav'
-    api_url = f"{api_url_base}/upload/{file_type}"
-    files = None
-    data = {"folder": "temp"}
-    if file_type == "image" and tags:
-        # SPI expects comma-separated string for detected_persons
-        data["detected_persons"] = ",".join(tags) if isinstance(tags, list) else str(tags)
-    with open(save_path, 'rb') as f:
-        files = {key: (os.path.basename(save_path), f, content_type)}
-        try:
-            response = requests.post(api_url, files=files, data=data, timeout=10)
-        except Exception as e:
-            print(e)
-            return None
-    return response
-
 def audio_worker(interval=30):
-    mic = Microphone()
+    mic = Microphone(capture_format=AUDIO_FORMAT)
+    reported_cpu, reported_overflows = 0.0, 0
     while True:
+        # Encoding runs in the background, so report what finished since the last chunk
+        scheduler.record("audio", mic.encode_cpu - reported_cpu)
+        if mic.overflows > reported_overflows:
+            scheduler.drop("audio", mic.overflows - reported_overflows)
+        reported_cpu, reported_overflows = mic.encode_cpu, mic.overflows
         mic.start_recording()
+        deduper.new_chunk()
         time.sleep(interval)
-        path = mic.stop_recording()
-        print(f"Audio saved: {path}")
-        queue.put({"type": "audio", "path": path})
-
-def video_worker():
-    known_faces = os.path.join("data", "known_faces.pkl")
-    threshold = 0.6
-    recognizer = FaceRecognition(known_faces)
-    recognizer.threshold = threshold
+        timestamp = datetime.now().isoformat()  # End of the chunk, not end of encoding
+
+        def on_saved(path, timestamp=timestamp):
+            print(f"Audio saved: {path}")
+            queue.put("audio", path, timestamp=timestamp)
+
+        mic.stop_recording(on_saved=on_saved)
+
+def video_worker(face_process):
+    lower_thread_priority(5)
+    detector = ChangeDetector()
+    rate = AdaptiveRate()
     cam = Camera()
     try:
         cam.open()
         print("Video monitoring...")
         last_pic_time = time.time() - 10
+        last_stats_time = time.time()
+        result = None
         while True:
-            img_path = cam.capture_frame(save_path=os.path.join("temp", "monitor.jpg"))
-            result = None
-            if img_path and os.path.isfile(img_path):
-                result = recognizer.process_image(img_path)  # should return list of names
+            frame_start = time.time()
+            with scheduler.measure("video"):
+                img_path = cam.capture_frame(save_path=os.path.join("temp", "monitor.jpg"))
+                changed = False
+                if img_path and os.path.isfile(img_path):
+                    # Faces in view: keep checking, people sit still. Otherwise only on a scene change
+                    changed = detector.should_check(img_path)
+            if (result or changed) and scheduler.over_budget("face"):
+                scheduler.drop("face")  # Out of CPU budget: skip this frame, keep the last result
+            elif result or changed:
+                result, cpu_seconds = face_process.process_image(img_path)  # should return list of names
+                scheduler.record("face", cpu_seconds)
                 print(result)
             if result and (time.time() - last_pic_time >= 10):
                 snapshot_path = cam.capture_frame()
-                print(f"Detected face, image saved: {snapshot_path}")
-                queue.put({"type": "image", "path": snapshot_path, "tags": result})
+                snapshot_hash = dhash(snapshot_path)
+                if snapshot_hash and deduper.is_duplicate(snapshot_hash, result):
+                    os.remove(snapshot_path)  # Same scene, same people as a queued snapshot
+                else:
+                    print(f"Detected face, image saved: {snapshot_path}")
+                    queue.put("image", snapshot_path, tags=result, timestamp=datetime.now().isoformat(),
+                              phash=snapshot_hash)
                 last_pic_time = time.time()
-            time.sleep(1)
+            if time.time() - last_stats_time >= 300:
+                print(f"Face detection: {detector.stats()}, interval {rate.interval:.1f}s, "
+                      f"duplicate snapshots dropped: {deduper.dropped}")
+                last_stats_time = time.time()
+            interval = rate.update(changed, bool(result))
+            time.sleep(max(interval - (time.time() - frame_start), 0))
+            scheduler.pace("video")
     finally:
         cam.close()
 
+def gps_worker():
+    try:
+        gps = GPS()
+    except Exception as e:
+        print(f"GPS unavailable, uploads will have no location: {e}")
+        return
+    while True:
+        fix = gps.read()
+        if fix:
+            now = time.time()
+            track.append(now, *fix)
+            places.add(now, *fix)
+        time.sleep(GPS_INTERVAL_SECONDS)
+
+def capture_location(item):
+    """Location at the item's capture time from the GPS track, as {lat, lon} or None"""
+    try:
+        location = track.location_at(datetime.fromisoformat(item["timestamp"]).timestamp())
+    except (TypeError, ValueError):
+        return None
+    return {"lat": round(location[0], 6), "lon": round(location[1], 6)} if location else None
+
+def upload_batch(batch_uploader):
+    """
+    Upload the next batch of ready items and acknowledge them one by one.
+    Returns the number of items sent, or None if the request failed.
+    """
+    items = queue.claim(BATCH_MAX_ITEMS, BATCH_MAX_BYTES, BATCH_MAX_AUDIO)
+    missing = [item for item in items if not os.path.isfile(item["path"])]
+    if missing:
+        print(f"Dropping {len(missing)} queued items: file missing")
+        queue.fail([item["id"] for item in missing], "file missing")
+    items = [item for item in items if item not in missing]
+    if not items:
+        return 0
+    for item in items:
+        item["location"] = capture_location(item)
+
+    results = batch_uploader.upload(items)
+    if results is None:
+        queue.release([item["id"] for item in items])  # Not an attempt - the server never saw them
+        return None
+
+    for item, result in zip(items, results):
+        if result.get("success"):
+            queue.ack([item["id"]])
+            try:
+                os.remove(item["path"])
+            except Exception as e:
+                print(f"Delete error: {e}")
+        else:
+            queue.nack([item["id"]], result.get("error"))
+
+    uploaded = sum(1 for r in results if r.get("success"))
+    print(f"Uploaded {uploaded}/{len(items)} items in one request, queue: {queue.counts()}")
+    return len(items)
+
 def upload_worker():
+    lower_thread_priority(10)
+    batch_uploader = BatchUploader(api_url_base)
+    idle = 5
     while True:
-        if not queue.empty() and check_network():
-            item = queue.get()
-            resp = uploader(item["path"], api_url_base, file_type=item["type"], tags=item.get("tags"))
-            print(f"Uploaded {item['path']}, status: {getattr(resp,'status_code',None)}")
-            if resp and getattr(resp, 'status_code', None) == 200:
-                try:
-                    os.remove(item["path"])
-                    print(f"Deleted {item['path']} after upload.")
-                except Exception as e:
-                    print(f"Delete error: {e}")
-            queue.task_done()
+        scheduler.throttle_uploads()  # Hot or overloaded: hold uploads back
+        with scheduler.measure("upload"):
+            sent = upload_batch(batch_uploader)
+        scheduler.pace("upload")
+        if sent:
+            idle = 5
+            continue
+        if sent is None:
+            idle = min(idle * 2, MAX_IDLE_SECONDS)  # Offline: back off
         else:
-            time.sleep(5)
+            idle = 5
+            queue.purge_done()
+        time.sleep(idle)
 
 def main():
-    if not os.path.exists("temp"):
-        os.makedirs("temp")
+    found = queue.recover("temp")
+    print(f"Upload queue: {queue.counts()}, {found} unqueued captures recovered")
+    # Fork the face recognition process before any other thread starts
+    face_process = FaceRecognitionProcess(os.path.join("data", "known_faces.pkl"), threshold=0.6)
     threads = [
         threading.Thread(target=audio_worker, daemon=True),
-        threading.Thread(target=video_worker, daemon=True),
-        threading.Thread(target=upload_worker, daemon=True)
-    ]
+        threading.Thread(target=video_worker, args=(face_process,), daemon=True),
+        threading.Thread(target=gps_worker, daemon=True)
+    ] + [threading.Thread(target=upload_worker, daemon=True) for _ in range(UPLOAD_WORKERS)]
     for t in threads:
         t.start()
     try:
         while True:
-            time.sleep(1)
+            time.sleep(STATS_INTERVAL_SECONDS)
+            scheduler.log_stats()
     except KeyboardInterrupt:
         print("Shutdown: sync remaining queue before exit…")
         if check_network():
             print("Network available: uploading remaining queue.")
-            while not queue.empty():
-                item = queue.get()
-                resp = uploader(item["path"], api_url_base, file_type=item["type"], tags=item.get("tags"))
-                print(f"Uploaded {item['path']}, status: {getattr(resp,'status_code',None)}")
-                if resp and getattr(resp, 'status_code', None) == 200:
-                    try:
-                        os.remove(item["path"])
-                        print(f"Deleted {item['path']} after upload.")
-                    except Exception as e:
-                        print(f"Delete error: {e}")
-                queue.task_done()
+            batch_uploader = BatchUploader(api_url_base)
+            while True:
+                sent = upload_batch(batch_uploader)
+                if sent is None:
+                    print("Upload failed: queue saved for next start.")
+                    break
+                if not sent:
+                    break
         else:
             print("No network: queue saved for next start.")
+        face_process.close()
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,47 @@
 import sounddevice as sd        # To record audio from microphone
 from scipy.io.wavfile import write  # To save audio as WAV file
-import asyncio                  # To handle asynchronous tasks
+from scipy.signal import resample_poly  # To downsample for speech models
 import time
 import numpy as np
 import os
 import threading
+from math import gcd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Whisper and Resemblyzer both work on 16 kHz mono
+SPEECH_SAMPLERATE = 16000
+
+# capture_format -> (file extension, soundfile format, soundfile subtype)
+CAPTURE_FORMATS = {
+    "wav": (".wav", None, None),
+    "flac": (".flac", "FLAC", "PCM_16"),
+    "opus": (".ogg", "OGG", "OPUS"),  # .ogg: the name Whisper accepts for Ogg/Opus
+}
+
 class Microphone:
-    def __init__(self, samplerate=44100, channels=1):
+    def __init__(self, samplerate=44100, channels=1, capture_format="wav"):
         """
         Initialize the Microphone object.
 
         Parameters:
         samplerate (int): Audio sample rate in Hz (default: 44100)
         channels (int): Number of audio channels (default: 1 for mono)
+        capture_format (str): 'wav' (as recorded), or 'flac' / 'opus' -
+            downmixed to 16 kHz mono and encoded in a background thread
         """
+        if capture_format not in CAPTURE_FORMATS:
+            raise ValueError(f"Unknown capture format '{capture_format}' (choose from {', '.join(CAPTURE_FORMATS)})")
         self.samplerate = samplerate
         self.channels = channels
+        self.capture_format = capture_format
         self.is_recording = False
         self.frames = []
         self.thread = None
+        self.overflows = 0      # Input overflows reported by PortAudio (dropped audio)
+        self.encode_cpu = 0.0   # CPU seconds spent encoding
+        # One encoder thread: chunks are encoded in order while the next one records
+        self.encoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-encoder")
 
     def start_recording(self):
         """
@@ -32,33 +53,76 @@ class Microphone:
         self.thread = threading.Thread(target=self._record)
         self.thread.start()
 
-    def stop_recording(self, save_path=None):
+    def stop_recording(self, save_path=None, on_saved=None):
         """
         Stop the recording process and save the recorded audio to a file.
 
         Parameters:
-        save_path (str): File path for saving the recorded audio (default: 'recorded_audio.wav')
+        save_path (str): File path for saving the recorded audio (default: 'temp/audio_<time>.<ext>')
+        on_saved (callable): Called with the path once the file is written. For
+            'flac' / 'opus' encoding runs in the background and this returns at once.
         """
         self.is_recording = False
         if self.thread:
             self.thread.join()
         if self.frames:
             audio = np.concatenate(self.frames, axis=0)
+            self.frames = []
             if not save_path:
                 formatted_time = datetime.now().strftime("%Y-%m-%d+%H-%M-%S")
-                save_path = os.path.join("temp", f"audio_{formatted_time}.wav")
-            write(save_path, self.samplerate, audio)
+                extension = CAPTURE_FORMATS[self.capture_format][0]
+                save_path = os.path.join("temp", f"audio_{formatted_time}{extension}")
+            if self.capture_format == "wav":
+                write(save_path, self.samplerate, audio)
+                if on_saved:
+                    on_saved(save_path)
+            else:
+                self.encoder.submit(self._encode, audio, save_path, on_saved)
         return save_path
 
+    def _encode(self, audio, save_path, on_saved=None):
+        """
+        Downmix to mono, resample to 16 kHz and encode (runs on the encoder thread).
+        The file is written under a temporary name and renamed, so a crash
+        never leaves a half-written chunk behind.
+        """
+        start = time.thread_time()
+        try:
+            import soundfile as sf
+            _, file_format, subtype = CAPTURE_FORMATS[self.capture_format]
+            speech = to_speech_samples(audio, self.samplerate)
+            partial_path = save_path + ".part"
+            sf.write(partial_path, speech, SPEECH_SAMPLERATE, format=file_format, subtype=subtype)
+            os.replace(partial_path, save_path)
+        except Exception as e:
+            print(f"Audio encoding failed, keeping WAV: {e}")
+            save_path = os.path.splitext(save_path)[0] + ".wav"
+            write(save_path, self.samplerate, audio)
+        self.encode_cpu += time.thread_time() - start
+        if on_saved:
+            on_saved(save_path)
+
     def _record(self):
         """
         Internal method running in a separate thread to capture audio frames.
         """
         def callback(indata, frames, time, status):
+            if status.input_overflow:
+                self.overflows += 1
             if self.is_recording:
                 self.frames.append(indata.copy())
         with sd.InputStream(samplerate=self.samplerate,
                             channels=self.channels,
                             callback=callback):
             while self.is_recording:
-                sd.sleep(100)
\ No newline at end of file
+                sd.sleep(100)
+
+def to_speech_samples(audio, samplerate):
+    """Float32 mono at SPEECH_SAMPLERATE"""
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if samplerate != SPEECH_SAMPLERATE:
+        divisor = gcd(samplerate, SPEECH_SAMPLERATE)
+        audio = resample_poly(audio, SPEECH_SAMPLERATE // divisor, samplerate // divisor).astype(np.float32)
+    return np.clip(audio, -1.0, 1.0)
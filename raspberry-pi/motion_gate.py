@@ -0,0 +1,146 @@
+import time
+import cv2
+import numpy as np
+
+THUMBNAIL_SIZE = (64, 48)   # Enough to see a person walk in, cheap to compare
+PIXEL_DELTA = 18            # Grey levels a thumbnail pixel must change by to count
+CHANGED_FRACTION = 0.02     # Share of changed pixels that wakes up face detection
+FORCE_CHECK_SECONDS = 30    # Run detection at least this often, even in a still scene
+DEDUPE_WINDOW_SECONDS = 30  # A kept snapshot stands in for look-alikes this long (one audio chunk)
+DEDUPE_MAX_DISTANCE = 8     # dHash bits (of 64) two near-identical snapshots may differ in
+
+
+def thumbnail(image_path):
+    """Small blurred grayscale version of a captured frame, or None if unreadable"""
+    # Reduced decoding skips most of the JPEG work for the full-size frame
+    image = cv2.imread(str(image_path), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    small = cv2.resize(image, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (5, 5), 0)
+
+
+class ChangeDetector:
+    def __init__(self, pixel_delta=PIXEL_DELTA, changed_fraction=CHANGED_FRACTION,
+                 force_check_seconds=FORCE_CHECK_SECONDS):
+        """
+        Cheap prefilter in front of face detection: frame differencing on
+        downsampled grayscale thumbnails.
+
+        Frames are compared to the frame last sent to detection, not to the
+        previous frame, so someone walking in slowly still adds up to a change.
+
+        Parameters:
+        pixel_delta (int): Grey-level difference that marks a pixel as changed
+        changed_fraction (float): Share of changed pixels that counts as a scene change
+        force_check_seconds (float): Longest time without running detection
+        """
+        self.pixel_delta = pixel_delta
+        self.changed_fraction = changed_fraction
+        self.force_check_seconds = force_check_seconds
+        self.reference = None
+        self.last_check_time = 0.0
+        self.checked = 0
+        self.skipped = 0
+
+    def should_check(self, image_path):
+        """True if the frame differs enough from the reference to run face detection"""
+        current = thumbnail(image_path)
+        if current is None:
+            return False
+
+        now = time.time()
+        if self.reference is None or now - self.last_check_time >= self.force_check_seconds:
+            changed = True
+        else:
+            diff = cv2.absdiff(current, self.reference)
+            changed = np.count_nonzero(diff > self.pixel_delta) >= self.changed_fraction * diff.size
+
+        if changed:
+            self.reference = current
+            self.last_check_time = now
+            self.checked += 1
+        else:
+            self.skipped += 1
+        return changed
+
+    def stats(self):
+        total = self.checked + self.skipped
+        return {"checked": self.checked, "skipped": self.skipped,
+                "skip_rate": self.skipped / total if total else 0.0}
+
+
+class AdaptiveRate:
+    def __init__(self, active=0.5, base=1.0, idle=4.0, backoff=1.5):
+        """
+        Sampling interval for the camera loop: fast while faces are in view,
+        slowing down step by step while the scene stays empty and unchanged.
+
+        Parameters:
+        active (float): Seconds between frames while faces are present
+        base (float): Seconds between frames right after a change
+        idle (float): Longest interval in an idle room
+        backoff (float): Interval growth per unchanged frame
+        """
+        self.active = active
+        self.base = base
+        self.idle = idle
+        self.backoff = backoff
+        self.interval = base
+
+    def update(self, changed, faces_present):
+        """Next interval in seconds, given what the last frame showed"""
+        if faces_present:
+            self.interval = self.active
+        elif changed:
+            self.interval = self.base
+        else:
+            self.interval = min(self.interval * self.backoff, self.idle)
+        return self.interval
+
+
+def dhash(image_path):
+    """64-bit difference hash of an image as 16 hex chars (None if unreadable); similar photos differ in few bits"""
+    image = cv2.imread(str(image_path), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1]).tobytes().hex()
+
+
+def hamming(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+class SnapshotDeduper:
+    def __init__(self, window_seconds=DEDUPE_WINDOW_SECONDS, max_distance=DEDUPE_MAX_DISTANCE):
+        """
+        Drops snapshots that look like one already queued within the window
+        and show the same people. The first photo of a scene stands in for
+        the rest, and a long, unchanged visit yields one photo per window.
+        new_chunk() starts over, so every audio chunk keeps at least one photo.
+
+        Parameters:
+        window_seconds (float): How long a queued snapshot represents its look-alikes
+        max_distance (int): Largest dHash Hamming distance counted as a duplicate
+        """
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self.recent = []  # (time, hash, people) of snapshots kept in the window
+        self.dropped = 0
+
+    def new_chunk(self):
+        """A new audio chunk started: earlier snapshots no longer stand in for it"""
+        self.recent = []
+
+    def is_duplicate(self, image_hash, people=None):
+        """True for a near-duplicate; otherwise the snapshot becomes a representative"""
+        now = time.time()
+        self.recent = [r for r in self.recent if now - r[0] < self.window_seconds]
+        people = frozenset(p.lower() for p in people or [])
+        for _, kept_hash, kept_people in self.recent:
+            if kept_people == people and hamming(kept_hash, image_hash) <= self.max_distance:
+                self.dropped += 1
+                return True
+        self.recent.append((now, image_hash, people))
+        return False
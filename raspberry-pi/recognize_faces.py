@@ -9,6 +9,10 @@ import numpy as np
 import face_recognition
 from pathlib import Path
 import pickle
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 
 class FaceRecognition:
@@ -66,6 +70,47 @@ class FaceRecognition:
                 result.append(identity)
         return result
 
+# Recognizer owned by the worker process
+_worker_recognizer = None
+
+
+def _init_worker(known_faces_path, threshold, niceness):
+    global _worker_recognizer
+    try:
+        os.nice(niceness)  # Below audio capture in the main process
+    except OSError as e:
+        print(f"Could not lower face worker priority: {e}")
+    _worker_recognizer = FaceRecognition(known_faces_path)
+    _worker_recognizer.threshold = threshold
+
+
+def _process_in_worker(image_path):
+    start = time.process_time()
+    result = _worker_recognizer.process_image(image_path)
+    return result, time.process_time() - start
+
+
+class FaceRecognitionProcess:
+    def __init__(self, known_faces_path="data/known_faces.pkl", threshold=0.6, niceness=10):
+        """
+        Face recognition in a separate, lower-priority process, so detection
+        never holds the GIL the audio and upload threads need.
+
+        Create it before starting other threads: the worker is forked here.
+        """
+        self.pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"),
+                                        initializer=_init_worker,
+                                        initargs=(known_faces_path, threshold, niceness))
+        self.pool.submit(os.getpid).result()  # Fork and load the known faces now
+
+    def process_image(self, image_path):
+        """Returns (list of names, CPU seconds the worker spent)"""
+        return self.pool.submit(_process_in_worker, str(image_path)).result()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
 def main():
     from camera import Camera
     import os
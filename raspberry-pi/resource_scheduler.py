@@ -0,0 +1,189 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+CPU_TEMP_PATH = "/sys/class/thermal/thermal_zone0/temp"
+WARM_TEMP_C = 70.0          # Slow uploads down
+HOT_TEMP_C = 80.0           # Pause uploads (the firmware starts throttling the CPU at 80-85 °C)
+BUDGET_WINDOW_SECONDS = 10  # CPU budgets are checked over this window
+UPLOAD_SLOW_SECONDS = 15
+UPLOAD_PAUSE_SECONDS = 60
+
+# name -> (priority, CPU budget as a share of one core). Lower priority number wins.
+DEFAULT_TASKS = {
+    "audio": (0, 0.5),   # Capture and encoding - never throttled
+    "video": (1, 0.15),  # Frame capture and change detection
+    "face": (2, 0.6),    # Face recognition in its own process
+    "upload": (3, 0.2),
+}
+
+
+def cpu_temperature():
+    """SoC temperature in °C, or None where the sensor is missing"""
+    try:
+        with open(CPU_TEMP_PATH) as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+def cpu_load():
+    """1-minute load average per core (1.0 = all cores busy)"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return 0.0
+
+
+def lower_thread_priority(niceness):
+    """Raise the calling thread's nice value (Linux schedules threads individually)"""
+    try:
+        tid = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + niceness)
+    except (AttributeError, OSError) as e:
+        print(f"Could not lower thread priority: {e}")
+
+
+class _Task:
+    def __init__(self, name, priority, budget):
+        self.name = name
+        self.priority = priority
+        self.budget = budget
+        self.window_start = time.time()
+        self.window_cpu = 0.0
+        # Counters since the last stats() call
+        self.cpu = 0.0
+        self.runs = 0
+        self.dropped = 0
+        self.throttled = 0.0
+
+
+class ResourceScheduler:
+    def __init__(self, tasks=None, window=BUDGET_WINDOW_SECONDS):
+        """
+        Per-task CPU budgets and priorities for the worker threads.
+
+        Workers report the CPU time they use; lower-priority tasks that go
+        over their budget are paced (sleep) or skip work, and their budgets
+        shrink further while the Pi is overloaded. Audio has the highest
+        priority and is only measured.
+
+        Parameters:
+        tasks (dict): name -> (priority, budget) (default: DEFAULT_TASKS)
+        window (float): Seconds over which budgets are enforced
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._stats_start = time.time()
+        for name, (priority, budget) in (tasks or DEFAULT_TASKS).items():
+            self.register(name, priority, budget)
+
+    def register(self, name, priority, budget):
+        with self._lock:
+            self._tasks[name] = _Task(name, priority, budget)
+
+    def _roll_window(self, task):
+        now = time.time()
+        if now - task.window_start >= self.window:
+            task.window_start, task.window_cpu = now, 0.0
+
+    def record(self, name, cpu_seconds):
+        """Add CPU time used by a task (for work done outside measure(), e.g. in another process)"""
+        with self._lock:
+            task = self._tasks[name]
+            self._roll_window(task)
+            task.window_cpu += cpu_seconds
+            task.cpu += cpu_seconds
+            task.runs += 1
+
+    @contextmanager
+    def measure(self, name):
+        """Record the CPU time the calling thread spends in the block"""
+        start = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.thread_time() - start)
+
+    def drop(self, name, count=1):
+        """Count work a task had to skip (frames not analyzed, audio overflows)"""
+        with self._lock:
+            self._tasks[name].dropped += count
+
+    def effective_budget(self, name):
+        """The task's budget, scaled down for lower-priority tasks while the CPU is overloaded"""
+        task = self._tasks[name]
+        load = cpu_load()
+        if task.priority == 0 or load <= 1.0:
+            return task.budget
+        return task.budget / load
+
+    def over_budget(self, name):
+        """True if the task used more CPU than its budget in the current window"""
+        task = self._tasks[name]
+        if task.priority == 0:
+            return False
+        with self._lock:
+            self._roll_window(task)
+        elapsed = max(time.time() - task.window_start, 1.0)
+        return task.window_cpu > self.effective_budget(name) * elapsed
+
+    def pace(self, name):
+        """Sleep long enough to bring the task back within its budget"""
+        task = self._tasks[name]
+        if not self.over_budget(name):
+            return 0.0
+        elapsed = time.time() - task.window_start
+        delay = min(task.window_cpu / self.effective_budget(name) - elapsed, self.window)
+        if delay > 0:
+            with self._lock:
+                task.throttled += delay
+            time.sleep(delay)
+        return max(delay, 0.0)
+
+    def upload_delay(self):
+        """Seconds to hold uploads back, based on SoC temperature and load"""
+        temperature = cpu_temperature()
+        if temperature is not None and temperature >= HOT_TEMP_C:
+            return UPLOAD_PAUSE_SECONDS
+        if (temperature is not None and temperature >= WARM_TEMP_C) or cpu_load() > 1.0:
+            return UPLOAD_SLOW_SECONDS
+        return 0
+
+    def throttle_uploads(self):
+        """Wait out heat or load before the next upload, counting the time as throttled"""
+        delay = self.upload_delay()
+        if delay:
+            with self._lock:
+                self._tasks["upload"].throttled += delay
+            time.sleep(delay)
+        return delay
+
+    def stats(self):
+        """Per-task utilization since the last call, then reset the counters"""
+        with self._lock:
+            now = time.time()
+            elapsed = max(now - self._stats_start, 1e-6)
+            tasks = {}
+            for task in sorted(self._tasks.values(), key=lambda t: t.priority):
+                tasks[task.name] = {
+                    "cpu": round(task.cpu / elapsed, 3),
+                    "budget": task.budget,
+                    "runs": task.runs,
+                    "dropped": task.dropped,
+                    "throttled_seconds": round(task.throttled, 1),
+                }
+                task.cpu, task.runs, task.dropped, task.throttled = 0.0, 0, 0, 0.0
+            self._stats_start = now
+        return {"seconds": round(elapsed), "temperature": cpu_temperature(),
+                "load": round(cpu_load(), 2), "tasks": tasks}
+
+    def log_stats(self):
+        stats = self.stats()
+        temperature = f"{stats['temperature']:.0f}°C" if stats["temperature"] is not None else "n/a"
+        parts = [f"{name} {t['cpu']:.0%}/{t['budget']:.0%} runs={t['runs']} dropped={t['dropped']} "
+                 f"throttled={t['throttled_seconds']}s" for name, t in stats["tasks"].items()]
+        print(f"Resource usage, last {stats['seconds']}s, {temperature}, load {stats['load']}: " + " | ".join(parts))
+        return stats
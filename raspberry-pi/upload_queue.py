@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import threading
+from datetime import datetime
+
+PENDING = "pending"
+IN_FLIGHT = "in-flight"
+DONE = "done"
+FAILED = "failed"
+
+# Lower uploads first: faces are what caregivers look at, audio can wait
+PRIORITY_FACE_IMAGE = 0
+PRIORITY_IMAGE = 1
+PRIORITY_AUDIO = 2
+
+MAX_ATTEMPTS = 8            # Server rejections (or failed requests) before an item is marked failed
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 3600
+DONE_RETENTION_SECONDS = 24 * 3600
+
+CAPTURE_FILE = re.compile(r"^(pic|audio)_(\d{4}-\d{2}-\d{2})\+(\d{2}-\d{2}(?:-\d{2})?)\.\w+$")
+
+
+def item_priority(item_type, tags=None):
+    if item_type == "image":
+        return PRIORITY_FACE_IMAGE if tags else PRIORITY_IMAGE
+    return PRIORITY_AUDIO
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter, capped at BACKOFF_MAX_SECONDS"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class UploadQueue:
+    def __init__(self, path=os.path.join("temp", "uploads.db")):
+        """
+        Persistent upload queue with acknowledgements.
+
+        Items stay on disk until the server confirms them (at-least-once):
+        pending -> in-flight -> done, or back to pending with a backoff after
+        a rejection (of the item, or of the whole request), and failed after
+        MAX_ATTEMPTS rejections.
+
+        Parameters:
+        path (str): SQLite database file (default: 'temp/uploads.db')
+        """
+        self.path = path
+        self._lock = threading.Lock()  # Shared by the capture and upload threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT NOT NULL,
+                    path TEXT NOT NULL UNIQUE,
+                    tags TEXT,
+                    timestamp TEXT,
+                    phash TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_uploads_ready ON uploads (status, priority, next_attempt_at, id);
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(uploads)")}
+            if "phash" not in columns:  # Queues created before snapshots were hashed
+                self._conn.execute("ALTER TABLE uploads ADD COLUMN phash TEXT")
+
+    def put(self, item_type, path, tags=None, timestamp=None, phash=None):
+        """
+        Queue a captured file (ignored if the path is already queued).
+
+        Parameters:
+        item_type (str): 'image' or 'audio'
+        path (str): File to upload
+        tags (list): Recognized faces for images
+        timestamp (str): Capture time, ISO format
+        phash (str): Perceptual hash of an image, hex
+        """
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO uploads (type, path, tags, timestamp, phash, size, priority, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (item_type, path, json.dumps(tags) if tags else None, timestamp, phash, size,
+                 item_priority(item_type, tags), time.time())
+            )
+
+    def claim(self, max_items, max_bytes, max_audio=None):
+        """
+        Mark the next ready items in-flight and return them, highest priority
+        first. The first item is always taken, even if larger than max_bytes.
+        Audio items beyond max_audio wait for the next batch, and an item that
+        already failed is sent alone, so one file the server keeps rejecting
+        cannot fail the batch it shares.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, type, path, tags, timestamp, phash, size, attempts FROM uploads "
+                "WHERE status = ? AND next_attempt_at <= ? ORDER BY priority, next_attempt_at, id LIMIT ?",
+                (PENDING, now, max_items)
+            ).fetchall()
+
+            items, total, audio = [], 0, 0
+            for id, item_type, path, tags, timestamp, phash, size, attempts in rows:
+                if items and (total + size > max_bytes or attempts):
+                    break
+                if item_type == "audio" and max_audio is not None and audio >= max_audio:
+                    continue
+                items.append({"id": id, "type": item_type, "path": path, "tags": json.loads(tags) if tags else None,
+                              "timestamp": timestamp, "phash": phash, "attempts": attempts})
+                total += size
+                audio += item_type == "audio"
+                if attempts:
+                    break
+
+            self._conn.executemany("UPDATE uploads SET status = ?, updated_at = ? WHERE id = ?",
+                                   [(IN_FLIGHT, now, item["id"]) for item in items])
+        return items
+
+    def ack(self, ids):
+        """Uploads confirmed by the server"""
+        self._set_status(ids, DONE)
+
+    def release(self, ids):
+        """Back to pending without counting an attempt (the request never reached the server)"""
+        self._set_status(ids, PENDING)
+
+    def nack(self, ids, error=None):
+        """Rejected by the server: retry with backoff, or mark failed after MAX_ATTEMPTS"""
+        now = time.time()
+        with self._lock, self._conn:
+            for id in ids:
+                row = self._conn.execute("SELECT attempts FROM uploads WHERE id = ?", (id,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                status = FAILED if attempts >= MAX_ATTEMPTS else PENDING
+                self._conn.execute(
+                    "UPDATE uploads SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (status, attempts, now + backoff_seconds(attempts), error, now, id)
+                )
+
+    def fail(self, ids, error):
+        """Give up on items that can never succeed (e.g. the file is gone)"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE uploads SET status = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                                   [(FAILED, error, now, id) for id in ids])
+
+    def recover(self, folder="temp"):
+        """
+        Startup crash recovery: in-flight items go back to pending, and
+        capture files in folder that never made it into the queue are added.
+        Returns the number of files found.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE uploads SET status = ? WHERE status = ?", (PENDING, IN_FLIGHT))
+            known = {row[0] for row in self._conn.execute("SELECT path FROM uploads")}
+
+        found = 0
+        for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+            match = CAPTURE_FILE.match(name)
+            path = os.path.join(folder, name)
+            if not match or path in known:
+                continue
+            date_part, time_part = match.group(2), match.group(3)
+            fmt = "%Y-%m-%d %H-%M-%S" if time_part.count("-") == 2 else "%Y-%m-%d %H-%M"
+            timestamp = datetime.strptime(f"{date_part} {time_part}", fmt).isoformat()
+            self.put("image" if match.group(1) == "pic" else "audio", path, timestamp=timestamp)
+            found += 1
+        return found
+
+    def purge_done(self, older_than=DONE_RETENTION_SECONDS):
+        """Forget confirmed uploads after a while"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM uploads WHERE status = ? AND updated_at < ?",
+                               (DONE, time.time() - older_than))
+
+    def counts(self):
+        """Number of items per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM uploads GROUP BY status").fetchall()
+        return {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def has_pending(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM uploads WHERE status = ? LIMIT 1", (PENDING,)).fetchone() is not None
+
+    def _set_status(self, ids, status):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE uploads SET status = ?, updated_at = ? WHERE id = ?",
+                                   [(status, now, id) for id in ids])